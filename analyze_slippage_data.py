@@ -1,20 +1,73 @@
 # analyze_slippage_data.py
 import pandas as pd
+import matplotlib
+
+matplotlib.use("Agg")  # Plots are only saved to files, also from worker processes
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
 import seaborn as sns
 import numpy as np  # For log scale and handling potential inf/-inf
+import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+from src.columnar_log import (
+    PROBE_STREAM,
+    USER_PREDICTION_STREAM,
+    PERFORMANCE_STREAM,
+    LEGACY_PERFORMANCE_COLUMNS,
+    list_segments,
+    load_segment,
+    load_stream,
+)
+from src.log_aggregates import ProbeAggregates, ReservoirSample
+from src.analysis_cache import FileWatermark, SegmentWatermark, load_cache, save_cache
 
 # --- Configuration ---
 DATA_LOG_FILE = "slippage_regression_log.csv"
 PERFORMANCE_LOG_FILE = "model_performance_log.csv"
+COLUMNAR_LOG_DIR = "logs_columnar"  # Used instead of the CSVs when it holds segments
 PLOT_OUTPUT_DIR = "output_plots"
+# Aggregates + watermarks for --incremental; bump the version when their layout changes
+ANALYSIS_CACHE_FILE = os.path.join(PLOT_OUTPUT_DIR, ".analysis_cache.pkl")
+ANALYSIS_CACHE_VERSION = 2
+STREAM_CHUNK_ROWS = 200_000  # Rows read per chunk in --streaming mode
+STREAM_SAMPLE_ROWS = (
+    10_000  # User-prediction rows kept for the scatter plot in --streaming mode
+)
+BINNED_MEAN_MIN_COUNT = 20  # Bins with fewer probes are left out of the mean line
+SLIPPAGE_COLUMN = "true_slippage_pct_walk_the_book"
+USER_PREDICTION_COLUMNS = ["user_order_size_usd", "predicted_slippage_pct_regression"]
 
 # Ensure plot output directory exists
 if not os.path.exists(PLOT_OUTPUT_DIR):
     os.makedirs(PLOT_OUTPUT_DIR)
 
 
+def market_feature_columns(df):
+    """Book feature columns logged for probes (one per configured model feature)."""
+    return [col for col in df.columns if col.startswith("market_")]
+
+
+def clean_probe_rows(df_probes):
+    """Coerces probe columns to numbers and drops unusable rows; returns (df, rows with negative spread)."""
+    probe_columns = (
+        ["probe_order_size_usd"] + market_feature_columns(df_probes) + [SLIPPAGE_COLUMN]
+    )
+    for col in probe_columns:
+        df_probes[col] = pd.to_numeric(df_probes[col], errors="coerce")
+    df_probes = df_probes.dropna(subset=probe_columns)
+
+    # Filter out rows where market_spread_bps is negative (crossed book artifacts)
+    # This should already be handled by the data generation filter, but as a safeguard for analysis:
+    negative_spread = 0
+    if "market_spread_bps" in df_probes.columns:
+        valid = df_probes["market_spread_bps"] >= 0
+        negative_spread = int((~valid).sum())
+        df_probes = df_probes[valid]
+    return df_probes, negative_spread
+
+
 def plot_model_performance_evolution(df_perf):
     if df_perf.empty or "num_training_samples" not in df_perf.columns:
         print(
@@ -22,8 +75,18 @@ def plot_model_performance_evolution(df_perf):
         )
         return
 
+    prequential_columns = ["prequential_mse", "prequential_r2_score"]
+    if not set(prequential_columns).issubset(df_perf.columns):
+        if "holdout_mse" in df_perf.columns:
+            print(
+                "Performance log only has legacy hold-out metrics (holdout_mse, "
+                "holdout_r2_score); they are not plotted as prequential metrics."
+            )
+        else:
+            print("Performance log is missing the prequential metric columns.")
+        return
     df_perf = df_perf.sort_values(by="num_training_samples").dropna(
-        subset=["test_mse", "test_r2_score"]
+        subset=prequential_columns
     )
     if df_perf.empty:
         print("No valid performance data to plot after sorting/dropping NaNs.")
@@ -33,13 +96,13 @@ def plot_model_performance_evolution(df_perf):
 
     color = "tab:red"
     ax1.set_xlabel("Number of Training Samples (Log Scale)")
-    ax1.set_ylabel("Test MSE (Log Scale)", color=color)
+    ax1.set_ylabel("Prequential MSE (Log Scale)", color=color)
     # Filter out non-positive MSE values for log scale if any, though MSE should be >= 0
-    valid_mse = df_perf[df_perf["test_mse"] > 0]
+    valid_mse = df_perf[df_perf["prequential_mse"] > 0]
     if not valid_mse.empty:
         ax1.plot(
             valid_mse["num_training_samples"],
-            valid_mse["test_mse"],
+            valid_mse["prequential_mse"],
             color=color,
             marker=".",
             linestyle="-",
@@ -55,10 +118,10 @@ def plot_model_performance_evolution(df_perf):
 
     ax2 = ax1.twinx()
     color = "tab:blue"
-    ax2.set_ylabel("Test R2 Score", color=color)
+    ax2.set_ylabel("Prequential R2 Score", color=color)
     ax2.plot(
         df_perf["num_training_samples"],
-        df_perf["test_r2_score"],
+        df_perf["prequential_r2_score"],
         color=color,
         marker="x",
         linestyle="--",
@@ -68,114 +131,110 @@ def plot_model_performance_evolution(df_perf):
     ax2.tick_params(axis="y", labelcolor=color)
     # R2 can be negative, so a fixed sensible range is good.
     min_r2 = (
-        min(-0.2, df_perf["test_r2_score"].min() - 0.05) if not df_perf.empty else -0.2
+        min(-0.2, df_perf["prequential_r2_score"].min() - 0.05)
+        if not df_perf.empty
+        else -0.2
     )
     max_r2 = (
-        max(1.0, df_perf["test_r2_score"].max() + 0.05) if not df_perf.empty else 1.0
+        max(1.0, df_perf["prequential_r2_score"].max() + 0.05)
+        if not df_perf.empty
+        else 1.0
     )
     ax2.set_ylim([min_r2, max_r2])
     ax2.axhline(0, color="gray", linestyle=":", linewidth=0.8)  # Line at R2=0
 
     fig.tight_layout()
-    plt.title("Slippage Model Performance Evolution (Test Set)")
+    plt.title("Slippage Model Performance Evolution (Prequential, Test-then-Train)")
     plt.savefig(os.path.join(PLOT_OUTPUT_DIR, "model_performance_evolution.png"))
     plt.close(fig)
     print(f"Saved model_performance_evolution.png to {PLOT_OUTPUT_DIR}")
 
 
-def plot_feature_vs_slippage(df_probes):
-    if df_probes.empty:
-        print("Probe data is empty, cannot plot feature relationships.")
+def plot_feature_density(feature, density, bin_means, y_limits=None):
+    """
+    Density of true slippage against one feature, drawn from a 2D histogram over
+    all probes (no sampling, so tails stay visible) plus the binned mean slippage.
+
+    Args:
+        feature (str): Feature column name.
+        density (Histogram2D): Joint (feature, slippage) counts.
+        bin_means (pd.DataFrame): BinnedMeans.to_frame() for the feature.
+        y_limits (Optional[Tuple[float, float]]): Slippage range to show.
+    """
+    y_low, y_high = y_limits if y_limits is not None else (-np.inf, np.inf)
+    mesh = density.mesh(y_low, y_high)
+    if mesh is None:
+        print(f"No probe data for {feature}.")
         return
+    x_edges, y_edges, counts = mesh
 
-    features_to_plot = [
-        "probe_order_size_usd",
-        "market_spread_bps",
-        "market_depth_best_ask_usd",
-    ]
-
-    # Filter out extreme true_slippage_pct for better visualization if they exist
-    # For example, if some probes exhausted the book leading to huge slippage values
-    # This depends on what reasonable slippage looks like. Let's cap at 1% for visualization.
-    df_probes_filtered = df_probes[
-        df_probes["true_slippage_pct_walk_the_book"].abs() < 1.0
-    ].copy()
-    if len(df_probes_filtered) < 0.1 * len(
-        df_probes
-    ):  # If filtering removes too much, don't filter
-        df_probes_filtered = df_probes.copy()
-        print(
-            "Warning: Filtering for true_slippage_pct < 1% removed most data. Plotting all data."
-        )
-
-    print(
-        f"Plotting feature vs slippage using {len(df_probes_filtered)} (potentially filtered) probe data points."
+    # Log scale for features that span many orders of magnitude
+    use_log_x = (
+        (feature == "probe_order_size_usd" or "depth" in feature)
+        and x_edges[0] > 0
+        and x_edges[-1] / x_edges[0] > 100
     )
 
-    for feature in features_to_plot:
-        if feature not in df_probes_filtered.columns:
-            print(f"Feature {feature} not found in probe data.")
-            continue
+    fig, ax = plt.subplots(figsize=(12, 7))
+    # Rasterized: render cost does not depend on the number of probes
+    mesh_artist = ax.pcolormesh(
+        x_edges,
+        y_edges,
+        np.ma.masked_equal(counts, 0),
+        norm=LogNorm(),
+        cmap="viridis",
+        rasterized=True,
+    )
+    fig.colorbar(mesh_artist, ax=ax, label="Probes per bin")
 
-        plt.figure(figsize=(12, 7))  # Slightly larger
-        # Use a sample if data is too large to avoid overplotting and save time
-        sample_df = (
-            df_probes_filtered.sample(
-                n=min(10000, len(df_probes_filtered)), random_state=1
-            )
-            if len(df_probes_filtered) > 10000
-            else df_probes_filtered
-        )
+    bin_means = bin_means[
+        (bin_means["count"] >= BINNED_MEAN_MIN_COUNT)
+        & (bin_means["mean"] >= y_edges[0])
+        & (bin_means["mean"] <= y_edges[-1])
+    ]
+    if use_log_x:
+        bin_means = bin_means[bin_means["x"] > 0]
+    ax.plot(
+        bin_means["x"],
+        bin_means["mean"],
+        color="tab:red",
+        marker="o",
+        markersize=3,
+        linewidth=1.2,
+        label="Binned mean",
+    )
+    ax.legend()
+
+    if use_log_x:
+        ax.set_xscale("log")
+    ax.set_title(f"{feature} vs. True Slippage % (Probes, density)")
+    ax.set_xlabel(f"{feature} {'(Log Scale)' if use_log_x else ''}")
+    ax.set_ylabel("True Slippage % (Walk-the-Book)")
+    ax.grid(True, which="both", ls="--", alpha=0.7)
+    fig.savefig(os.path.join(PLOT_OUTPUT_DIR, f"{feature}_vs_true_slippage.png"))
+    plt.close(fig)
+    print(f"Saved {feature}_vs_true_slippage.png to {PLOT_OUTPUT_DIR}")
 
-        # Consider log scale for features if they span many orders of magnitude
-        use_log_x = False
-        if feature == "probe_order_size_usd" or feature == "market_depth_best_ask_usd":
-            if (
-                sample_df[feature].max() / (sample_df[feature].min() + 1e-9) > 100
-            ):  # Heuristic for log scale
-                use_log_x = True
 
-        sns.scatterplot(
-            data=sample_df,
-            x=feature,
-            y="true_slippage_pct_walk_the_book",
-            alpha=0.3,
-            s=15,
-            edgecolor=None,
+def feature_plot_jobs(probe_aggregates):
+    """One plot_feature_density job per feature (order size plus every market_* column)."""
+    # Zoom on the bulk of the slippage distribution, as the scatter plots used to
+    y_limits = (
+        probe_aggregates.slippage.quantile(0.001),
+        probe_aggregates.slippage.quantile(0.999),
+    )
+    return [
+        (
+            plot_feature_density,
+            (
+                feature,
+                probe_aggregates.density[feature],
+                probe_aggregates.binned[feature].to_frame(),
+                y_limits,
+            ),
         )
-
-        if use_log_x:
-            plt.xscale("log")
-            # Filter out non-positive values for log scale if any (though order size/depth should be positive)
-            # sample_df = sample_df[sample_df[feature] > 0]
-            # sns.scatterplot(data=sample_df, x=feature, y='true_slippage_pct_walk_the_book', alpha=0.3, s=15, edgecolor=None)
-
-        plt.title(f"{feature} vs. True Slippage % (Probes)")
-        plt.xlabel(f"{feature} {'(Log Scale)' if use_log_x else ''}")
-        plt.ylabel("True Slippage % (Walk-the-Book)")
-
-        # Zoom y-axis if slippage is mostly small
-        median_slip = sample_df["true_slippage_pct_walk_the_book"].median()
-        std_slip = sample_df["true_slippage_pct_walk_the_book"].std()
-        if std_slip > 0:  # Avoid issues if all slippage is identical
-            lower_bound = median_slip - 3 * std_slip
-            upper_bound = (
-                median_slip + 5 * std_slip
-            )  # Allow more space for positive slippage
-            # Ensure bounds are reasonable, e.g., not excessively negative for slippage %
-            lower_bound = max(lower_bound, -0.01)  # Cap minimum y at -0.01% for example
-            upper_bound = min(
-                upper_bound, 0.1
-            )  # Cap maximum y at 0.1% if data is very concentrated
-            # Or use a percentile approach:
-            # upper_bound = sample_df['true_slippage_pct_walk_the_book'].quantile(0.99)
-            if upper_bound > lower_bound + 1e-5:  # Only set ylim if range is sensible
-                plt.ylim([lower_bound, upper_bound])
-
-        plt.grid(True, which="both", ls="--", alpha=0.7)
-        plt.savefig(os.path.join(PLOT_OUTPUT_DIR, f"{feature}_vs_true_slippage.png"))
-        plt.close()
-        print(f"Saved {feature}_vs_true_slippage.png to {PLOT_OUTPUT_DIR}")
+        for feature in probe_aggregates.feature_columns
+    ]
 
 
 def plot_slippage_distribution(df_probes):
@@ -234,6 +293,57 @@ def plot_slippage_distribution(df_probes):
     print(f"Saved true_slippage_distribution.png to {PLOT_OUTPUT_DIR}")
 
 
+def plot_slippage_histogram(histogram):
+    """plot_slippage_distribution from a StreamingHistogram (--streaming mode)."""
+    if histogram.moments.count == 0:
+        print("No slippage data for histogram.")
+        return
+
+    plt.figure(figsize=(12, 7))
+    # Same visualization filter as plot_slippage_distribution: drop the extreme 0.1% tails
+    q_low = histogram.quantile(0.001)
+    q_hi = histogram.quantile(0.999)
+    std_slip = histogram.moments.std or 0.0
+    if q_hi > q_low and (q_hi - q_low) < std_slip * 10:  # Heuristic
+        lower, upper, counts = histogram.nonempty(q_low, q_hi)
+    else:
+        lower, upper, counts = histogram.nonempty()
+    widths = upper - lower
+    plt.bar(
+        lower,
+        counts / (counts.sum() * widths),  # Density
+        width=widths,
+        align="edge",
+        alpha=0.7,
+    )
+    plt.title("Distribution of True Slippage % (Probes - Filtered for Visualization)")
+    plt.xlabel("True Slippage % (Walk-the-Book)")
+    plt.ylabel("Density")
+    plt.grid(True, which="both", ls="--", alpha=0.7)
+
+    mean_slip = histogram.moments.mean  # Exact, over all probes
+    median_slip = histogram.quantile(0.5)  # Bin resolution
+    plt.axvline(
+        mean_slip,
+        color="r",
+        linestyle="--",
+        linewidth=0.8,
+        label=f"Mean: {mean_slip:.4f}%",
+    )
+    plt.axvline(
+        median_slip,
+        color="g",
+        linestyle=":",
+        linewidth=0.8,
+        label=f"Median: {median_slip:.4f}%",
+    )
+    plt.legend()
+
+    plt.savefig(os.path.join(PLOT_OUTPUT_DIR, "true_slippage_distribution.png"))
+    plt.close()
+    print(f"Saved true_slippage_distribution.png to {PLOT_OUTPUT_DIR}")
+
+
 def plot_predicted_vs_user_order_size(df_user_pred):  # Renamed for clarity
     if df_user_pred.empty:
         print("User prediction data is empty.")
@@ -288,47 +398,72 @@ def plot_predicted_vs_user_order_size(df_user_pred):  # Renamed for clarity
         )
 
 
-def main():
-    print(f"Analyzing data from {DATA_LOG_FILE} and {PERFORMANCE_LOG_FILE}")
+def normalize_performance_rows(df_perf):
+    # Old logs' hold-out metrics get their own holdout_* columns, never prequential_*
+    df_perf = df_perf.rename(columns=LEGACY_PERFORMANCE_COLUMNS)
+    for col in [
+        "num_training_samples",
+        "prequential_mse",
+        "prequential_r2_score",
+        "holdout_mse",
+        "holdout_r2_score",
+    ]:
+        if col in df_perf.columns:
+            df_perf[col] = pd.to_numeric(df_perf[col], errors="coerce")
+    return df_perf
 
-    df_all = None
+
+def load_performance_log(use_columnar):
+    """Model performance rows (one per retrain, so small even for long runs)."""
+    df_perf = pd.DataFrame()  # Initialize as empty
     try:
-        df_all = pd.read_csv(DATA_LOG_FILE)
+        if use_columnar:
+            df_perf = load_stream(PERFORMANCE_STREAM, COLUMNAR_LOG_DIR)
+        else:
+            df_perf = pd.read_csv(PERFORMANCE_LOG_FILE, low_memory=False)
+        df_perf = normalize_performance_rows(df_perf)
+        if not df_perf.empty:
+            # df_perf.dropna(subset=['num_training_samples', 'prequential_mse', 'prequential_r2_score'], inplace=True) # Keep NaNs for now, plot func handles
+            print(f"Loaded {len(df_perf)} model performance records.")
+        else:
+            print(f"{PERFORMANCE_LOG_FILE} is empty.")
     except FileNotFoundError:
-        print(f"Error: {DATA_LOG_FILE} not found.")
-        # Exit if main data file not found
-        return
+        print(
+            f"Warning: {PERFORMANCE_LOG_FILE} not found. Skipping performance evolution plot."
+        )
     except Exception as e:
-        print(f"Error loading {DATA_LOG_FILE}: {e}")
-        return
+        print(f"Error loading or processing {PERFORMANCE_LOG_FILE}: {e}")
+
+    return df_perf
+
+
+def analyze_in_memory(use_columnar):
+    if use_columnar:
+        # Typed streams: one frame per row type, no wide-table split needed
+        print(f"Analyzing columnar logs from {COLUMNAR_LOG_DIR}")
+        df_probes = load_stream(PROBE_STREAM, COLUMNAR_LOG_DIR)
+        df_user_pred = load_stream(USER_PREDICTION_STREAM, COLUMNAR_LOG_DIR)
+    else:
+        print(f"Analyzing data from {DATA_LOG_FILE} and {PERFORMANCE_LOG_FILE}")
+        df_all = None
+        try:
+            df_all = pd.read_csv(DATA_LOG_FILE)
+        except FileNotFoundError:
+            print(f"Error: {DATA_LOG_FILE} not found.")
+            # Exit if main data file not found
+            return
+        except Exception as e:
+            print(f"Error loading {DATA_LOG_FILE}: {e}")
+            return
+        df_probes = df_all[df_all["probe_order_size_usd"].notna()].copy()
+        df_user_pred = df_all[df_all["user_order_size_usd"].notna()].copy()
 
     # --- Process Probe Data ---
-    df_probes = df_all[df_all["probe_order_size_usd"].notna()].copy()
     if not df_probes.empty:
-        for col in [
-            "probe_order_size_usd",
-            "market_spread_bps",
-            "market_depth_best_ask_usd",
-            "true_slippage_pct_walk_the_book",
-        ]:
-            df_probes[col] = pd.to_numeric(df_probes[col], errors="coerce")
-        df_probes.dropna(
-            subset=[
-                "probe_order_size_usd",
-                "market_spread_bps",
-                "market_depth_best_ask_usd",
-                "true_slippage_pct_walk_the_book",
-            ],
-            inplace=True,
-        )
-
-        # Filter out rows where market_spread_bps is negative (crossed book artifacts)
-        # This should already be handled by the data generation filter, but as a safeguard for analysis:
-        initial_probe_count = len(df_probes)
-        df_probes = df_probes[df_probes["market_spread_bps"] >= 0].copy()
-        if len(df_probes) < initial_probe_count:
+        df_probes, negative_spread = clean_probe_rows(df_probes.copy())
+        if negative_spread:
             print(
-                f"Filtered out {initial_probe_count - len(df_probes)} probe data points with negative spread_bps."
+                f"Filtered out {negative_spread} probe data points with negative spread_bps."
             )
 
         print(f"Loaded {len(df_probes)} valid probe data points for analysis.")
@@ -336,7 +471,6 @@ def main():
         print("No probe data found in log file.")
 
     # --- Process User Prediction Data ---
-    df_user_pred = df_all[df_all["user_order_size_usd"].notna()].copy()
     if not df_user_pred.empty:
         for col in ["user_order_size_usd", "predicted_slippage_pct_regression"]:
             df_user_pred[col] = pd.to_numeric(df_user_pred[col], errors="coerce")
@@ -349,31 +483,274 @@ def main():
         print("No user prediction data found in log file.")
 
     # --- Process Model Performance Data ---
-    df_perf = pd.DataFrame()  # Initialize as empty
+    df_perf = load_performance_log(use_columnar)
+
+    # --- Plot jobs (rendered by render_plots) ---
+    jobs = []
+    if not df_perf.empty:
+        jobs.append((plot_model_performance_evolution, (df_perf,)))
+    if not df_probes.empty:
+        probe_aggregates = ProbeAggregates(
+            ["probe_order_size_usd"] + market_feature_columns(df_probes)
+        )
+        probe_aggregates.add(df_probes)
+        jobs += feature_plot_jobs(probe_aggregates)
+        jobs.append((plot_slippage_distribution, (df_probes[[SLIPPAGE_COLUMN]],)))
+    if not df_user_pred.empty:
+        jobs.append((plot_predicted_vs_user_order_size, (df_user_pred,)))
+    return jobs
+
+
+def new_streaming_state(use_columnar):
+    """Running aggregates plus the watermarks of what they already include."""
+    return {
+        "version": ANALYSIS_CACHE_VERSION,
+        "source": "columnar" if use_columnar else "csv",
+        "regression_watermark": FileWatermark(DATA_LOG_FILE),
+        "performance_watermark": FileWatermark(PERFORMANCE_LOG_FILE),
+        "segment_watermarks": {
+            stream: SegmentWatermark()
+            for stream in (PROBE_STREAM, USER_PREDICTION_STREAM, PERFORMANCE_STREAM)
+        },
+        "probe_aggregates": None,
+        "user_sample": ReservoirSample(
+            USER_PREDICTION_COLUMNS, capacity=STREAM_SAMPLE_ROWS
+        ),
+        "negative_spread": 0,
+        "performance_rows": pd.DataFrame(),
+    }
+
+
+def load_streaming_state(use_columnar):
+    """The cached state if it still describes the current logs, otherwise a fresh one."""
+    state = load_cache(ANALYSIS_CACHE_FILE, ANALYSIS_CACHE_VERSION)
+    if state is None or state["source"] != ("columnar" if use_columnar else "csv"):
+        return new_streaming_state(use_columnar)
+    fresh = new_streaming_state(use_columnar)
+    if not use_columnar:
+        # A rotated or replaced log invalidates everything aggregated from it
+        if not state["regression_watermark"].matches_file():
+            print(
+                f"{DATA_LOG_FILE} changed since the cached run; rebuilding its aggregates."
+            )
+            for key in (
+                "regression_watermark",
+                "probe_aggregates",
+                "user_sample",
+                "negative_spread",
+            ):
+                state[key] = fresh[key]
+        if not state["performance_watermark"].matches_file():
+            for key in ("performance_watermark", "performance_rows"):
+                state[key] = fresh[key]
+    return state
+
+
+def iter_log_chunks(state):
+    """
+    Yields (probe rows, user prediction rows) DataFrames for the data not yet in
+    `state`, chunk by chunk, reading only the needed columns with explicit dtypes.
+    Watermarks advance as chunks are consumed.
+    """
+    if state["source"] == "columnar":
+        # Segments are immutable and each is bounded by COLUMNAR_SEGMENT_ROWS
+        for stream, columns in (
+            (PROBE_STREAM, None),
+            (USER_PREDICTION_STREAM, USER_PREDICTION_COLUMNS),
+        ):
+            watermark = state["segment_watermarks"][stream]
+            for path in watermark.new_segments(list_segments(COLUMNAR_LOG_DIR, stream)):
+                df = load_segment(path, columns)
+                if stream == PROBE_STREAM:
+                    yield df.drop(columns=["timestamp"], errors="ignore"), None
+                else:
+                    yield None, df
+                watermark.mark_consumed(path)
+        return
+
+    header = pd.read_csv(DATA_LOG_FILE, nrows=0).columns
+    numeric_columns = (
+        ["probe_order_size_usd"]
+        + [col for col in header if col.startswith("market_")]
+        + [SLIPPAGE_COLUMN]
+        + USER_PREDICTION_COLUMNS
+    )
+    for chunk in state["regression_watermark"].iter_new_chunks(
+        STREAM_CHUNK_ROWS,
+        usecols=numeric_columns,
+        dtype={col: "float64" for col in numeric_columns},
+    ):
+        yield (
+            chunk[chunk["probe_order_size_usd"].notna()],
+            chunk.loc[chunk["user_order_size_usd"].notna(), USER_PREDICTION_COLUMNS],
+        )
+
+
+def update_performance_rows(state):
+    """Appends new performance rows (one per retrain, so small even for long runs)."""
+    if state["source"] == "columnar":
+        watermark = state["segment_watermarks"][PERFORMANCE_STREAM]
+        new_paths = watermark.new_segments(
+            list_segments(COLUMNAR_LOG_DIR, PERFORMANCE_STREAM)
+        )
+        frames = [load_segment(path) for path in new_paths]
+        for path in new_paths:
+            watermark.mark_consumed(path)
+    else:
+        try:
+            frames = list(
+                state["performance_watermark"].iter_new_chunks(STREAM_CHUNK_ROWS)
+            )
+        except FileNotFoundError:
+            print(
+                f"Warning: {PERFORMANCE_LOG_FILE} not found. Skipping performance evolution plot."
+            )
+            frames = []
+    frames = [f for f in frames if not f.empty]
+    if frames:
+        state["performance_rows"] = normalize_performance_rows(
+            pd.concat([state["performance_rows"]] + frames, ignore_index=True)
+        )
+
+
+def analyze_streaming(use_columnar, incremental=False):
+    """
+    Same plots as analyze_in_memory, with peak memory independent of log size.
+    With `incremental`, aggregates and watermarks are cached between runs so only
+    rows appended since the last run are read, and plots whose data did not change
+    are not rendered again (as long as their files exist).
+    """
+    state = (
+        load_streaming_state(use_columnar)
+        if incremental
+        else new_streaming_state(use_columnar)
+    )
+    rows_before = state["probe_aggregates"].rows if state["probe_aggregates"] else 0
+    user_rows_before = state["user_sample"].seen
+    perf_rows_before = len(state["performance_rows"])
     try:
-        df_perf = pd.read_csv(PERFORMANCE_LOG_FILE)
-        if not df_perf.empty:
-            for col in ["num_training_samples", "test_mse", "test_r2_score"]:
-                df_perf[col] = pd.to_numeric(df_perf[col], errors="coerce")
-            # df_perf.dropna(subset=['num_training_samples', 'test_mse', 'test_r2_score'], inplace=True) # Keep NaNs for now, plot func handles
-            print(f"Loaded {len(df_perf)} model performance records.")
-        else:
-            print(f"{PERFORMANCE_LOG_FILE} is empty.")
+        for df_probes, df_user_pred in iter_log_chunks(state):
+            if df_probes is not None and not df_probes.empty:
+                df_probes, dropped = clean_probe_rows(df_probes.copy())
+                state["negative_spread"] += dropped
+                if state["probe_aggregates"] is None:
+                    state["probe_aggregates"] = ProbeAggregates(
+                        ["probe_order_size_usd"] + market_feature_columns(df_probes)
+                    )
+                state["probe_aggregates"].add(df_probes)
+            if df_user_pred is not None and not df_user_pred.empty:
+                state["user_sample"].add(df_user_pred.dropna())
     except FileNotFoundError:
+        print(f"Error: {DATA_LOG_FILE} not found.")
+        return
+    update_performance_rows(state)
+    if incremental:
+        save_cache(ANALYSIS_CACHE_FILE, state)
+
+    probe_aggregates = state["probe_aggregates"]
+    user_sample = state["user_sample"]
+    df_perf = state["performance_rows"]
+    probe_rows = probe_aggregates.rows if probe_aggregates else 0
+    if state["negative_spread"]:
         print(
-            f"Warning: {PERFORMANCE_LOG_FILE} not found. Skipping performance evolution plot."
+            f"Filtered out {state['negative_spread']} probe data points with negative spread_bps."
         )
-    except Exception as e:
-        print(f"Error loading or processing {PERFORMANCE_LOG_FILE}: {e}")
+    print(
+        f"Streamed {probe_rows - rows_before} new valid probe data points ({probe_rows} total), "
+        f"{user_sample.seen} user prediction data points and {len(df_perf)} model performance records."
+    )
+
+    # --- Plot jobs (rendered by render_plots) ---
+    def up_to_date(rows_changed, plot_files):
+        return incremental and not rows_changed and plots_exist(plot_files)
 
-    # --- Generate Plots ---
+    jobs = []
+    skipped = 0
     if not df_perf.empty:
-        plot_model_performance_evolution(df_perf)
-    if not df_probes.empty:
-        plot_feature_vs_slippage(df_probes)
-        plot_slippage_distribution(df_probes)
-    if not df_user_pred.empty:
-        plot_predicted_vs_user_order_size(df_user_pred)
+        if up_to_date(
+            len(df_perf) != perf_rows_before, ["model_performance_evolution.png"]
+        ):
+            skipped += 1
+        else:
+            jobs.append((plot_model_performance_evolution, (df_perf,)))
+    if probe_rows:
+        probe_jobs = feature_plot_jobs(probe_aggregates)
+        probe_jobs.append((plot_slippage_histogram, (probe_aggregates.slippage,)))
+        probe_files = [
+            f"{feature}_vs_true_slippage.png"
+            for feature in probe_aggregates.feature_columns
+        ] + ["true_slippage_distribution.png"]
+        if up_to_date(probe_rows != rows_before, probe_files):
+            skipped += len(probe_jobs)
+        else:
+            jobs += probe_jobs
+    if user_sample.filled:
+        if up_to_date(
+            user_sample.seen != user_rows_before,
+            ["predicted_slippage_vs_user_order_size.png"],
+        ):
+            skipped += 1
+        else:
+            jobs.append((plot_predicted_vs_user_order_size, (user_sample.to_frame(),)))
+    if skipped:
+        print(f"{skipped} plots are up to date; not rendering them again.")
+    return jobs
+
+
+def plots_exist(file_names):
+    return all(
+        os.path.exists(os.path.join(PLOT_OUTPUT_DIR, name)) for name in file_names
+    )
+
+
+def render_plots(jobs, workers):
+    """Renders independent plot jobs, in a process pool when `workers` > 1."""
+    if workers <= 1 or len(jobs) <= 1:
+        for plot_function, args in jobs:
+            plot_function(*args)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = [pool.submit(plot_function, *args) for plot_function, args in jobs]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error rendering plot: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline analysis of simulator logs.")
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Read logs in chunks into running aggregates (bounded memory for very large logs).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"Streaming mode that caches aggregates in {ANALYSIS_CACHE_FILE} and only reads rows appended since the last run.",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="With --incremental, discard the cache and reprocess all rows.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes used to render plots (1 renders serially).",
+    )
+    args = parser.parse_args()
+
+    use_columnar = bool(list_segments(COLUMNAR_LOG_DIR, PROBE_STREAM))
+    if args.rebuild_cache and os.path.exists(ANALYSIS_CACHE_FILE):
+        os.remove(ANALYSIS_CACHE_FILE)
+    if args.streaming or args.incremental:
+        jobs = analyze_streaming(use_columnar, incremental=args.incremental)
+    else:
+        jobs = analyze_in_memory(use_columnar)
+    render_plots(jobs or [], args.jobs)
 
     print(
         f"\nAnalysis complete. Plots saved to '{PLOT_OUTPUT_DIR}' directory if data was available."
@@ -0,0 +1,163 @@
+# src/analysis_cache.py
+"""
+Watermarks and on-disk state for incremental log analysis.
+
+The simulator logs are append-only, so an analysis that keeps its running
+aggregates (see log_aggregates.py) only needs to read what was appended since
+its last run. FileWatermark remembers the byte offset consumed from a CSV log
+(plus a hash of the file's head, so a rotated or replaced file is detected);
+SegmentWatermark remembers which immutable columnar segments were consumed.
+"""
+
+import csv
+import hashlib
+import io
+import logging
+import os
+import pickle
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+HEAD_HASH_BYTES = 4096  # Leading bytes hashed to recognise the same file across runs
+_SCAN_BLOCK_BYTES = 65536
+
+
+class _BoundedReader(io.RawIOBase):
+    """Read-only view of the next `limit` bytes of a binary file."""
+
+    def __init__(self, raw, limit: int):
+        self._raw = raw
+        self._remaining = limit
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._raw.read(size)
+        buffer[: len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+
+def _last_complete_line_end(f, size: int) -> int:
+    """Offset just past the last newline, so a line still being written is left for later."""
+    position = size
+    while position > 0:
+        start = max(0, position - _SCAN_BLOCK_BYTES)
+        f.seek(start)
+        block = f.read(position - start)
+        newline = block.rfind(b"\n")
+        if newline != -1:
+            return start + newline + 1
+        position = start
+    return 0
+
+
+class FileWatermark:
+    """How far an append-only CSV log has been consumed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header: Optional[List[str]] = None
+        self.offset = 0  # Bytes consumed, always at a line boundary
+        self.rows = 0
+        self._head_length = 0
+        self._head_hash: Optional[str] = None
+
+    def _hash_head(self, f, length: int) -> str:
+        f.seek(0)
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+    def matches_file(self) -> bool:
+        """False if the file disappeared, shrank, or its head changed (rotated/replaced)."""
+        if self._head_hash is None:
+            return True  # Nothing consumed yet
+        try:
+            with open(self.path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                return size >= self.offset and (
+                    self._hash_head(f, self._head_length) == self._head_hash
+                )
+        except FileNotFoundError:
+            return False
+
+    def iter_new_chunks(
+        self,
+        chunk_rows: int,
+        usecols: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yields DataFrame chunks of the complete rows appended since the watermark.
+        The watermark only advances once every chunk has been consumed.
+        """
+        with open(self.path, "rb") as f:
+            header_line = f.readline()
+            if not header_line.endswith(b"\n"):
+                return  # Header not fully written yet
+            header = next(csv.reader([header_line.decode("utf-8")]))
+            if self.header is None:
+                self.header = header
+                self.offset = len(header_line)
+            end = _last_complete_line_end(f, os.fstat(f.fileno()).st_size)
+            if end > self.offset:
+                f.seek(self.offset)
+                reader = io.BufferedReader(_BoundedReader(f, end - self.offset))
+                for chunk in pd.read_csv(
+                    reader,
+                    header=None,
+                    names=self.header,
+                    usecols=usecols,
+                    dtype=dtype,
+                    chunksize=chunk_rows,
+                ):
+                    self.rows += len(chunk)
+                    yield chunk
+                self.offset = end
+            self._head_length = min(self.offset, HEAD_HASH_BYTES)
+            self._head_hash = self._hash_head(f, self._head_length)
+
+
+class SegmentWatermark:
+    """Which immutable segment files (e.g. columnar log segments) were consumed."""
+
+    def __init__(self):
+        self.consumed: Set[str] = set()
+
+    def new_segments(self, paths: List[str]) -> List[str]:
+        return [p for p in paths if os.path.basename(p) not in self.consumed]
+
+    def mark_consumed(self, path: str):
+        self.consumed.add(os.path.basename(path))
+
+
+def load_cache(path: str, version: int) -> Optional[Dict[str, Any]]:
+    """Returns the cached state, or None if missing, unreadable or of another version."""
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable analysis cache {path}: {e}")
+        return None
+    if not isinstance(state, dict) or state.get("version") != version:
+        return None
+    return state
+
+
+def save_cache(path: str, state: Dict[str, Any]):
+    """Writes the state atomically, so an interrupted run never leaves a torn cache."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
@@ -0,0 +1,441 @@
+# src/batch_costing.py
+"""
+Headless batch costing of order files against historical or live order books.
+
+Reads a file of orders and prices each one (walk-the-book slippage, fees,
+market impact, net cost) against the book that was current at the order's
+timestamp, taken from a BookSnapshotStore (see book_snapshot_store.py), or
+against the latest book from the live feed with `--live`. No Tk window is
+involved.
+
+Orders are sorted by timestamp and split into contiguous time partitions, one
+per worker process; each worker memory-maps the store itself, so only the pages
+covering its time range are read. Within a partition, orders are priced in
+vectorized chunks; the results are gathered and written out in one go.
+
+Order file (CSV, or Parquet by extension) columns:
+    timestamp     epoch seconds or an ISO-8601 string
+    symbol        e.g. BTC-USDT-SWAP (selects the store, and the volume for impact)
+    side          buy | sell
+    quantity_usd  USD notional to fill
+    volatility    optional, defaults to --volatility
+    fee_tier      optional, defaults to --fee-tier
+
+    python -m src.book_snapshot_store build --feed-dir feed_recordings --out book_snapshots
+    python -m src.batch_costing --orders orders.csv --store book_snapshots --out costs.csv --jobs 8
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .config import (
+    BOOK_SNAPSHOT_DIR,
+    BOOK_SNAPSHOT_DEPTH,
+    BATCH_COSTING_CHUNK_ORDERS,
+)
+from .book_snapshot_store import (
+    ASK_SIDE,
+    BID_SIDE,
+    BookSnapshotStore,
+    snapshot_block,
+)
+from .financial_calculations import (
+    calculate_expected_fees,
+    calculate_market_impact_cost,
+)
+
+logger = logging.getLogger(__name__)
+
+ORDER_COLUMNS = ["timestamp", "symbol", "side", "quantity_usd"]
+ANY_SYMBOL = "*"  # Store key used for symbols without their own store
+
+# Store directory per symbol, or in-memory (timestamps, levels) for a live book
+BookSource = Union[str, Tuple[np.ndarray, np.ndarray]]
+
+
+def walk_book_batch(
+    side_levels: np.ndarray,
+    best_ask: np.ndarray,
+    best_bid: np.ndarray,
+    target_usd: np.ndarray,
+    is_buy: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized calculate_slippage_walk_book over many (book, order) pairs.
+
+    Args:
+        side_levels (np.ndarray): (N, depth, 2) [price, quantity] levels of the side each
+            order walks (asks for buys, bids for sells), best first, NaN-price padded.
+        best_ask (np.ndarray): (N,) best ask of each order's book.
+        best_bid (np.ndarray): (N,) best bid of each order's book.
+        target_usd (np.ndarray): (N,) USD notional to fill.
+        is_buy (np.ndarray): (N,) bool.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: slippage %, average
+        execution price, asset traded and USD filled per order (NaN where not calculable).
+    """
+    prices = side_levels[:, :, 0]
+    valid = ~np.isnan(prices)
+    quantities = np.where(valid, side_levels[:, :, 1], 0.0)
+    cum_usd = np.cumsum(np.where(valid, prices * quantities, 0.0), axis=1)
+    cum_qty = np.cumsum(quantities, axis=1)
+    rows = np.arange(len(target_usd))
+    depth = prices.shape[1]
+
+    # Levels consumed entirely, then a partial fill of the next level if there is one
+    full_levels = np.count_nonzero(cum_usd <= target_usd[:, None], axis=1)
+    last_full = np.maximum(full_levels - 1, 0)
+    usd_full = np.where(full_levels > 0, cum_usd[rows, last_full], 0.0)
+    asset_full = np.where(full_levels > 0, cum_qty[rows, last_full], 0.0)
+    next_level = np.minimum(full_levels, depth - 1)
+    remaining_usd = target_usd - usd_full
+    partial = (full_levels < depth) & valid[rows, next_level] & (remaining_usd > 1e-9)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        asset_partial = np.where(partial, remaining_usd / prices[rows, next_level], 0.0)
+        usd_filled = usd_full + np.where(partial, remaining_usd, 0.0)
+        asset_traded = asset_full + asset_partial
+
+        # Same reference as the scalar version: mid, or the touch on the traded side if crossed
+        crossed = best_ask <= best_bid
+        mid = np.where(
+            crossed, np.where(is_buy, best_ask, best_bid), (best_ask + best_bid) / 2.0
+        )
+        avg_price = np.where(asset_traded > 1e-9, usd_filled / asset_traded, np.nan)
+        slippage_pct = np.where(is_buy, avg_price - mid, mid - avg_price) / mid * 100.0
+    slippage_pct = np.where(target_usd <= 0, 0.0, slippage_pct)
+    return slippage_pct, avg_price, asset_traded, usd_filled
+
+
+def _resolve_books(source: BookSource) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(source, str):
+        store = BookSnapshotStore(source)
+        return store.timestamps, store.levels
+    return source
+
+
+def cost_orders(
+    orders: pd.DataFrame,
+    books: Dict[str, BookSource],
+    match_timestamps: bool = True,
+    max_book_age_s: Optional[float] = None,
+    chunk_orders: int = BATCH_COSTING_CHUNK_ORDERS,
+) -> pd.DataFrame:
+    """
+    Prices orders (normalized by load_orders) against the matching book snapshots.
+
+    Args:
+        orders (pd.DataFrame): Orders with an `order_index` column.
+        books (Dict[str, BookSource]): Book source per symbol; ANY_SYMBOL is the fallback.
+        match_timestamps (bool): Price each order against the latest snapshot at or
+            before its timestamp. If False, every order uses the latest snapshot.
+        max_book_age_s (Optional[float]): Orders whose book is older are not priced.
+        chunk_orders (int): Orders priced per vectorized step (bounds gathered levels).
+
+    Returns:
+        pd.DataFrame: One result row per order, in the input order.
+    """
+    results = []
+    fee_rates = {
+        tier: calculate_expected_fees(1.0, tier) for tier in orders["fee_tier"].unique()
+    }
+    # Impact is C * vol * (q / daily_volume) * q: quadratic in q, so one call per symbol gives the factor
+    impact_factors = {
+        symbol: calculate_market_impact_cost(1.0, 1.0, symbol)
+        for symbol in orders["symbol"].unique()
+    }
+
+    for symbol, symbol_orders in orders.groupby("symbol", sort=False):
+        source = books.get(symbol, books.get(ANY_SYMBOL))
+        timestamps, levels = (
+            _resolve_books(source) if source is not None else (np.empty(0), None)
+        )
+        for start in range(0, len(symbol_orders), chunk_orders):
+            chunk = symbol_orders.iloc[start : start + chunk_orders]
+            results.append(
+                _cost_chunk(
+                    chunk,
+                    timestamps,
+                    levels,
+                    match_timestamps,
+                    max_book_age_s,
+                    fee_rates,
+                    impact_factors[symbol],
+                )
+            )
+
+    if not results:
+        return pd.DataFrame()
+    return pd.concat(results, ignore_index=True).sort_values("order_index")
+
+
+def _cost_chunk(
+    chunk: pd.DataFrame,
+    timestamps: np.ndarray,
+    levels: Optional[np.ndarray],
+    match_timestamps: bool,
+    max_book_age_s: Optional[float],
+    fee_rates: Dict[str, float],
+    impact_factor: Optional[float],
+) -> pd.DataFrame:
+    n = len(chunk)
+    order_time = chunk["timestamp"].to_numpy(dtype=float)
+    target_usd = chunk["quantity_usd"].to_numpy(dtype=float)
+    is_buy = chunk["side"].to_numpy() == "buy"
+    volatility = chunk["volatility"].to_numpy(dtype=float)
+
+    if match_timestamps:
+        book_index = np.searchsorted(timestamps, order_time, side="right") - 1
+        book_index[np.isnan(order_time)] = -1
+    else:
+        book_index = np.full(n, len(timestamps) - 1)
+    status = np.full(n, "ok", dtype=object)
+    status[book_index < 0] = "no_book"
+    have_book = book_index >= 0
+    book_time = np.full(n, np.nan)
+    book_time[have_book] = timestamps[book_index[have_book]]
+    book_age_s = order_time - book_time if match_timestamps else np.full(n, np.nan)
+    if max_book_age_s is not None:
+        stale = have_book & (book_age_s > max_book_age_s)
+        status[stale] = "stale_book"
+        have_book &= ~stale
+    # Unparseable, non-positive or infinite sizes are not priced (the app rejects them too)
+    invalid = ~(np.isfinite(target_usd) & (target_usd > 0))
+    status[invalid] = "invalid_order"
+    have_book &= ~invalid
+
+    slippage_pct = np.full(n, np.nan)
+    avg_price = np.full(n, np.nan)
+    asset_traded = np.full(n, np.nan)
+    usd_filled = np.full(n, np.nan)
+    if have_book.any():
+        rows = np.nonzero(have_book)[0]
+        index = book_index[rows]
+        # Gathers only the best levels and the traded side of each order's book
+        best_ask = levels[index, ASK_SIDE, 0, 0]
+        best_bid = levels[index, BID_SIDE, 0, 0]
+        side = np.where(is_buy[rows], ASK_SIDE, BID_SIDE)
+        side_levels = levels[index, side]
+        empty = np.isnan(best_ask) | np.isnan(best_bid)
+        status[rows[empty]] = "empty_book"
+        rows, side_levels = rows[~empty], side_levels[~empty]
+        (
+            slippage_pct[rows],
+            avg_price[rows],
+            asset_traded[rows],
+            usd_filled[rows],
+        ) = walk_book_batch(
+            side_levels,
+            best_ask[~empty],
+            best_bid[~empty],
+            target_usd[rows],
+            is_buy[rows],
+        )
+        short = usd_filled[rows] < target_usd[rows] - 1e-6
+        status[rows[short]] = "partial_fill"  # Order larger than the stored depth
+
+    # Fees and impact are based on the executed value when available, as in TickPipeline
+    base_usd = np.where(usd_filled > 0, usd_filled, target_usd)
+    base_usd[invalid] = np.nan
+    fee_rate = chunk["fee_tier"].map(fee_rates).to_numpy(dtype=float)
+    fees_usd = base_usd * fee_rate
+    impact_usd = np.full(n, np.nan)
+    if impact_factor is not None:
+        valid_vol = volatility >= 0
+        impact_usd[valid_vol] = (
+            impact_factor * volatility[valid_vol] * base_usd[valid_vol] ** 2
+        )
+    slippage_cost_usd = slippage_pct / 100.0 * base_usd
+    net_cost_usd = slippage_cost_usd + fees_usd + impact_usd
+
+    result = chunk.copy()
+    result["book_index"] = book_index
+    result["book_timestamp"] = book_time
+    result["book_age_s"] = book_age_s
+    result["status"] = status
+    result["slippage_pct"] = slippage_pct
+    result["avg_execution_price"] = avg_price
+    result["asset_traded"] = asset_traded
+    result["usd_filled"] = usd_filled
+    result["slippage_cost_usd"] = slippage_cost_usd
+    result["fees_usd"] = fees_usd
+    result["market_impact_usd"] = impact_usd
+    result["net_cost_usd"] = net_cost_usd
+    return result
+
+
+def load_orders(
+    path: str, default_fee_tier: str, default_volatility: float
+) -> pd.DataFrame:
+    """Reads an order file and normalizes types; `order_index` keeps the input order."""
+    orders = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+    missing = [c for c in ORDER_COLUMNS if c not in orders.columns]
+    if missing:
+        raise ValueError(f"Order file {path} is missing columns: {missing}")
+    if not pd.api.types.is_numeric_dtype(orders["timestamp"]):
+        parsed = pd.to_datetime(orders["timestamp"], utc=True, errors="coerce")
+        orders["timestamp"] = (parsed - pd.Timestamp(0, tz="UTC")).dt.total_seconds()
+    orders["side"] = orders["side"].astype(str).str.strip().str.lower()
+    bad_side = ~orders["side"].isin(["buy", "sell"])
+    if bad_side.any():
+        raise ValueError(
+            f"Order file {path}: side must be buy or sell (row {int(np.argmax(bad_side))})."
+        )
+    orders["quantity_usd"] = pd.to_numeric(orders["quantity_usd"], errors="coerce")
+    if "volatility" not in orders.columns:
+        orders["volatility"] = default_volatility
+    orders["volatility"] = pd.to_numeric(orders["volatility"], errors="coerce").fillna(
+        default_volatility
+    )
+    if "fee_tier" not in orders.columns:
+        orders["fee_tier"] = default_fee_tier
+    orders["fee_tier"] = orders["fee_tier"].fillna(default_fee_tier)
+    orders.insert(0, "order_index", np.arange(len(orders)))
+    return orders
+
+
+def time_partitions(orders: pd.DataFrame, partitions: int) -> List[pd.DataFrame]:
+    """Splits orders into `partitions` contiguous time ranges of similar size."""
+    ordered = orders.sort_values("timestamp", kind="stable")
+    bounds = np.linspace(0, len(ordered), partitions + 1).astype(int)
+    return [
+        ordered.iloc[start:end]
+        for start, end in zip(bounds[:-1], bounds[1:])
+        if end > start
+    ]
+
+
+def run_batch(
+    orders: pd.DataFrame,
+    books: Dict[str, BookSource],
+    workers: int = 1,
+    match_timestamps: bool = True,
+    max_book_age_s: Optional[float] = None,
+) -> pd.DataFrame:
+    """Costs all orders, one time partition per worker process when `workers` > 1."""
+    if workers <= 1 or len(orders) < 2:
+        return cost_orders(orders, books, match_timestamps, max_book_age_s)
+    parts = time_partitions(orders, workers)
+    with ProcessPoolExecutor(max_workers=len(parts)) as pool:
+        futures = [
+            pool.submit(cost_orders, part, books, match_timestamps, max_book_age_s)
+            for part in parts
+        ]
+        results = [future.result() for future in futures]
+    return pd.concat(results, ignore_index=True).sort_values("order_index")
+
+
+async def fetch_live_book(
+    url: Optional[str] = None, depth: int = BOOK_SNAPSHOT_DEPTH
+) -> Tuple[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Connects to the feed and returns its symbol and first valid book, as a
+    one-snapshot (timestamps, levels) source. The symbol is the one the feed's
+    messages carry, or else the last path segment of the URL.
+    """
+    import websockets
+
+    from .order_book_manager import OrderBookManager
+    from .websocket_handler import WEBSOCKET_URL, apply_message_batch
+
+    url = url or WEBSOCKET_URL
+    order_book = OrderBookManager()
+    async with websockets.connect(url, ping_interval=None) as ws:
+        async for message in ws:
+            # Deltas before the first snapshot cannot be applied
+            apply_message_batch(order_book, [message], require_snapshot=True)
+            if order_book.asks and order_book.bids:
+                break
+    symbol = order_book.symbol or url.rstrip("/").rsplit("/", 1)[-1]
+    block = snapshot_block(order_book.asks, order_book.bids, depth)
+    return symbol, (np.array([time.time()]), block[np.newaxis])
+
+
+def parse_store_args(values: List[str]) -> Dict[str, str]:
+    """`DIR` applies to every symbol; `SYMBOL=DIR` to one symbol."""
+    stores = {}
+    for value in values:
+        symbol, sep, directory = value.partition("=")
+        if sep:
+            stores[symbol] = directory
+        else:
+            stores[ANY_SYMBOL] = value
+    return stores
+
+
+def write_results(results: pd.DataFrame, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.endswith(".parquet"):
+        results.to_parquet(path, index=False)
+    else:
+        results.to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cost a file of orders against recorded or live order books."
+    )
+    parser.add_argument(
+        "--orders", required=True, help="Order file (.csv or .parquet)."
+    )
+    parser.add_argument("--out", required=True, help="Result file (.csv or .parquet).")
+    parser.add_argument(
+        "--store",
+        action="append",
+        default=[],
+        help=f"Snapshot store DIR, or SYMBOL=DIR per symbol (repeatable). Default: {BOOK_SNAPSHOT_DIR}.",
+    )
+    parser.add_argument(
+        "--live",
+        action="store_true",
+        help="Price orders for the feed's symbol against its current live book instead.",
+    )
+    parser.add_argument(
+        "--ws-url", help="Feed URL for --live (default: WEBSOCKET_URL)."
+    )
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--fee-tier", default="Regular User LV1")
+    parser.add_argument("--volatility", type=float, default=0.02)
+    parser.add_argument(
+        "--max-book-age-s",
+        type=float,
+        help="Leave orders unpriced (status stale_book) if their book is older than this.",
+    )
+    args = parser.parse_args()
+
+    orders = load_orders(args.orders, args.fee_tier, args.volatility)
+    start = time.perf_counter()
+    if args.live:
+        # Only orders for the feed's own symbol are priced; the rest get no_book
+        symbol, book = asyncio.run(fetch_live_book(args.ws_url))
+        logger.info(f"Pricing {symbol} orders against the live book.")
+        books = {symbol: book}
+        results = run_batch(orders, books, workers=1, match_timestamps=False)
+    else:
+        books = parse_store_args(args.store or [BOOK_SNAPSHOT_DIR])
+        results = run_batch(
+            orders, books, args.jobs, max_book_age_s=args.max_book_age_s
+        )
+    elapsed_s = time.perf_counter() - start
+    write_results(results, args.out)
+
+    status_counts = results["status"].value_counts().to_dict() if len(results) else {}
+    print(
+        f"Costed {len(results)} orders in {elapsed_s:.2f}s "
+        f"({len(results) / elapsed_s if elapsed_s > 0 else 0:,.0f} orders/s) -> {args.out}: {status_counts}"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,149 @@
+# src/book_features.py
+"""
+Multi-level order book features for the slippage regression model.
+
+All features are computed from the array form of the book
+(`OrderBookManager.get_book_arrays()`) in a single vectorized pass per book
+version: per-level distance from mid, cumulative USD depth and a
+`searchsorted` against the configured bps bands give depth, imbalance and
+level counts for every band at once.
+"""
+
+import logging
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .config import BOOK_FEATURE_BANDS_BPS, SLIPPAGE_MODEL_FEATURES
+
+logger = logging.getLogger(__name__)
+
+
+class BookFeatureExtractor:
+    """
+    Computes a configurable feature vector from the current order book.
+
+    The order size is not part of the extracted vector; callers prepend it
+    (`[order_size_usd] + extractor.extract(book)`), since it differs per probe
+    while the book features are shared by every probe of a tick.
+    """
+
+    def __init__(
+        self,
+        feature_names: Optional[List[str]] = None,
+        bands_bps: Optional[List[float]] = None,
+    ):
+        self.bands_bps = np.array(
+            sorted(bands_bps if bands_bps is not None else BOOK_FEATURE_BANDS_BPS),
+            dtype=float,
+        )
+        self._all_names = self.available_features(self.bands_bps)
+        self.feature_names = list(
+            feature_names if feature_names is not None else SLIPPAGE_MODEL_FEATURES
+        )
+        unknown = [n for n in self.feature_names if n not in self._all_names]
+        if unknown:
+            raise ValueError(
+                f"Unknown book features {unknown}. Available: {self._all_names}"
+            )
+        self._selection = np.array(
+            [self._all_names.index(n) for n in self.feature_names], dtype=int
+        )
+
+        # Per-tick cache and cost reporting
+        self._cached_book_id = None
+        self._cached_version = None
+        self._cached_features: Optional[List[float]] = None
+        self.last_extraction_ms: Optional[float] = None
+
+    @staticmethod
+    def available_features(bands_bps) -> List[str]:
+        bands = [f"{b:g}" for b in bands_bps]
+        names = ["spread_bps", "depth_best_ask_usd"]
+        names += [f"ask_depth_usd_{b}bps" for b in bands]
+        names += [f"bid_depth_usd_{b}bps" for b in bands]
+        names += [f"imbalance_{b}bps" for b in bands]
+        names += [f"ask_levels_{b}bps" for b in bands]
+        names += [f"bid_levels_{b}bps" for b in bands]
+        names += ["ask_slope", "bid_slope"]
+        return names
+
+    def extract(self, order_book) -> Optional[List[float]]:
+        """
+        Returns the configured book features for the current book state, or None if
+        the book is empty or crossed. Results are cached per book version, so the
+        probe loop and the user prediction in the same tick pay for one extraction.
+        """
+        if (
+            self._cached_book_id == id(order_book)
+            and self._cached_version == order_book.version
+        ):
+            return self._cached_features
+
+        start_time = time.perf_counter()
+        asks, bids = order_book.get_book_arrays()
+        features = None
+        if len(asks) and len(bids) and asks[0, 0] > bids[0, 0]:
+            all_values = self._compute_all(asks, bids)
+            features = all_values[self._selection].tolist()
+        self.last_extraction_ms = (time.perf_counter() - start_time) * 1000
+
+        self._cached_book_id = id(order_book)
+        self._cached_version = order_book.version
+        self._cached_features = features
+        return features
+
+    def extract_dict(self, order_book) -> Dict[str, float]:
+        features = self.extract(order_book)
+        return dict(zip(self.feature_names, features)) if features else {}
+
+    def _compute_all(self, asks: np.ndarray, bids: np.ndarray) -> np.ndarray:
+        ask_prices, ask_qtys = asks[:, 0], asks[:, 1]
+        bid_prices, bid_qtys = bids[:, 0], bids[:, 1]
+        mid_price = (ask_prices[0] + bid_prices[0]) / 2.0
+        spread_bps = (ask_prices[0] - bid_prices[0]) / mid_price * 10000
+
+        # Distances from mid are ascending on both sides (asks ascend, bids descend)
+        ask_dist_bps = (ask_prices - mid_price) / mid_price * 10000
+        bid_dist_bps = (mid_price - bid_prices) / mid_price * 10000
+        ask_cum_usd = np.cumsum(ask_prices * ask_qtys)
+        bid_cum_usd = np.cumsum(bid_prices * bid_qtys)
+
+        ask_levels = np.searchsorted(ask_dist_bps, self.bands_bps, side="right")
+        bid_levels = np.searchsorted(bid_dist_bps, self.bands_bps, side="right")
+        ask_depth = np.where(ask_levels > 0, ask_cum_usd[ask_levels - 1], 0.0)
+        bid_depth = np.where(bid_levels > 0, bid_cum_usd[bid_levels - 1], 0.0)
+        total_depth = bid_depth + ask_depth
+        imbalance = np.divide(
+            bid_depth - ask_depth,
+            total_depth,
+            out=np.zeros_like(total_depth),
+            where=total_depth > 0,
+        )
+
+        # Slope: least-squares USD depth per bps (through the origin) over the widest band
+        widest = self.bands_bps[-1]
+        ask_slope = self._depth_slope(ask_dist_bps, ask_cum_usd, widest)
+        bid_slope = self._depth_slope(bid_dist_bps, bid_cum_usd, widest)
+
+        return np.concatenate(
+            (
+                [spread_bps, ask_prices[0] * ask_qtys[0]],
+                ask_depth,
+                bid_depth,
+                imbalance,
+                ask_levels,
+                bid_levels,
+                [ask_slope, bid_slope],
+            )
+        )
+
+    @staticmethod
+    def _depth_slope(dist_bps: np.ndarray, cum_usd: np.ndarray, max_bps: float):
+        in_band = dist_bps <= max_bps
+        d = dist_bps[in_band]
+        denominator = float(np.dot(d, d))
+        if denominator <= 0:
+            return 0.0
+        return float(np.dot(d, cum_usd[in_band]) / denominator)
@@ -0,0 +1,379 @@
+# src/book_snapshot_store.py
+"""
+Memory-mapped store of historical order book snapshots, indexed by time.
+
+Each snapshot is kept at a fixed depth as a (2, depth, 2) float64 block:
+[side][level][price, quantity], asks ascending then bids descending, exactly
+like OrderBookManager's lists. Levels beyond the book's depth have a NaN price.
+The blocks are appended to `levels.f8` and their timestamps (epoch seconds,
+non-decreasing) to `timestamps.f8`, so the store is two flat binary files that
+are memory-mapped for reading:
+
+- `at(t)`: the book as it was at time t (binary search on the timestamps).
+- `range(t0, t1)`: timestamps and level blocks in [t0, t1] as views of the map.
+
+Nothing is copied or parsed on read. A BookSnapshot exposes `asks`/`bids` as
+(N, 2) array views plus the OrderBookManager query methods, so
+calculate_slippage_walk_book, the feature extractor and TickPipeline can run
+directly against a historical snapshot.
+
+Build a store from raw feed recordings (see FeedRecorder):
+    python -m src.book_snapshot_store build --feed-dir feed_recordings --out book_snapshots
+    python -m src.book_snapshot_store query --dir book_snapshots --at 1746355153.2 --quantity-usd 50000
+"""
+
+import argparse
+import json
+import logging
+import os
+from typing import Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import BOOK_SNAPSHOT_DIR, BOOK_SNAPSHOT_DEPTH, FEED_RECORD_DIR
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMPS_FILE = "timestamps.f8"
+LEVELS_FILE = "levels.f8"
+META_FILE = "meta.json"
+STORE_FORMAT_VERSION = 1
+
+ASK_SIDE = 0
+BID_SIDE = 1
+
+
+def _side_depth(side: np.ndarray) -> int:
+    """Number of filled levels in a (depth, 2) side block (padding has NaN prices)."""
+    return side.shape[0] - int(np.count_nonzero(np.isnan(side[:, 0])))
+
+
+class BookSnapshot:
+    """
+    Read-only order book at one point in time, backed by a view of the store.
+
+    Duck-types the parts of OrderBookManager the cost functions use: `asks`/`bids`
+    ((N, 2) arrays of [price, quantity]), `get_book_arrays()`, `get_best_ask()`,
+    `get_best_bid()`, `get_spread()` and `version` (the snapshot's position in the
+    store, so per-version caches such as BookFeatureExtractor's stay valid).
+    """
+
+    def __init__(self, timestamp: float, levels: np.ndarray, index: int):
+        self.timestamp = timestamp
+        self.levels = levels
+        self.version = index
+        asks = levels[ASK_SIDE]
+        bids = levels[BID_SIDE]
+        self.asks = asks[: _side_depth(asks)]
+        self.bids = bids[: _side_depth(bids)]
+
+    def get_book_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.asks, self.bids
+
+    def get_best_ask(self) -> Optional[Tuple[float, float]]:
+        return tuple(self.asks[0]) if len(self.asks) else None
+
+    def get_best_bid(self) -> Optional[Tuple[float, float]]:
+        return tuple(self.bids[0]) if len(self.bids) else None
+
+    def get_spread(self) -> Optional[float]:
+        if len(self.asks) and len(self.bids):
+            return float(self.asks[0, 0] - self.bids[0, 0])
+        return None
+
+
+def snapshot_block(
+    asks: Sequence[Tuple[float, float]],
+    bids: Sequence[Tuple[float, float]],
+    depth: int,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Packs a book into a (2, depth, 2) block as stored (NaN-price padding, deeper levels dropped)."""
+    block = out if out is not None else np.empty((2, depth, 2), dtype="<f8")
+    block[:, :, 0] = np.nan
+    block[:, :, 1] = 0.0
+    for side, levels in ((ASK_SIDE, asks), (BID_SIDE, bids)):
+        levels = np.asarray(levels, dtype=float).reshape(-1, 2)[:depth]
+        block[side, : len(levels)] = levels
+    return block
+
+
+def _read_meta(directory: str) -> dict:
+    with open(os.path.join(directory, META_FILE)) as f:
+        return json.load(f)
+
+
+class BookSnapshotWriter:
+    """
+    Appends snapshots to a store directory (created if missing, resumed if present).
+
+    Each append writes the level block first and the timestamp last, so a reader
+    only ever counts snapshots whose levels are complete; a torn tail left by a
+    crash is trimmed when the store is reopened for writing.
+    """
+
+    def __init__(
+        self, directory: str = BOOK_SNAPSHOT_DIR, depth: int = BOOK_SNAPSHOT_DEPTH
+    ):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            meta = _read_meta(directory)
+            if meta["depth"] != depth:
+                logger.warning(
+                    f"Snapshot store {directory} has depth {meta['depth']}; ignoring requested depth {depth}."
+                )
+            depth = meta["depth"]
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"format": STORE_FORMAT_VERSION, "depth": depth}, f)
+        self.depth = depth
+        self._block_bytes = 2 * depth * 2 * 8
+
+        ts_path = os.path.join(directory, TIMESTAMPS_FILE)
+        levels_path = os.path.join(directory, LEVELS_FILE)
+        self.count = self._trim_torn_tail(ts_path, levels_path)
+        self.last_timestamp = -np.inf
+        if self.count:
+            self.last_timestamp = float(
+                np.fromfile(ts_path, dtype="<f8", offset=(self.count - 1) * 8)[0]
+            )
+        self._ts_file = open(ts_path, "ab")
+        self._levels_file = open(levels_path, "ab")
+        self._block = np.empty((2, depth, 2), dtype="<f8")
+
+        # --- Metrics ---
+        self.snapshots_written = 0
+        self.snapshots_rejected = 0  # Out-of-order timestamps
+
+    def _trim_torn_tail(self, ts_path: str, levels_path: str) -> int:
+        ts_count = os.path.getsize(ts_path) // 8 if os.path.exists(ts_path) else 0
+        levels_count = (
+            os.path.getsize(levels_path) // self._block_bytes
+            if os.path.exists(levels_path)
+            else 0
+        )
+        count = min(ts_count, levels_count)
+        for path, size in (
+            (ts_path, count * 8),
+            (levels_path, count * self._block_bytes),
+        ):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                logger.warning(f"Trimming torn tail of {path} to {size} bytes.")
+                os.truncate(path, size)
+        return count
+
+    def append(
+        self,
+        timestamp: float,
+        asks: Sequence[Tuple[float, float]],
+        bids: Sequence[Tuple[float, float]],
+    ) -> bool:
+        """
+        Appends one snapshot; levels beyond the store depth are dropped. Returns False
+        (and counts a rejection) if `timestamp` is earlier than the last one, since
+        the time index must stay sorted.
+        """
+        if timestamp < self.last_timestamp:
+            self.snapshots_rejected += 1
+            return False
+        block = snapshot_block(asks, bids, self.depth, out=self._block)
+        self._levels_file.write(block.tobytes())
+        self._ts_file.write(np.array([timestamp], dtype="<f8").tobytes())
+        self.last_timestamp = timestamp
+        self.count += 1
+        self.snapshots_written += 1
+        return True
+
+    def append_book(self, order_book, timestamp: float) -> bool:
+        """Appends the current state of an OrderBookManager."""
+        return self.append(timestamp, order_book.asks, order_book.bids)
+
+    def flush(self):
+        # Levels before timestamps, so a concurrent reader never sees a timestamp ahead of its block
+        self._levels_file.flush()
+        self._ts_file.flush()
+
+    def close(self):
+        self.flush()
+        self._levels_file.close()
+        self._ts_file.close()
+
+
+class BookSnapshotStore:
+    """Read side of a snapshot store: memory-mapped, binary-searched by time."""
+
+    def __init__(self, directory: str = BOOK_SNAPSHOT_DIR):
+        self.directory = directory
+        self.depth = _read_meta(directory)["depth"]
+        self.timestamps = np.empty(0, dtype="<f8")
+        self.levels = np.empty((0, 2, self.depth, 2), dtype="<f8")
+        self.refresh()
+
+    def refresh(self):
+        """Re-maps the files to pick up snapshots appended since opening."""
+        ts_path = os.path.join(self.directory, TIMESTAMPS_FILE)
+        levels_path = os.path.join(self.directory, LEVELS_FILE)
+        block_bytes = 2 * self.depth * 2 * 8
+        count = min(
+            os.path.getsize(ts_path) // 8 if os.path.exists(ts_path) else 0,
+            (
+                os.path.getsize(levels_path) // block_bytes
+                if os.path.exists(levels_path)
+                else 0
+            ),
+        )
+        if count == len(self.timestamps):
+            return
+        # np.memmap cannot map an empty file, hence the guard above
+        self.timestamps = np.memmap(ts_path, dtype="<f8", mode="r", shape=(count,))
+        self.levels = np.memmap(
+            levels_path, dtype="<f8", mode="r", shape=(count, 2, self.depth, 2)
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def time_span(self) -> Optional[Tuple[float, float]]:
+        if not len(self):
+            return None
+        return float(self.timestamps[0]), float(self.timestamps[-1])
+
+    def index_at(self, timestamp: float) -> int:
+        """Index of the last snapshot at or before `timestamp`, or -1 if there is none."""
+        return int(np.searchsorted(self.timestamps, timestamp, side="right")) - 1
+
+    def snapshot(self, index: int) -> BookSnapshot:
+        return BookSnapshot(float(self.timestamps[index]), self.levels[index], index)
+
+    def at(self, timestamp: float) -> Optional[BookSnapshot]:
+        """The book as it was at `timestamp` (the latest snapshot not after it)."""
+        index = self.index_at(timestamp)
+        return self.snapshot(index) if index >= 0 else None
+
+    def range(self, start: float, end: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Timestamps (N,) and level blocks (N, 2, depth, 2) of the snapshots with
+        start <= t <= end, as views of the memory map (nothing is read until used).
+        """
+        first = int(np.searchsorted(self.timestamps, start, side="left"))
+        last = int(np.searchsorted(self.timestamps, end, side="right"))
+        return self.timestamps[first:last], self.levels[first:last]
+
+    def iter_snapshots(self, start: float, end: float) -> Iterator[BookSnapshot]:
+        first = int(np.searchsorted(self.timestamps, start, side="left"))
+        last = int(np.searchsorted(self.timestamps, end, side="right"))
+        for index in range(first, last):
+            yield self.snapshot(index)
+
+
+def best_prices(levels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Best ask and best bid prices of a (N, 2, depth, 2) block, e.g. from `range()`."""
+    return levels[:, ASK_SIDE, 0, 0], levels[:, BID_SIDE, 0, 0]
+
+
+def build_from_recording(
+    feed_dir: str = FEED_RECORD_DIR,
+    store_dir: str = BOOK_SNAPSHOT_DIR,
+    depth: int = BOOK_SNAPSHOT_DEPTH,
+    start_wall: Optional[float] = None,
+    end_wall: Optional[float] = None,
+) -> dict:
+    """
+    Appends one snapshot per accepted message of a raw feed recording, stamped
+    with the recorded arrival (wall) time. Messages are applied like the live
+    ingest applies them (apply_message_batch), deltas included. Returns counts.
+    """
+    from .order_book_manager import OrderBookManager
+    from .websocket_handler import apply_message_batch, read_recorded_feed
+
+    order_book = OrderBookManager()
+    writer = BookSnapshotWriter(store_dir, depth)
+    messages = parse_errors = skipped_before_snapshot = 0
+    # Deltas only make sense on top of a snapshot, as in the live ingest
+    awaiting_snapshot = True
+    try:
+        for wall_time, _, raw_message in read_recorded_feed(
+            feed_dir, start_wall, end_wall
+        ):
+            messages += 1
+            version = order_book.version
+            applied, _ = apply_message_batch(
+                order_book, [raw_message], require_snapshot=awaiting_snapshot
+            )
+            if not applied:
+                if awaiting_snapshot:
+                    skipped_before_snapshot += 1
+                else:
+                    parse_errors += 1
+                continue
+            awaiting_snapshot = False
+            if order_book.version == version:
+                parse_errors += 1
+                continue
+            writer.append_book(order_book, wall_time)
+    finally:
+        writer.close()
+    return {
+        "messages": messages,
+        "parse_errors": parse_errors,
+        "skipped_before_snapshot": skipped_before_snapshot,
+        "snapshots_written": writer.snapshots_written,
+        "snapshots_rejected": writer.snapshots_rejected,
+        "store_snapshots": writer.count,
+    }
+
+
+def main():
+    from .financial_calculations import calculate_slippage_walk_book
+
+    parser = argparse.ArgumentParser(
+        description="Historical order book snapshot store."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser(
+        "build", help="Append snapshots from a feed recording."
+    )
+    build.add_argument("--feed-dir", default=FEED_RECORD_DIR)
+    build.add_argument("--out", default=BOOK_SNAPSHOT_DIR)
+    build.add_argument("--depth", type=int, default=BOOK_SNAPSHOT_DEPTH)
+    build.add_argument("--start", type=float, help="Window start (epoch seconds).")
+    build.add_argument("--end", type=float, help="Window end (epoch seconds).")
+    query = subparsers.add_parser("query", help="Show the book at a point in time.")
+    query.add_argument("--dir", default=BOOK_SNAPSHOT_DIR)
+    query.add_argument("--at", type=float, required=True, help="Epoch seconds.")
+    query.add_argument("--quantity-usd", type=float, default=100.0)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        counts = build_from_recording(
+            args.feed_dir, args.out, args.depth, args.start, args.end
+        )
+        print(f"Built snapshot store {args.out}: {counts}")
+    elif args.command == "query":
+        store = BookSnapshotStore(args.dir)
+        snapshot = store.at(args.at)
+        if snapshot is None:
+            print(
+                f"No snapshot at or before {args.at} (store span: {store.time_span})."
+            )
+            return
+        slippage_pct, avg_price, asset, usd_spent = calculate_slippage_walk_book(
+            args.quantity_usd, snapshot
+        )
+        print(
+            f"Snapshot #{snapshot.version} @ {snapshot.timestamp:.3f}: "
+            f"best ask {snapshot.get_best_ask()}, best bid {snapshot.get_best_bid()}, "
+            f"{len(snapshot.asks)}/{len(snapshot.bids)} levels"
+        )
+        print(
+            f"Buy ${args.quantity_usd:,.2f}: slippage {slippage_pct}%, avg price {avg_price}, "
+            f"asset {asset}, spent ${usd_spent:,.2f}"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
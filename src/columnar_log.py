@@ -0,0 +1,363 @@
+# src/columnar_log.py
+"""
+Typed, columnar storage for the simulator logs.
+
+The CSV regression log is one wide table where most columns are empty depending
+on the row type, and every analysis run has to parse and coerce all of it. The
+columnar format instead keeps one stream per row type (probes,
+user_predictions, model_performance), each written as chunked segment files of
+typed column arrays: `.npz` (NumPy only) or Parquet when pyarrow is installed.
+
+Run as a script to convert existing CSV logs:
+    python -m src.columnar_log convert --regression-csv slippage_regression_log.csv \\
+        --performance-csv model_performance_log.csv --out logs_columnar
+"""
+
+import argparse
+import glob
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import (
+    REGRESSION_DATA_LOG_FILE,
+    MODEL_PERFORMANCE_LOG_FILE,
+    COLUMNAR_LOG_DIR,
+    COLUMNAR_SEGMENT_ROWS,
+    COLUMNAR_SEGMENT_MAX_AGE_S,
+)
+
+try:  # Optional dependency, only needed for the "parquet" format
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on environment
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+PROBE_STREAM = "probes"
+USER_PREDICTION_STREAM = "user_predictions"
+PERFORMANCE_STREAM = "model_performance"
+
+Schema = List[Tuple[str, str]]  # (column name, numpy dtype string)
+# Performance columns of logs from before prequential evaluation, which scored a
+# hold-out split (a different metric from the prequential one)
+LEGACY_PERFORMANCE_COLUMNS = {
+    "test_mse": "holdout_mse",
+    "test_r2_score": "holdout_r2_score",
+}
+
+
+# --- Stream schemas ---
+def probe_schema(feature_names: Sequence[str]) -> Schema:
+    return (
+        [("timestamp", "datetime64[ms]"), ("probe_order_size_usd", "f8")]
+        + [(f"market_{name}", "f8") for name in feature_names]
+        + [
+            ("true_slippage_pct_walk_the_book", "f8"),
+            ("feature_extraction_ms", "f4"),
+            ("probe_sample_weight", "f4"),
+        ]
+    )
+
+
+USER_PREDICTION_SCHEMA: Schema = [
+    ("timestamp", "datetime64[ms]"),
+    ("is_model_trained_at_prediction", "?"),
+    ("user_order_size_usd", "f8"),
+    ("predicted_slippage_pct_regression", "f8"),
+]
+
+
+def performance_schema(size_bucket_labels: Sequence[str]) -> Schema:
+    return [
+        ("training_timestamp", "datetime64[ms]"),
+        ("num_training_samples", "f8"),
+        ("prequential_mse", "f8"),
+        ("prequential_r2_score", "f8"),
+        ("prequential_bias_pct", "f8"),
+        ("prequential_eval_samples", "f8"),
+        ("retrain_reason", "U16"),
+    ] + [(f"bias_pct_size_{label}", "f8") for label in size_bucket_labels]
+
+
+def resolve_format(log_format: str) -> str:
+    if log_format == "parquet" and pq is None:
+        logger.warning("pyarrow is not installed; writing columnar logs as .npz.")
+        return "npz"
+    return log_format
+
+
+def _to_column(values: Sequence[Any], dtype: str) -> np.ndarray:
+    if dtype.startswith("datetime64"):
+        # Rows carry epoch seconds (time.time()); None becomes NaT
+        epoch_ms = [np.nan if v is None else float(v) * 1000 for v in values]
+        column = np.array(epoch_ms, dtype="f8")
+        missing = np.isnan(column)
+        result = np.where(missing, 0, column).astype("i8").astype(dtype)
+        result[missing] = np.datetime64("NaT")
+        return result
+    if dtype == "?":
+        return np.array([bool(v) for v in values], dtype=bool)
+    if dtype.startswith("U"):
+        return np.array(["" if v is None else str(v) for v in values], dtype=dtype)
+    return np.array(values, dtype=dtype)  # None -> NaN for float dtypes
+
+
+def write_segment(path_without_ext: str, columns: Dict[str, np.ndarray], fmt: str):
+    """Writes one segment file from typed columns; returns the path written."""
+    if fmt == "parquet":
+        path = path_without_ext + ".parquet"
+        table = pa.table({name: pa.array(col) for name, col in columns.items()})
+        pq.write_table(table, path)
+    else:
+        path = path_without_ext + ".npz"
+        np.savez(path, **columns)
+    return path
+
+
+class ColumnarSink:
+    """
+    Log sink (see BufferedLogWriter) that buffers rows and writes them as one typed
+    segment file per `segment_rows` rows, or per `max_segment_age_s` when flushed.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        stream: str,
+        schema: Schema,
+        fmt: str = "npz",
+        segment_rows: int = COLUMNAR_SEGMENT_ROWS,
+        max_segment_age_s: float = COLUMNAR_SEGMENT_MAX_AGE_S,
+    ):
+        self.stream_dir = os.path.join(directory, stream)
+        os.makedirs(self.stream_dir, exist_ok=True)
+        self.schema = list(schema)
+        self.fmt = resolve_format(fmt)
+        self.segment_rows = segment_rows
+        self.max_segment_age_s = max_segment_age_s
+        # Unique per process run, so segments from concurrent/previous runs never collide
+        self._run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._segment_seq = 0
+        self._rows: List[Sequence[Any]] = []
+        self._segment_started = time.monotonic()
+        self.segments_written = 0
+
+    def write_rows(self, rows: List[Sequence[Any]]):
+        if not self._rows:
+            self._segment_started = time.monotonic()
+        self._rows.extend(rows)
+        while len(self._rows) >= self.segment_rows:
+            self._write_segment(self._rows[: self.segment_rows])
+            self._rows = self._rows[self.segment_rows :]
+
+    def flush(self):
+        # Segments are immutable; a partial one is only cut once it gets old enough
+        if self._rows and (
+            time.monotonic() - self._segment_started >= self.max_segment_age_s
+        ):
+            self._write_segment(self._rows)
+            self._rows = []
+
+    def close(self):
+        if self._rows:
+            self._write_segment(self._rows)
+            self._rows = []
+
+    def _write_segment(self, rows: List[Sequence[Any]]):
+        transposed = list(zip(*rows))
+        columns = {
+            name: _to_column(values, dtype)
+            for (name, dtype), values in zip(self.schema, transposed)
+        }
+        self._segment_seq += 1
+        write_segment(
+            os.path.join(self.stream_dir, f"{self._run_id}-{self._segment_seq:06d}"),
+            columns,
+            self.fmt,
+        )
+        self.segments_written += 1
+
+
+def list_segments(directory: str, stream: str) -> List[str]:
+    stream_dir = os.path.join(directory, stream)
+    return sorted(
+        glob.glob(os.path.join(stream_dir, "*.npz"))
+        + glob.glob(os.path.join(stream_dir, "*.parquet"))
+    )
+
+
+def load_segment(path: str, columns: Optional[List[str]] = None):
+    """Loads one segment file into a pandas DataFrame."""
+    import pandas as pd  # Analysis-side dependency only
+
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    with np.load(path, allow_pickle=False) as segment:
+        names = columns if columns is not None else segment.files
+        return pd.DataFrame({n: segment[n] for n in names if n in segment.files})
+
+
+def iter_stream_segments(
+    stream: str,
+    directory: str = COLUMNAR_LOG_DIR,
+    columns: Optional[List[str]] = None,
+):
+    """Yields one pandas DataFrame per segment, so a stream can be processed in bounded memory."""
+    for path in list_segments(directory, stream):
+        yield load_segment(path, columns)
+
+
+def load_stream(
+    stream: str,
+    directory: str = COLUMNAR_LOG_DIR,
+    columns: Optional[List[str]] = None,
+):
+    """Loads all segments of a stream into one pandas DataFrame (typed, no coercion needed)."""
+    import pandas as pd
+
+    frames = list(iter_stream_segments(stream, directory, columns))
+    if not frames:
+        return pd.DataFrame(columns=columns or [])
+    return pd.concat(frames, ignore_index=True)
+
+
+# --- CSV -> columnar conversion ---
+def _utc_datetimes(values):
+    """
+    Parses CSV timestamps into naive UTC, the way live rows are stored (epoch
+    seconds). The CSV writer uses local time without an offset, so naive values
+    are localized to the local timezone (DST included) before conversion.
+    """
+    import pandas as pd
+    from dateutil import tz
+
+    parsed = pd.to_datetime(values, errors="coerce")
+    if parsed.dt.tz is None:
+        parsed = parsed.dt.tz_localize(tz.tzlocal(), ambiguous="NaT", nonexistent="NaT")
+    return parsed.dt.tz_convert("UTC").dt.tz_localize(None)
+
+
+def _frame_columns(df, schema: Schema) -> Dict[str, np.ndarray]:
+    import pandas as pd
+
+    columns = {}
+    for name, dtype in schema:
+        if name not in df.columns:  # Older logs lack newer columns
+            values = pd.Series([None] * len(df), dtype=object)
+        else:
+            values = df[name]
+        if dtype.startswith("datetime64"):
+            columns[name] = _utc_datetimes(values).to_numpy().astype(dtype)
+        elif dtype == "?":
+            columns[name] = values.astype(str).str.lower().eq("true").to_numpy()
+        elif dtype.startswith("U"):
+            columns[name] = values.fillna("").astype(str).to_numpy().astype(dtype)
+        else:
+            columns[name] = pd.to_numeric(values, errors="coerce").to_numpy(dtype)
+    return columns
+
+
+def convert_csv_logs(
+    regression_csv: Optional[str],
+    performance_csv: Optional[str],
+    out_dir: str = COLUMNAR_LOG_DIR,
+    fmt: str = "npz",
+    chunk_rows: int = COLUMNAR_SEGMENT_ROWS,
+) -> Dict[str, int]:
+    """
+    Converts existing CSV logs into columnar streams, reading `chunk_rows` rows at a
+    time so arbitrarily large logs convert in bounded memory.
+
+    Returns:
+        Dict[str, int]: Rows written per stream.
+    """
+    import pandas as pd
+
+    fmt = resolve_format(fmt)
+    written = {PROBE_STREAM: 0, USER_PREDICTION_STREAM: 0, PERFORMANCE_STREAM: 0}
+    run_id = f"converted-{time.strftime('%Y%m%d-%H%M%S')}"
+
+    def emit(stream: str, df, schema: Schema, seq: int):
+        if df.empty:
+            return
+        stream_dir = os.path.join(out_dir, stream)
+        os.makedirs(stream_dir, exist_ok=True)
+        write_segment(
+            os.path.join(stream_dir, f"{run_id}-{seq:06d}"),
+            _frame_columns(df, schema),
+            fmt,
+        )
+        written[stream] += len(df)
+
+    if regression_csv and os.path.exists(regression_csv):
+        header = pd.read_csv(regression_csv, nrows=0).columns
+        feature_names = [c[len("market_") :] for c in header if c.startswith("market_")]
+        schema_probes = probe_schema(feature_names)
+        for seq, chunk in enumerate(
+            pd.read_csv(regression_csv, chunksize=chunk_rows, low_memory=False)
+        ):
+            chunk = chunk.rename(columns={"timestamp_data_collected": "timestamp"})
+            emit(
+                PROBE_STREAM,
+                chunk[chunk["probe_order_size_usd"].notna()],
+                schema_probes,
+                seq,
+            )
+            emit(
+                USER_PREDICTION_STREAM,
+                chunk[chunk["user_order_size_usd"].notna()],
+                USER_PREDICTION_SCHEMA,
+                seq,
+            )
+
+    if performance_csv and os.path.exists(performance_csv):
+        header = pd.read_csv(performance_csv, nrows=0).columns
+        labels = [
+            c[len("bias_pct_size_") :] for c in header if c.startswith("bias_pct_size_")
+        ]
+        # Hold-out metrics of old logs are kept, in their own columns
+        schema_performance = performance_schema(labels) + [
+            (LEGACY_PERFORMANCE_COLUMNS[c], "f8")
+            for c in header
+            if c in LEGACY_PERFORMANCE_COLUMNS
+        ]
+        for seq, chunk in enumerate(
+            pd.read_csv(performance_csv, chunksize=chunk_rows, low_memory=False)
+        ):
+            chunk = chunk.rename(columns=LEGACY_PERFORMANCE_COLUMNS)
+            emit(PERFORMANCE_STREAM, chunk, schema_performance, seq)
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar simulator log tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert = subparsers.add_parser("convert", help="Convert CSV logs to columnar.")
+    convert.add_argument("--regression-csv", default=REGRESSION_DATA_LOG_FILE)
+    convert.add_argument("--performance-csv", default=MODEL_PERFORMANCE_LOG_FILE)
+    convert.add_argument("--out", default=COLUMNAR_LOG_DIR)
+    convert.add_argument("--format", choices=["npz", "parquet"], default="npz")
+    convert.add_argument("--chunk-rows", type=int, default=COLUMNAR_SEGMENT_ROWS)
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        written = convert_csv_logs(
+            args.regression_csv,
+            args.performance_csv,
+            out_dir=args.out,
+            fmt=args.format,
+            chunk_rows=args.chunk_rows,
+        )
+        print(f"Converted rows per stream into {args.out}: {written}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
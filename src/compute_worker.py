@@ -0,0 +1,324 @@
+# src/compute_worker.py
+"""
+Runs the tick pipeline on a dedicated thread, off the Tk main loop.
+
+The WebSocket thread hands each new book version to `submit_book()` as a
+snapshot (see OrderBookManager.snapshot), and the UI hands over validated order
+inputs with `set_inputs()`. The worker runs probes and training for every book
+version; the cost estimate is left to a RecalcScheduler (recalc_scheduler.py),
+which recomputes only the parts whose inputs changed, at most once per frame
+while books are queued. Each recompute produces an immutable ComputeResult
+holding everything the UI shows (book summary, costs, model metrics, latencies)
+and passes it to `on_result`. A book whose exchange timestamp (see feed_clock.py) is
+older than BOOK_STALE_AFTER_MS is stale: it gets no probes and no estimate, and
+the age is re-checked while no new book arrives; the app feeds results through an UpdateConflator (ui_conflator.py)
+so Tk only renders the newest one, and never runs compute itself.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from .config import BOOK_STALE_AFTER_MS, COMPUTE_QUEUE_MAX_BOOKS
+from .pipeline import CostEstimate, TickPipeline, TickResult
+from .recalc_scheduler import RecalcScheduler
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()  # Queue sentinel for shutdown
+_INPUTS_CHANGED = object()
+
+
+class OrderInputs(NamedTuple):
+    quantity_usd: Optional[float]
+    fee_tier: str
+    volatility: Optional[float]
+    asset_symbol: str
+    error: Optional[str] = None  # e.g. "Invalid Qty"; no estimate is computed
+
+
+class ModelStatus(NamedTuple):
+    training_samples: float
+    mse: Optional[float]
+    r2: Optional[float]
+    bias: Optional[float]
+    bias_by_size: Tuple[Tuple[str, Optional[float]], ...]
+    retrains_on_drift: int
+    retrains_on_max_interval: int
+    retrains_skipped: int
+    probe_ticks_used: int
+    probe_ticks_skipped: int
+    volatility_bps: float
+    log_queue_depth: int
+    log_rows_dropped: int
+    recomputes: int
+    recomputations_avoided: int
+
+
+class ComputeResult(NamedTuple):
+    seq: int  # Increases with every result published
+    book_version: int
+    book_timestamp: str
+    symbol: str
+    best_bid: Optional[Tuple[float, float]]
+    best_ask: Optional[Tuple[float, float]]
+    spread: Optional[float]
+    book_age_ms: Optional[float]  # Since the exchange timestamp; None if unknown
+    book_stale: bool  # Older than BOOK_STALE_AFTER_MS: no probes, no estimate
+    tick: Optional[TickResult]  # Latest tick; None before the first probed book
+    estimate: Optional[CostEstimate]  # None if the inputs are invalid or on error
+    # Input validation message, "Stale Book", or "Error" if compute failed
+    error: Optional[str]
+    model: Optional[ModelStatus]
+    # perf_counter() when the book's message arrived; None if the book was already shown
+    arrival_perf: Optional[float]
+    queue_wait_ms: Optional[float]  # Arrival to tick start, for the latest book
+    tick_ms: Optional[float]  # Probes + training, for the latest book
+    estimate_ms: Optional[float]  # Cost estimate for the user order
+    completed_perf: float
+
+
+class ComputeWorker:
+    def __init__(
+        self,
+        pipeline: TickPipeline,
+        logs=None,
+        on_result: Optional[Callable[[ComputeResult], None]] = None,
+        max_queue_books: int = COMPUTE_QUEUE_MAX_BOOKS,
+        stale_after_ms: float = BOOK_STALE_AFTER_MS,
+        profiling=None,
+    ):
+        """
+        Args:
+            pipeline (TickPipeline): Pipeline to drive; only this worker's thread uses it.
+            logs (SimulatorLogs): Optional, for the queue depth/drop counters.
+            on_result (Callable): Called from the worker thread with every new result.
+            max_queue_books (int): Books waiting beyond this are dropped and counted.
+            stale_after_ms (float): Book age (from its exchange timestamp) at which
+                probes and estimates are suppressed.
+            profiling (ProfilingHooks): Optional; queue items are its "compute" ticks.
+        """
+        self.pipeline = pipeline
+        self.logs = logs
+        self.on_result = on_result
+        self.profiling = profiling
+        self._queue: "queue.Queue[object]" = queue.Queue(maxsize=max_queue_books)
+        self._inputs: Optional[OrderInputs] = None
+        self._book = None
+        self._tick: Optional[TickResult] = None
+        self._arrival_perf: Optional[float] = None  # Of a book not yet published
+        self._queue_wait_ms: Optional[float] = None
+        self._tick_ms: Optional[float] = None
+        self.stale_after_ms = stale_after_ms
+        self._book_age_ms: Optional[float] = None
+        self._book_stale = False
+        self._seq = 0
+        self.recalc = RecalcScheduler(pipeline)
+
+        # --- Metrics ---
+        self.books_processed = 0
+        self.books_dropped = 0
+        self.books_stale = 0  # Processed without probes: too old on arrival
+        self.results_published = 0
+
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="ComputeWorker", daemon=True
+        )
+        self._thread.start()
+
+    # --- Producer side (WebSocket / Tk threads) ---
+    def submit_book(self, book_snapshot, arrival_perf: Optional[float]) -> bool:
+        """Queues a book version. Returns False (and counts a drop) if the queue is full."""
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait((book_snapshot, arrival_perf))
+        except queue.Full:
+            self.books_dropped += 1
+            return False
+        return True
+
+    def set_inputs(self, inputs: OrderInputs):
+        """Sets the user order inputs; the latest book is re-estimated with them."""
+        self._inputs = inputs
+        try:
+            self._queue.put_nowait((_INPUTS_CHANGED, time.perf_counter()))
+        except queue.Full:
+            pass  # The queued books will be estimated with the new inputs anyway
+
+    # --- Worker thread ---
+    def _run(self):
+        while True:
+            try:
+                # Wake up while the feed is silent, so the latest book can turn stale
+                item = self._queue.get(timeout=self.stale_after_ms / 1000)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            try:
+                if self.profiling is not None and self.profiling.enabled:
+                    self.profiling.run("compute", self._handle, item)
+                else:
+                    self._handle(item)
+            except Exception as e:
+                logger.error(f"Error in compute worker: {e}", exc_info=True)
+
+    def _handle(self, item):
+        if item is None:
+            self._check_book_age()
+        elif item[0] is _INPUTS_CHANGED:
+            self._apply_inputs()
+        else:
+            self._process_book(*item)
+        if self._book is not None and self.recalc.due(idle=self._queue.empty()):
+            self._publish(self._compute())
+
+    def _apply_inputs(self):
+        inputs = self._inputs
+        self.recalc.set_input("order_error", inputs.error)
+        if inputs.error is None:
+            self.recalc.set_order(
+                inputs.quantity_usd,
+                inputs.fee_tier,
+                inputs.volatility,
+                inputs.asset_symbol,
+            )
+
+    def _process_book(self, book, arrival_perf: Optional[float]):
+        """Runs probes and training on a new book version and marks the book dirty."""
+        start = time.perf_counter()
+        self._book = book
+        self.pipeline.order_book = book
+        self.books_processed += 1
+        self._arrival_perf = arrival_perf
+        self._queue_wait_ms = (
+            (start - arrival_perf) * 1000 if arrival_perf is not None else None
+        )
+        self._tick_ms = None
+        if self._check_book_age():
+            self.books_stale += 1
+        elif book.get_best_ask() and book.get_best_bid():
+            try:
+                self._tick = self.pipeline.on_book_update()
+                self._tick_ms = (time.perf_counter() - start) * 1000
+                if self._tick.trained:
+                    self.recalc.set_input("model", self.pipeline.retrains)
+            except Exception as e:
+                logger.error(f"Error during tick processing: {e}", exc_info=True)
+        if self.pipeline.latency is not None:
+            self.pipeline.latency.record("queue_wait", self._queue_wait_ms)
+        self.recalc.set_input("book", book.version)
+
+    def _check_book_age(self) -> bool:
+        """Updates the current book's age and stale flag; returns True if stale."""
+        book = self._book
+        if book is None or book.local_exchange_time is None:
+            self._book_age_ms = None
+            stale = False
+        else:
+            self._book_age_ms = (time.time() - book.local_exchange_time) * 1000
+            stale = self._book_age_ms > self.stale_after_ms
+        if stale != self._book_stale:
+            # Only flips are passed on: a same-value set would count as avoided work
+            self._book_stale = stale
+            self.recalc.set_input("book_stale", stale)
+        return stale
+
+    def _compute(self) -> ComputeResult:
+        book = self._book
+        inputs = self._inputs
+        error = inputs.error if inputs is not None else None
+        if error is None and self._book_stale:
+            error = "Stale Book"
+        estimate = estimate_ms = None
+        try:
+            estimate_start = time.perf_counter()
+            estimate = self.recalc.recompute()
+            if estimate is not None:
+                estimate_ms = (time.perf_counter() - estimate_start) * 1000
+                if self.pipeline.latency is not None:
+                    self.pipeline.latency.record("estimate", estimate_ms)
+        except Exception as e:
+            logger.error(f"Error during recalculation: {e}", exc_info=True)
+            error = "Error"
+        arrival_perf = self._arrival_perf
+        self._arrival_perf = None
+        return ComputeResult(
+            seq=self._seq + 1,
+            book_version=book.version,
+            book_timestamp=book.timestamp,
+            symbol=book.symbol,
+            best_bid=book.get_best_bid(),
+            best_ask=book.get_best_ask(),
+            spread=book.get_spread(),
+            book_age_ms=self._book_age_ms,
+            book_stale=self._book_stale,
+            tick=self._tick,
+            estimate=estimate,
+            error=error,
+            model=self._model_status() if error != "Error" else None,
+            arrival_perf=arrival_perf,
+            queue_wait_ms=self._queue_wait_ms,
+            tick_ms=self._tick_ms,
+            estimate_ms=estimate_ms,
+            completed_perf=time.perf_counter(),
+        )
+
+    def _model_status(self) -> ModelStatus:
+        metrics = self.pipeline.slippage_reg_model.get_metrics()
+        retrain = self.pipeline.retrain_scheduler.get_stats()
+        sched = self.pipeline.probe_scheduler.get_stats()
+        recalc = self.recalc.get_stats()
+        log_stats = (
+            self.logs.get_stats()
+            if self.logs is not None
+            else {"queue_depth": 0, "rows_dropped": 0}
+        )
+        return ModelStatus(
+            training_samples=metrics.get("training_samples", 0.0),
+            mse=metrics.get("mse"),
+            r2=metrics.get("r2"),
+            bias=metrics.get("bias"),
+            bias_by_size=tuple(metrics.get("bias_by_size", {}).items()),
+            retrains_on_drift=retrain["retrains_on_drift"],
+            retrains_on_max_interval=retrain["retrains_on_max_interval"],
+            retrains_skipped=retrain["retrains_skipped"],
+            probe_ticks_used=sched["accepted_ticks"] + sched["downweighted_ticks"],
+            probe_ticks_skipped=sched["skipped_ticks"],
+            volatility_bps=sched["volatility_bps"],
+            log_queue_depth=log_stats["queue_depth"],
+            log_rows_dropped=log_stats["rows_dropped"],
+            recomputes=recalc["recomputes"],
+            recomputations_avoided=recalc["recomputations_avoided"],
+        )
+
+    def _publish(self, result: ComputeResult):
+        self._seq = result.seq
+        self.results_published += 1
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Stops the worker after the queued books are processed."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            logger.warning("Compute worker did not finish in time.")
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = {
+            "queue_depth": self._queue.qsize(),
+            "books_processed": self.books_processed,
+            "books_dropped": self.books_dropped,
+            "books_stale": self.books_stale,
+            "results_published": self.results_published,
+        }
+        stats.update({f"recalc_{k}": v for k, v in self.recalc.get_stats().items()})
+        return stats
@@ -42,3 +42,249 @@ ASSUMED_DAILY_VOLUME_USD = {"BTC-USDT-SWAP": 5_000_000_000.0}  # 5 Billion USD
 # C needs to be chosen. If C=1, and we trade 1% of daily volume, with 2% vol,
 # ImpactCost = 1 * 0.02 * 0.01 * OrderSizeUSD = 0.0002 * OrderSizeUSD (0.02% of order size)
 MARKET_IMPACT_COEFFICIENT = 0.5  # Tunable parameter, dimensionless
+
+# --- Slippage Model Evaluation (Prequential / test-then-train) ---
+# Every probe sample is scored by the current model *before* it is added to the
+# training data, so the metrics below never include samples the model was fitted on.
+# Number of most recent scored samples the rolling MSE / R2 / bias are computed over.
+PREQUENTIAL_WINDOW_SIZE = 5000
+# Probe-size bucket boundaries (USD) used to report prediction bias per order size.
+# Edges [a, b, c] produce buckets: < a, a - b, b - c, >= c.
+PREQUENTIAL_SIZE_BUCKET_EDGES_USD = [5_000.0, 50_000.0, 500_000.0]
+
+# --- Slippage Model Features (see src/book_features.py) ---
+# Distance bands from mid-price (in bps) used for cumulative depth, imbalance and level counts.
+BOOK_FEATURE_BANDS_BPS = [5, 10, 25, 50]
+# Book features fed to SlippageRegressionModel, after the order size (always the first feature).
+# Any name listed by BookFeatureExtractor.available_features() can be used here, e.g.:
+#   "spread_bps", "depth_best_ask_usd", "ask_depth_usd_<b>bps", "bid_depth_usd_<b>bps",
+#   "imbalance_<b>bps", "ask_levels_<b>bps", "bid_levels_<b>bps", "ask_slope", "bid_slope"
+# The original 3-feature model is ["spread_bps", "depth_best_ask_usd"].
+SLIPPAGE_MODEL_FEATURES = [
+    "spread_bps",
+    "depth_best_ask_usd",
+    "ask_depth_usd_5bps",
+    "ask_depth_usd_10bps",
+    "ask_depth_usd_25bps",
+    "ask_depth_usd_50bps",
+    "imbalance_5bps",
+    "imbalance_25bps",
+    "imbalance_50bps",
+    "ask_levels_50bps",
+    "ask_slope",
+    "bid_slope",
+]
+
+# --- Adaptive Probe Scheduling (see src/probe_scheduler.py) ---
+# Book states are fingerprinted by top-of-book prices quantized to this many bps ...
+PROBE_PRICE_QUANTUM_BPS = 1.0
+# ... and depth features quantized to buckets of this width in log2(USD) units.
+PROBE_DEPTH_QUANTUM_LOG2 = 0.5
+# A state identical to the last probed one is skipped, except every N-th consecutive
+# duplicate, whose probes are kept with a reduced sample weight.
+PROBE_MAX_SKIP_TICKS = 20
+PROBE_DUPLICATE_SAMPLE_WEIGHT = 0.25
+# Mid-price volatility is an EWMA of |tick return| in bps. Above the threshold the
+# fingerprint quantum is halved, so small book moves count as new states.
+PROBE_VOLATILITY_EWMA_ALPHA = 0.1
+PROBE_VOLATILE_THRESHOLD_BPS = 0.5
+
+# --- Drift-Triggered Retraining (see src/drift_detection.py) ---
+# Page-Hinkley test on |prequential residual|. Tolerance and threshold are expressed
+# in units of the mean absolute residual observed since the last retrain, so they do
+# not depend on the (very small) absolute scale of slippage percentages.
+DRIFT_PH_DELTA = 0.1  # Allowed drift of the mean before it accumulates as evidence
+DRIFT_PH_LAMBDA = 50.0  # Cumulative evidence needed to signal drift
+DRIFT_MIN_SAMPLES = 100  # Scored samples required after a retrain before testing
+# Retrain timing bounds, in ticks (WebSocket book updates with probes)
+RETRAIN_MIN_INTERVAL_TICKS = 20  # Never refit more often than this, even on drift
+RETRAIN_MAX_INTERVAL_TICKS = 2000  # Safety net: refit at least this often
+# The old fixed schedule; each interval elapsed without drift counts as a skipped retrain
+RETRAIN_CHECK_INTERVAL_TICKS = 200
+
+# --- Training Sample Store (see src/sample_store.py) ---
+# Total number of probe samples kept for training, split evenly across strata of
+# (probe-size bucket, spread regime). Each stratum is an independent reservoir, so rare
+# regimes (thin books, wide spreads) keep their samples while common ones are subsampled.
+SAMPLE_STORE_CAPACITY = 50_000
+# Probe-size bucket edges (USD); the defaults give every default probe size its own bucket.
+SAMPLE_STORE_SIZE_BUCKET_EDGES_USD = [
+    3_000.0,
+    7_500.0,
+    30_000.0,
+    75_000.0,
+    300_000.0,
+    750_000.0,
+]
+# Spread regime edges (bps): tight / normal / wide / very wide.
+SAMPLE_STORE_SPREAD_REGIME_EDGES_BPS = [0.05, 0.2, 1.0]
+SAMPLE_STORE_RANDOM_SEED = 42
+# Once a stratum is full, a new sample replaces a random one with this probability, so
+# each stratum remembers about capacity / probability of its most recent samples
+# (recency-biased; a uniform reservoir would let old regimes dominate long sessions).
+SAMPLE_STORE_REPLACE_PROBABILITY = 0.5
+# Fit weights of a stratum are scaled by capacity / filled up to this factor, so sparsely
+# filled rare regimes are not swamped by full common ones.
+SAMPLE_STORE_MAX_BALANCE_WEIGHT = 10.0
+
+# --- Buffered Background Logging (see src/log_writer.py) ---
+LOG_QUEUE_MAX_ROWS = (
+    100_000  # Rows beyond this are dropped (and counted), never block the UI
+)
+LOG_FLUSH_BATCH_ROWS = (
+    500  # Flush to disk once this many rows were written since last flush
+)
+LOG_FLUSH_INTERVAL_S = 1.0  # ... or at least this often while rows are pending
+
+# --- Log Files & Format (see src/log_writer.py, src/columnar_log.py) ---
+REGRESSION_DATA_LOG_FILE = "slippage_regression_log.csv"
+MODEL_PERFORMANCE_LOG_FILE = "model_performance_log.csv"
+# "csv": the wide CSV files above (default, human-readable).
+# "npz" / "parquet": typed columnar segments under COLUMNAR_LOG_DIR, one sub-directory per
+# stream (probes, user_predictions, model_performance). "parquet" needs pyarrow and falls
+# back to "npz" if it is not installed.
+LOG_FORMAT = "csv"
+COLUMNAR_LOG_DIR = "logs_columnar"
+COLUMNAR_SEGMENT_ROWS = 50_000  # Rows per segment file
+COLUMNAR_SEGMENT_MAX_AGE_S = 300.0  # Write a partial segment at least this often
+# Replays (src/replay.py --log-format) write their logs, under the same names, here instead
+# of next to the live app's logs
+REPLAY_LOG_DIR = "replay_logs"
+
+# --- Tick Pipeline (see src/pipeline.py) ---
+PROBE_ORDER_SIZES_USD = [1000, 5000, 10000, 50000, 100000, 500000, 1e6]
+SLIPPAGE_MODEL_MIN_SAMPLES_TO_TRAIN = 1000  # Probe samples needed before the first fit
+
+# --- Raw Feed Recording (see FeedRecorder in src/websocket_handler.py) ---
+FEED_RECORD_ENABLED = False  # Record every raw L2 message for later replay/debugging
+FEED_RECORD_DIR = "feed_recordings"
+FEED_RECORD_SEGMENT_MAX_BYTES = (
+    64 * 1024 * 1024
+)  # Rotate to a new segment file at this size
+FEED_RECORD_SEGMENT_MAX_AGE_S = 3600.0  # ... or after this long
+# Each index block is an independent gzip member listed in the segment's time index,
+# so a window can be read by seeking to its block instead of decompressing from the start
+FEED_RECORD_INDEX_BLOCK_MESSAGES = 500
+FEED_RECORD_INDEX_BLOCK_MAX_AGE_S = 5.0  # Also bounds how much is lost on a crash
+FEED_RECORD_QUEUE_MAX_MESSAGES = 100_000  # Messages beyond this are dropped and counted
+
+# --- Local Synthetic L2 Feed (see src/synthetic_feed_server.py) ---
+SYNTHETIC_FEED_HOST = "localhost"
+SYNTHETIC_FEED_PORT = 8765
+SYNTHETIC_FEED_RATE_HZ = 10.0  # Average messages per second per client
+SYNTHETIC_FEED_DEPTH = 50  # Levels per side
+SYNTHETIC_FEED_BURST_SIZE = (
+    1  # Messages sent back-to-back per burst (same average rate)
+)
+SYNTHETIC_FEED_START_MID_PRICE = 95_000.0
+SYNTHETIC_FEED_TICK_SIZE = 0.1
+SYNTHETIC_FEED_VOLATILITY_BPS = (
+    0.5  # Std-dev of the mid-price log return per message, in bps
+)
+SYNTHETIC_FEED_SEED = 7
+
+# --- Historical Book Snapshots (see src/book_snapshot_store.py) ---
+BOOK_SNAPSHOT_DIR = "book_snapshots"
+BOOK_SNAPSHOT_DEPTH = 50  # Levels stored per side; deeper levels are dropped
+
+# --- Batch Costing (see src/batch_costing.py) ---
+BATCH_COSTING_CHUNK_ORDERS = 50_000  # Orders priced per vectorized step in each worker
+
+# --- Compute Worker (see src/compute_worker.py) ---
+# Book versions waiting for the compute thread; more are dropped (and counted)
+COMPUTE_QUEUE_MAX_BOOKS = 1000
+
+# --- UI Rendering (see src/ui_conflator.py) ---
+UI_MAX_FPS = 20.0  # Max renders per second; newer results replace unrendered ones
+
+# --- Feed Ingest (see connect_and_listen in src/websocket_handler.py) ---
+# Drain all messages queued behind a slow consumer and apply only what the newest book
+# needs (the latest snapshot plus any deltas after it), with one callback per batch.
+# False: apply and report every message in order
+FEED_INGEST_CONFLATE = True
+
+# --- Latency Histograms (see src/latency_histogram.py) ---
+# Log-spaced buckets from LATENCY_HIST_MIN_MS to LATENCY_HIST_MAX_MS; 50 per decade keeps
+# every percentile within ~5% of the true value, at fixed memory per stage
+LATENCY_HIST_MIN_MS = 0.001
+LATENCY_HIST_MAX_MS = 100_000.0
+LATENCY_HIST_BUCKETS_PER_DECADE = 50
+LATENCY_WINDOW_S = 60.0  # Rolling window the UI percentiles cover
+LATENCY_WINDOW_SLICES = 6  # The window advances in steps of LATENCY_WINDOW_S / slices
+LATENCY_SNAPSHOT_FILE = "latency_histograms.jsonl"
+LATENCY_SNAPSHOT_INTERVAL_S = 30.0  # How often the app appends a snapshot to the file
+
+# --- Exchange Timestamps & Book Staleness (see src/feed_clock.py) ---
+# The local-minus-exchange clock offset is the minimum of (arrival - exchange timestamp)
+# over this sliding window, so slow drift between the clocks is tracked
+CLOCK_OFFSET_WINDOW_S = 60.0
+CLOCK_OFFSET_WINDOW_SLICES = 6
+# A book older than this (offset-corrected, at compute time) is flagged stale: no probes
+# are generated from it and no cost estimate is shown
+BOOK_STALE_AFTER_MS = 1000.0
+
+# --- Profiling Hooks (see src/profiling_hooks.py) ---
+# Off by default; toggle at runtime with SIGUSR1 or Ctrl+P in the app, or start with --profile
+PROFILE_DIR = "profiles"
+PROFILE_SAMPLE_EVERY_N_TICKS = 10  # Run one tick in N of each stage under cProfile
+PROFILE_REPORT_EVERY_N_TICKS = (
+    1000  # Compute ticks per report (profiles, allocations, GC)
+)
+PROFILE_MAX_REPORTS = 20  # Oldest report files are deleted beyond this
+PROFILE_TOP_N = 30  # Functions / allocation sites listed per report section
+PROFILE_TRACEMALLOC_FRAMES = 1  # Traceback depth per allocation; more is slower
+PROFILE_SIGNAL_POLL_S = 0.25  # How often the app applies a SIGUSR1 toggle request
+
+# --- Connection Liveness & Reconnect (see src/connection_supervisor.py) ---
+WS_PING_INTERVAL_S = 10.0  # Protocol-level ping; a missing pong ...
+WS_PING_TIMEOUT_S = 10.0  # ... within this long closes the connection
+WS_OPEN_TIMEOUT_S = 10.0  # Connect + handshake
+WS_DATA_TIMEOUT_S = 15.0  # No message for this long: the feed is considered dead
+# Reconnect delay after n consecutive failures: RECONNECT_BACKOFF_INITIAL_S * 2^(n-1),
+# capped at RECONNECT_BACKOFF_MAX_S, with the upper half randomized (jitter) so many
+# clients do not reconnect in lockstep.
+RECONNECT_BACKOFF_INITIAL_S = 0.5
+RECONNECT_BACKOFF_MAX_S = 30.0
+# A connection resets the failure count only if it delivered a book and stayed up this
+# long; a shorter one counts as a failure, so a flapping feed keeps backing off
+RECONNECT_STABLE_AFTER_S = 10.0
+RECONNECT_MIN_DELAY_S = (
+    0.2  # Delay (upper half jittered) after a stable connection drops
+)
+# The last book and outputs stay on screen (marked stale) for outages up to this long
+RECONNECT_KEEP_BOOK_S = 30.0
+
+# --- Ingest Process (see src/ingest_process.py and src/shared_book.py) ---
+# Run the feed (receive, decode, book update) in a separate process that publishes each
+# book into a shared-memory double buffer; compute and UI stay in the app process.
+# Also enabled by `--ingest-process` on the command line
+INGEST_PROCESS_ENABLED = False
+SHARED_BOOK_DEPTH = 400  # Levels per side in shared memory; deeper levels are dropped
+SHARED_BOOK_READ_RETRIES = 1000  # Torn reads in a row before a read gives up
+INGEST_PROCESS_STATS_INTERVAL_S = 1.0  # How often the process sends its counters
+
+# --- Latency Budget Watchdog (see src/latency_watchdog.py) ---
+WATCHDOG_ENABLED = True
+# Budget per latency stage (names as in src/latency_histogram.py); other stages are not
+# watched. A stage is over budget when WATCHDOG_PERCENTILE of a window exceeds it
+LATENCY_BUDGETS_MS = {
+    "queue_wait": 100.0,
+    "probes": 10.0,
+    "estimate": 5.0,
+    "ui_update": 16.0,  # One frame at 60 Hz
+    "end_to_end": 250.0,
+}
+WATCHDOG_PERCENTILE = 90
+WATCHDOG_WINDOW_S = 1.0  # Evaluation window; at most one degradation step per window
+# Work is restored one step after this many windows in a row with every watched stage
+# below WATCHDOG_RESTORE_RATIO of its budget (hysteresis against flapping)
+WATCHDOG_RESTORE_RATIO = 0.5
+WATCHDOG_RESTORE_AFTER_WINDOWS = 5
+# Degraded settings, shed in this order: probes, retrains, logging, UI refresh rate
+WATCHDOG_DEGRADED_MAX_PROBES = (
+    2  # Probe sizes per tick (spread over the configured ones)
+)
+WATCHDOG_DEGRADED_LOG_EVERY_N = 10  # Write 1 in N probe/user-prediction log rows
+WATCHDOG_DEGRADED_UI_FPS = 5.0
+WATCHDOG_EVENT_FILE = "degradation_events.jsonl"  # Every degrade/restore event
+WATCHDOG_MAX_EVENTS = 100  # Most recent events kept in memory
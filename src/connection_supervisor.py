@@ -0,0 +1,191 @@
+# src/connection_supervisor.py
+"""
+Keeps the feed connected: reconnects with jittered exponential backoff.
+
+run_supervised() runs connect_and_listen in a loop until cancelled. After a
+connection ends, the next attempt waits RECONNECT_BACKOFF_INITIAL_S * 2^(n-1)
+(n = consecutive failed connections, capped at RECONNECT_BACKOFF_MAX_S), the
+upper half drawn at random. A connection only counts as working, resetting
+the failure count, if it delivered a valid book and stayed up for
+RECONNECT_STABLE_AFTER_S; one that drops sooner is a failure too, so a feed
+that sends a book and then drops keeps backing off instead of reconnecting in
+a tight loop. Even after a working connection the next attempt waits up to
+RECONNECT_MIN_DELAY_S (jittered). Each new connection resynchronizes from the first full
+snapshot (see apply_message_batch). Meanwhile the last book stays in the
+OrderBookManager, so the UI can keep showing it through short outages.
+
+ConnectionSupervisor records the metrics: connection attempts, downtime
+(connection lost to first valid book after reconnecting), and time from
+connect to first valid book.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+from .config import (
+    RECONNECT_BACKOFF_INITIAL_S,
+    RECONNECT_BACKOFF_MAX_S,
+    RECONNECT_MIN_DELAY_S,
+    RECONNECT_STABLE_AFTER_S,
+)
+from .websocket_handler import connect_and_listen
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionSupervisor:
+    def __init__(
+        self,
+        backoff_initial_s: float = RECONNECT_BACKOFF_INITIAL_S,
+        backoff_max_s: float = RECONNECT_BACKOFF_MAX_S,
+        min_delay_s: float = RECONNECT_MIN_DELAY_S,
+        stable_after_s: float = RECONNECT_STABLE_AFTER_S,
+        rng: Optional[random.Random] = None,
+        clock=time.monotonic,
+    ):
+        self.backoff_initial_s = backoff_initial_s
+        self.backoff_max_s = backoff_max_s
+        self.min_delay_s = min_delay_s
+        self.stable_after_s = stable_after_s
+        self.rng = rng or random.Random()
+        self.clock = clock
+        # Consecutive connections that ended without a valid book, or before they had
+        # been up for stable_after_s
+        self.failures = 0
+        self.connected = False
+        self._connected_at: Optional[float] = None
+        self._outage_start: Optional[float] = None
+        self._awaiting_first_book = False  # Connected, no valid book yet
+        self._attempt_got_book = False
+        self.next_attempt_at: Optional[float] = None
+
+        # --- Metrics ---
+        self.attempts = 0
+        self.connections = 0
+        self.disconnects = 0
+        self.total_downtime_s = 0.0
+        self.last_downtime_s: Optional[float] = None
+        self.max_downtime_s = 0.0
+        self.last_first_book_ms: Optional[float] = None  # Connect to first valid book
+        self.max_first_book_ms = 0.0
+
+    # --- Called from the WebSocket thread ---
+    def on_attempt(self):
+        self.attempts += 1
+        self._attempt_got_book = False
+        self._connected_at = None
+        self.next_attempt_at = None
+
+    def on_connected(self):
+        self.connections += 1
+        self.connected = True
+        self._connected_at = self.clock()
+        self._awaiting_first_book = True
+
+    def on_book(self):
+        """A valid book was applied (called for every book; cheap after the first)."""
+        if not self._awaiting_first_book:
+            return
+        self._awaiting_first_book = False
+        self._attempt_got_book = True
+        now = self.clock()
+        self.last_first_book_ms = (now - self._connected_at) * 1000
+        self.max_first_book_ms = max(self.max_first_book_ms, self.last_first_book_ms)
+        if self._outage_start is not None:
+            downtime = now - self._outage_start
+            self._outage_start = None
+            self.last_downtime_s = downtime
+            self.total_downtime_s += downtime
+            self.max_downtime_s = max(self.max_downtime_s, downtime)
+            logger.info(
+                f"Feed resynchronized after {downtime:.2f}s of downtime "
+                f"({self.last_first_book_ms:.0f} ms from connect to first book)."
+            )
+
+    def on_connection_ended(self) -> float:
+        """Starts (or continues) an outage; returns the delay before the next attempt."""
+        now = self.clock()
+        stable = (
+            self._attempt_got_book
+            and self._connected_at is not None
+            and now - self._connected_at >= self.stable_after_s
+        )
+        if self.connected:
+            self.disconnects += 1
+            self.connected = False
+        if self._outage_start is None and self.connections > 0:
+            self._outage_start = now
+        if stable:
+            self.failures = 0
+        else:
+            self.failures += 1
+        self._awaiting_first_book = False
+        delay = self.backoff_delay()
+        self.next_attempt_at = now + delay
+        return delay
+
+    def backoff_delay(self) -> float:
+        if self.failures == 0:
+            cap = self.min_delay_s  # A working connection dropped: retry soon
+        else:
+            cap = min(
+                self.backoff_max_s, self.backoff_initial_s * 2 ** (self.failures - 1)
+            )
+        return cap / 2 + self.rng.uniform(0, cap / 2)
+
+    # --- Readable from any thread ---
+    def current_outage_s(self) -> Optional[float]:
+        """Seconds since the feed was lost, or None while it is delivering books."""
+        start = self._outage_start
+        return self.clock() - start if start is not None else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        next_attempt_at = self.next_attempt_at
+        return {
+            "attempts": self.attempts,
+            "next_attempt_in_s": (
+                max(0.0, next_attempt_at - self.clock())
+                if next_attempt_at is not None
+                else None
+            ),
+            "connections": self.connections,
+            "disconnects": self.disconnects,
+            "consecutive_failures": self.failures,
+            "current_outage_s": self.current_outage_s(),
+            "total_downtime_s": self.total_downtime_s,
+            "last_downtime_s": self.last_downtime_s,
+            "max_downtime_s": self.max_downtime_s,
+            "last_first_book_ms": self.last_first_book_ms,
+            "max_first_book_ms": self.max_first_book_ms,
+        }
+
+
+async def run_supervised(
+    book_manager,
+    ui_update_callback=None,
+    supervisor: Optional[ConnectionSupervisor] = None,
+    **listen_kwargs,
+):
+    """
+    Runs connect_and_listen (with `listen_kwargs`) and reconnects whenever it
+    returns, until the task is cancelled.
+    """
+    supervisor = supervisor or ConnectionSupervisor()
+    while True:
+        supervisor.on_attempt()
+        await connect_and_listen(
+            book_manager,
+            ui_update_callback,
+            supervisor=supervisor,
+            **listen_kwargs,
+        )
+        delay = supervisor.on_connection_ended()
+        logger.info(
+            f"Reconnecting in {delay:.2f}s (consecutive failures: {supervisor.failures})."
+        )
+        if ui_update_callback:
+            ui_update_callback(book_manager, "reconnecting", None)
+        await asyncio.sleep(delay)
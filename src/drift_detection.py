@@ -0,0 +1,140 @@
+# src/drift_detection.py
+"""
+Drift detection on slippage model residuals and the retrain policy built on it.
+
+Instead of refitting every N ticks, the model is refitted when its prequential
+error statistics shift (Page-Hinkley test on the absolute residual), with a
+maximum interval as a safety net and a minimum interval to avoid refit storms.
+"""
+
+import logging
+from typing import Dict, Optional
+
+from .config import (
+    DRIFT_PH_DELTA,
+    DRIFT_PH_LAMBDA,
+    DRIFT_MIN_SAMPLES,
+    RETRAIN_MIN_INTERVAL_TICKS,
+    RETRAIN_MAX_INTERVAL_TICKS,
+    RETRAIN_CHECK_INTERVAL_TICKS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PageHinkleyDetector:
+    """
+    One-sided Page-Hinkley test for an increase in the mean of a stream.
+
+    `delta` and `threshold` are relative to the running mean of the stream since
+    the last reset, which makes the test scale-free. The observation at which the
+    cumulative sum was lowest is the estimated change point.
+    """
+
+    def __init__(
+        self,
+        delta: float = DRIFT_PH_DELTA,
+        threshold: float = DRIFT_PH_LAMBDA,
+        min_samples: int = DRIFT_MIN_SAMPLES,
+    ):
+        self.delta = delta
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.mean = 0.0
+        self.cumulative = 0.0
+        self.minimum = 0.0
+        self.minimum_n = 0  # Observations up to the estimated change point
+        self.drift_detected = False
+
+    def update(self, value: float) -> bool:
+        """Adds one observation; returns True once drift has been detected."""
+        self.n += 1
+        self.mean += (value - self.mean) / self.n
+        scale = self.mean if self.mean > 0 else 1.0
+        self.cumulative += value - self.mean - self.delta * scale
+        if self.cumulative < self.minimum:
+            self.minimum = self.cumulative
+            self.minimum_n = self.n
+        if (
+            self.n >= self.min_samples
+            and self.cumulative - self.minimum > self.threshold * scale
+        ):
+            self.drift_detected = True
+        return self.drift_detected
+
+    @property
+    def samples_since_change(self) -> int:
+        """Observations after the estimated change point."""
+        return self.n - self.minimum_n
+
+
+class RetrainScheduler:
+    """
+    Decides when SlippageRegressionModel should be refitted.
+
+    Feed it every prequential residual with `observe()`, ask `should_retrain()`
+    once per tick and call `on_retrained()` after a fit.
+    """
+
+    def __init__(
+        self,
+        detector: Optional[PageHinkleyDetector] = None,
+        min_interval_ticks: int = RETRAIN_MIN_INTERVAL_TICKS,
+        max_interval_ticks: int = RETRAIN_MAX_INTERVAL_TICKS,
+        check_interval_ticks: int = RETRAIN_CHECK_INTERVAL_TICKS,
+    ):
+        self.detector = detector if detector is not None else PageHinkleyDetector()
+        self.min_interval_ticks = min_interval_ticks
+        self.max_interval_ticks = max_interval_ticks
+        self.check_interval_ticks = check_interval_ticks
+
+        # --- Counters ---
+        self.retrains_on_drift = 0
+        self.retrains_on_max_interval = 0
+        self.retrains_skipped = 0
+        self.last_reason: Optional[str] = None
+
+    def observe(self, residual: Optional[float]):
+        if residual is not None:
+            self.detector.update(abs(residual))
+
+    def should_retrain(self, ticks_since_last_train: int) -> Optional[str]:
+        """
+        Returns "drift" or "max_interval" when a refit is due, otherwise None.
+        Each elapsed `check_interval_ticks` without drift is counted as a skipped retrain.
+        """
+        if ticks_since_last_train <= 0:
+            return None
+        if ticks_since_last_train >= self.max_interval_ticks:
+            return "max_interval"
+        if (
+            self.detector.drift_detected
+            and ticks_since_last_train >= self.min_interval_ticks
+        ):
+            return "drift"
+        if ticks_since_last_train % self.check_interval_ticks == 0:
+            self.retrains_skipped += 1
+        return None
+
+    def on_retrained(self, reason: str):
+        if reason == "drift":
+            self.retrains_on_drift += 1
+            logger.info(
+                f"Residual drift detected (Page-Hinkley, mean |residual| {self.detector.mean:.3e}). Retrained."
+            )
+        elif reason == "max_interval":
+            self.retrains_on_max_interval += 1
+        self.last_reason = reason
+        self.detector.reset()
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "retrains_on_drift": self.retrains_on_drift,
+            "retrains_on_max_interval": self.retrains_on_max_interval,
+            "retrains_skipped": self.retrains_skipped,
+            "samples_since_reset": self.detector.n,
+        }
@@ -0,0 +1,154 @@
+# src/feed_clock.py
+"""
+Exchange timestamps: parsing, clock offset and exchange-to-arrival latency.
+
+Every message carries the exchange's book timestamp (ISO 8601 UTC, e.g.
+"2025-05-04T10:39:13.123Z", or epoch milliseconds). Arrival minus exchange time
+is the network/upstream delay plus the unknown offset between the two clocks.
+ClockOffsetEstimator takes the minimum of that difference over a sliding window:
+the fastest recent message is the best estimate of offset + minimum delay, and
+the window lets the estimate follow slow clock drift. What remains above it is
+the excess (queueing) delay, which does not depend on clock skew.
+
+FeedClock runs on the WebSocket thread for each applied book and stamps it with
+`exchange_time` and `local_exchange_time` (the exchange time on the local
+clock), from which the compute worker derives the book's age.
+"""
+
+import calendar
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .config import CLOCK_OFFSET_WINDOW_S, CLOCK_OFFSET_WINDOW_SLICES
+
+_ISO_SECONDS_LEN = len("YYYY-MM-DDTHH:MM:SS")
+
+
+class ExchangeTimestampParser:
+    """
+    Parses exchange timestamps to epoch seconds. Consecutive messages mostly share
+    the same second, so the date/time part is converted once per second and only
+    the fraction is parsed per message.
+    """
+
+    def __init__(self):
+        self._prefix: Optional[str] = None
+        self._prefix_epoch = 0.0
+        self.failures = 0
+
+    def parse(self, timestamp: Any) -> Optional[float]:
+        try:
+            if isinstance(timestamp, (int, float)) or timestamp.isdigit():
+                value = float(timestamp)
+                return value / 1000.0 if value > 1e11 else value  # ms or s
+            prefix = timestamp[:_ISO_SECONDS_LEN]
+            suffix = timestamp[_ISO_SECONDS_LEN:]
+            fraction = 0.0
+            if suffix.startswith("."):
+                end = 1
+                while end < len(suffix) and suffix[end].isdigit():
+                    end += 1
+                fraction = float("0." + suffix[1:end])
+                suffix = suffix[end:]
+            if suffix not in ("Z", "", "+00:00"):
+                # Non-UTC offset: rare, take the slow path
+                return datetime.fromisoformat(timestamp).timestamp()
+            if prefix != self._prefix:
+                self._prefix_epoch = float(
+                    calendar.timegm(time.strptime(prefix, "%Y-%m-%dT%H:%M:%S"))
+                )
+                self._prefix = prefix
+            return self._prefix_epoch + fraction
+        except (AttributeError, ValueError):
+            self.failures += 1
+            return None
+
+
+class ClockOffsetEstimator:
+    """Sliding-window minimum of (arrival - exchange time), in seconds."""
+
+    def __init__(
+        self,
+        window_s: float = CLOCK_OFFSET_WINDOW_S,
+        slices: int = CLOCK_OFFSET_WINDOW_SLICES,
+        clock=time.monotonic,
+    ):
+        self.slice_s = window_s / slices
+        self.clock = clock
+        self._minima = [float("inf")] * slices
+        self._slice_index = int(clock() // self.slice_s)
+
+    def observe(self, exchange_time: float, arrival_time: float) -> float:
+        """Adds one message; returns its raw arrival - exchange difference."""
+        current = int(self.clock() // self.slice_s)
+        # Forget the slices that fell out of the window since the last message
+        for index in range(
+            max(self._slice_index + 1, current - len(self._minima) + 1), current + 1
+        ):
+            self._minima[index % len(self._minima)] = float("inf")
+        self._slice_index = max(self._slice_index, current)
+        raw = arrival_time - exchange_time
+        slot = self._slice_index % len(self._minima)
+        if raw < self._minima[slot]:
+            self._minima[slot] = raw
+        return raw
+
+    @property
+    def offset_s(self) -> Optional[float]:
+        """Clock offset plus minimum delay; None before the first message."""
+        offset = min(self._minima)
+        return offset if offset != float("inf") else None
+
+
+class FeedClock:
+    def __init__(self, latency=None, clock=time.monotonic):
+        """
+        Args:
+            latency (LatencyRecorder): Optional; receives the excess delay as stage "exchange".
+            clock (Callable[[], float]): Time source of the offset window, e.g. the
+                simulated clock of a replay.
+        """
+        self.parser = ExchangeTimestampParser()
+        self.offset = ClockOffsetEstimator(clock=clock)
+        self.latency = latency
+
+        # --- Metrics ---
+        self.last_raw_ms: Optional[float] = None  # Includes the clock offset
+        self.last_excess_ms: Optional[float] = None  # Above the window minimum
+
+    def on_book(
+        self,
+        book_manager,
+        arrival_perf: float,
+        arrival_time: Optional[float] = None,
+    ):
+        """
+        Stamps the just-applied book with its exchange time (exchange and local clock).
+        `arrival_time` (wall clock) defaults to the one of `arrival_perf`; a replay
+        passes the recorded one.
+        """
+        exchange_time = self.parser.parse(book_manager.timestamp)
+        if exchange_time is None:
+            book_manager.exchange_time = None
+            book_manager.local_exchange_time = None
+            return
+        if arrival_time is None:
+            arrival_time = time.time() - (time.perf_counter() - arrival_perf)
+        raw = self.offset.observe(exchange_time, arrival_time)
+        offset = self.offset.offset_s
+        self.last_raw_ms = raw * 1000
+        self.last_excess_ms = (raw - offset) * 1000
+        book_manager.exchange_time = exchange_time
+        book_manager.local_exchange_time = exchange_time + offset
+        if self.latency is not None:
+            self.latency.record("exchange", self.last_excess_ms)
+
+    def get_stats(self) -> Dict[str, Optional[float]]:
+        offset = self.offset.offset_s
+        return {
+            "clock_offset_ms": offset * 1000 if offset is not None else None,
+            "last_raw_ms": self.last_raw_ms,
+            "last_excess_ms": self.last_excess_ms,
+            "parse_failures": self.parser.failures,
+        }
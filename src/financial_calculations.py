@@ -4,6 +4,8 @@
 # will implement pytest later.
 
 import logging
+from bisect import bisect_right
+from collections import deque
 from typing import Tuple, Optional, List, Dict  # For type hinting
 import sys
 import os
@@ -14,18 +16,17 @@ from .config import (
     DEFAULT_TAKER_FEE_RATE,
     ASSUMED_DAILY_VOLUME_USD,
     MARKET_IMPACT_COEFFICIENT,
+    PREQUENTIAL_WINDOW_SIZE,
+    PREQUENTIAL_SIZE_BUCKET_EDGES_USD,
+    SAMPLE_STORE_CAPACITY,
 )
+from .sample_store import StratifiedReservoirStore
 
 # We'll need access to the OrderBookManager type for type hinting if not already imported
 # from .order_book_manager import OrderBookManager # Assuming it's in the same directory
 import numpy as np
 from sklearn.linear_model import LinearRegression
 
-# --- NEW IMPORTS for Regression Evaluation ---
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
-
-
 logger = logging.getLogger(__name__)
 
 
@@ -59,21 +60,25 @@ def calculate_expected_fees(quantity_usd: float, fee_tier: str) -> float:
 def calculate_slippage_walk_book(
     target_usd_to_spend: float,
     order_book,  # Type hint can be OrderBookManager if imported
+    side: str = "buy",
 ) -> Tuple[Optional[float], Optional[float], float, float]:
     """
-    Calculates slippage by simulating a BUY market order walking the ask side of the order book.
-    Tries to spend `target_usd_to_spend`.
+    Calculates slippage by simulating a market order walking the order book: a BUY
+    walks the asks trying to spend `target_usd_to_spend`, a SELL walks the bids
+    selling base asset until that much USD notional is filled.
 
     Args:
-        target_usd_to_spend (float): The amount in USD to try and spend.
-        order_book (OrderBookManager): The current order book instance.
+        target_usd_to_spend (float): The USD notional to fill.
+        order_book (OrderBookManager): The current order book instance, or a historical
+            BookSnapshot (see book_snapshot_store.py).
+        side (str): "buy" or "sell".
 
     Returns:
         Tuple[Optional[float], Optional[float], float, float]:
-            - slippage_percentage (Optional[float]): Slippage in percentage. None if not calculable.
+            - slippage_percentage (Optional[float]): Slippage in percentage, positive when the fill is worse than mid. None if not calculable.
             - average_execution_price (Optional[float]): Average price at which the order was filled. None if not calculable.
-            - total_asset_acquired (float): Actual amount of base asset acquired.
-            - actual_usd_spent (float): Actual amount of USD spent.
+            - total_asset_acquired (float): Actual amount of base asset bought (or sold).
+            - actual_usd_spent (float): Actual USD notional filled (spent, or received for a sell).
     """
     if target_usd_to_spend <= 0:
         return (
@@ -83,10 +88,12 @@ def calculate_slippage_walk_book(
             0.0,
         )  # No slippage, no price, no asset, no spend for 0 USD
 
-    asks = order_book.asks  # List of [price, quantity]
+    asks = (
+        order_book.asks
+    )  # [price, quantity] rows: a list, or an array for a BookSnapshot
     bids = order_book.bids
 
-    if not asks or not bids:
+    if len(asks) == 0 or len(bids) == 0:
         logger.warning(
             "Slippage calc: Asks or Bids are empty. Cannot calculate mid-price or execute."
         )
@@ -101,8 +108,10 @@ def calculate_slippage_walk_book(
         logger.warning(
             f"Slippage calc: Best ask {initial_best_ask_price} <= best bid {initial_best_bid_price}. Book crossed?"
         )
-        # Fallback: use best ask as reference if mid-price is problematic
-        mid_price_snapshot = initial_best_ask_price
+        # Fallback: use the touch price on the traded side if mid-price is problematic
+        mid_price_snapshot = (
+            initial_best_ask_price if side == "buy" else initial_best_bid_price
+        )
     else:
         mid_price_snapshot = (initial_best_ask_price + initial_best_bid_price) / 2.0
 
@@ -119,7 +128,8 @@ def calculate_slippage_walk_book(
     # logger.debug(f"Walking the book for BUY: target_usd_spend={target_usd_to_spend}, mid_snapshot={mid_price_snapshot}")
     # logger.debug(f"Available asks: {asks[:5]}") # Log first 5 ask levels
 
-    for price_level, quantity_at_level in asks:
+    levels = asks if side == "buy" else bids  # Both ordered best price first
+    for price_level, quantity_at_level in levels:
         if (
             remaining_usd_to_spend <= 1e-9
         ):  # Effectively zero, considering float precision
@@ -152,10 +162,12 @@ def calculate_slippage_walk_book(
 
     average_execution_price = actual_usd_spent / total_asset_acquired
 
-    # For a BUY, positive slippage is an additional cost (paid more than mid-price)
+    # Positive slippage is an additional cost: a BUY paid more, a SELL received less, than mid
     slippage_value = (
         average_execution_price - mid_price_snapshot
-    )  # For a BUY, positive slippage is bad (paid more)
+        if side == "buy"
+        else mid_price_snapshot - average_execution_price
+    )
     slippage_percentage = (slippage_value / mid_price_snapshot) * 100.0
     # logger.debug(f"Slippage Result: AvgExecPrice={average_execution_price}, Slippage%={slippage_percentage}, AssetAcquired={total_asset_acquired}, USDSpent={actual_usd_spent}")
 
@@ -217,114 +229,256 @@ def calculate_market_impact_cost(
     return market_impact_cost
 
 
+# --- Streaming (prequential) evaluation of the Regression Model ---
+class PrequentialMetrics:
+    """
+    Test-then-train evaluation for the slippage model.
+
+    Each probe sample is scored by the model as it stands *before* that sample is
+    added to the training data, so the metrics never see a sample the model was
+    fitted on. Rolling MSE, R2 and mean bias are kept as running sums over the last
+    `window_size` scored samples, which makes every update O(1) and removes the
+    need for a re-scoring pass at retrain time. Bias is also tracked per
+    order-size bucket, since the linear model tends to fail differently for
+    small and large orders.
+    """
+
+    def __init__(
+        self,
+        window_size: int = PREQUENTIAL_WINDOW_SIZE,
+        size_bucket_edges_usd: Optional[List[float]] = None,
+    ):
+        self.window_size = max(1, int(window_size))
+        self.size_bucket_edges_usd = sorted(
+            size_bucket_edges_usd
+            if size_bucket_edges_usd is not None
+            else PREQUENTIAL_SIZE_BUCKET_EDGES_USD
+        )
+        self.bucket_labels = self.make_bucket_labels(self.size_bucket_edges_usd)
+        self.reset()
+
+    @staticmethod
+    def make_bucket_labels(edges: List[float]) -> List[str]:
+        if not edges:
+            return ["all"]
+        labels = [f"<{edges[0]:g}"]
+        labels += [f"{lo:g}-{hi:g}" for lo, hi in zip(edges[:-1], edges[1:])]
+        labels.append(f">={edges[-1]:g}")
+        return labels
+
+    def reset(self):
+        self._window = deque()  # (target, residual, bucket_index) per scored sample
+        self._sum_y = 0.0
+        self._sum_y2 = 0.0
+        self._sum_residual = 0.0
+        self._sum_sq_residual = 0.0
+        self._bucket_counts = [0] * len(self.bucket_labels)
+        self._bucket_residual_sums = [0.0] * len(self.bucket_labels)
+        self._evictions_since_resum = 0
+        self.total_scored = 0  # Lifetime count, not limited to the window
+
+    def update(self, order_size_usd: float, target: float, prediction: float):
+        """Adds one (target, prediction) pair to the rolling window in O(1)."""
+        residual = prediction - target  # Positive => model over-predicts slippage
+        bucket = bisect_right(self.size_bucket_edges_usd, order_size_usd)
+        self._window.append((target, residual, bucket))
+        self._sum_y += target
+        self._sum_y2 += target * target
+        self._sum_residual += residual
+        self._sum_sq_residual += residual * residual
+        self._bucket_counts[bucket] += 1
+        self._bucket_residual_sums[bucket] += residual
+        self.total_scored += 1
+
+        if len(self._window) > self.window_size:
+            old_y, old_residual, old_bucket = self._window.popleft()
+            self._sum_y -= old_y
+            self._sum_y2 -= old_y * old_y
+            self._sum_residual -= old_residual
+            self._sum_sq_residual -= old_residual * old_residual
+            self._bucket_counts[old_bucket] -= 1
+            self._bucket_residual_sums[old_bucket] -= old_residual
+            self._evictions_since_resum += 1
+            # Running add/subtract accumulates float error; re-sum once per full
+            # window turnover, which keeps the amortized cost O(1) per sample.
+            if self._evictions_since_resum >= self.window_size:
+                self._resum()
+
+    def _resum(self):
+        self._sum_y = sum(y for y, _, _ in self._window)
+        self._sum_y2 = sum(y * y for y, _, _ in self._window)
+        self._sum_residual = sum(r for _, r, _ in self._window)
+        self._sum_sq_residual = sum(r * r for _, r, _ in self._window)
+        self._bucket_residual_sums = [0.0] * len(self.bucket_labels)
+        for _, r, b in self._window:
+            self._bucket_residual_sums[b] += r
+        self._evictions_since_resum = 0
+
+    @property
+    def count(self) -> int:
+        return len(self._window)
+
+    @property
+    def mse(self) -> Optional[float]:
+        n = len(self._window)
+        return max(0.0, self._sum_sq_residual / n) if n else None
+
+    @property
+    def r2(self) -> Optional[float]:
+        n = len(self._window)
+        if n < 2:
+            return None
+        total_sum_squares = self._sum_y2 - (self._sum_y * self._sum_y) / n
+        if total_sum_squares <= 0:
+            return None  # Constant target within the window, R2 undefined
+        return 1.0 - self._sum_sq_residual / total_sum_squares
+
+    @property
+    def bias(self) -> Optional[float]:
+        n = len(self._window)
+        return self._sum_residual / n if n else None
+
+    def bias_by_size_bucket(self) -> Dict[str, Optional[float]]:
+        return {
+            label: (total / count if count else None)
+            for label, count, total in zip(
+                self.bucket_labels, self._bucket_counts, self._bucket_residual_sums
+            )
+        }
+
+
 # --- CODE for Regression Model ---
 class SlippageRegressionModel:
-    def __init__(self, min_samples_to_train=50, features_dim=3, test_set_size=0.2):
+    def __init__(
+        self,
+        min_samples_to_train=50,
+        features_dim=3,
+        metrics_window=PREQUENTIAL_WINDOW_SIZE,
+        feature_names: Optional[List[str]] = None,
+        sample_store_capacity: int = SAMPLE_STORE_CAPACITY,
+    ):
         self.model = LinearRegression()
         self.is_trained = False
-        self.data_X = []  # List of feature lists
-        self.data_y = []  # List of target slippage percentages
         self.min_samples_to_train = min_samples_to_train
-        self.features_dim = (
-            features_dim  # order_size_usd, spread_bps, depth_best_ask_usd
+        # Feature order shared by add_data_point/predict, order_size_usd first
+        # (e.g. from BookFeatureExtractor). Defaults to the original 3-feature set.
+        self.feature_names = (
+            list(feature_names)
+            if feature_names is not None
+            else (
+                ["order_size_usd", "spread_bps", "depth_best_ask_usd"]
+                if features_dim == 3
+                else [f"feature_{i}" for i in range(features_dim)]
+            )
+        )
+        self.features_dim = len(self.feature_names)
+        # Bounded training data: per (size bucket, spread regime) reservoirs, so memory
+        # and fit cost do not grow with session length (see StratifiedReservoirStore)
+        self.sample_store = StratifiedReservoirStore(
+            self.features_dim,
+            total_capacity=sample_store_capacity,
+            spread_feature_index=(
+                self.feature_names.index("spread_bps")
+                if "spread_bps" in self.feature_names
+                else None
+            ),
         )
-        self.test_set_size = test_set_size  # Proportion of data to use for testing
-        self.mse = None
-        self.r2 = None
+        # Test-then-train metrics, updated as samples arrive (see PrequentialMetrics)
+        self.prequential = PrequentialMetrics(window_size=metrics_window)
         self.training_samples_count = 0
+        # Cached fitted parameters so scoring a single sample is a dot product,
+        # not a full sklearn predict() call per probe.
+        self._coef = None
+        self._intercept = 0.0
 
         logger.info("SlippageRegressionModel initialized.")
 
-    def add_data_point(self, features: List[float], target_slippage_pct: float):
+    def add_data_point(
+        self,
+        features: List[float],
+        target_slippage_pct: float,
+        sample_weight: float = 1.0,
+    ) -> Optional[float]:
+        """
+        Scores the sample with the current model (if trained), then stores it for training.
+        The first feature is expected to be the order size in USD. `sample_weight` lets
+        near-duplicate book states count less in the fit; it does not affect the metrics.
+
+        Returns:
+            Optional[float]: The prequential residual (prediction - target), or None
+            if the model was not trained yet or the sample was rejected.
+        """
         if len(features) != self.features_dim:
             logger.warning(
                 f"Incorrect feature dimension. Expected {self.features_dim}, got {len(features)}"
             )
-            return
-        self.data_X.append(features)
-        self.data_y.append(target_slippage_pct)
-        # Optional: Limit data size to prevent memory issues for long runs
-        # MAX_DATA_POINTS = 1000
-        # if len(self.data_X) > MAX_DATA_POINTS:
-        #     self.data_X.pop(0)
-        #     self.data_y.pop(0)
+            return None
+        residual = None
+        if self._coef is not None:
+            prediction = self._intercept + sum(
+                c * f for c, f in zip(self._coef, features)
+            )
+            self.prequential.update(features[0], target_slippage_pct, prediction)
+            residual = prediction - target_slippage_pct
+        self.sample_store.add(features, target_slippage_pct, sample_weight)
+        return residual
+
+    @property
+    def num_samples(self) -> int:
+        """Number of samples currently held for training (bounded by the store capacity)."""
+        return len(self.sample_store)
+
+    def age_out_samples(self, recent_samples: int) -> int:
+        """
+        Keeps only the training samples added after the last `recent_samples` (e.g.
+        since a detected drift), but at least min_samples_to_train, so the next fit
+        follows the new regime. Returns the number of samples dropped.
+        """
+        dropped = self.sample_store.age_out(
+            recent_samples, min_keep=self.min_samples_to_train
+        )
+        if dropped:
+            logger.info(
+                f"Dropped {dropped} pre-drift training samples; {self.num_samples} left."
+            )
+        return dropped
 
     def train(self) -> bool:
-        logger.debug(
-            f"Train called. Total data points available: {len(self.data_X)}"
-        )  # Add this
-        if len(self.data_X) < self.min_samples_to_train:
+        logger.debug(f"Train called. Total data points available: {self.num_samples}")
+        if self.num_samples < self.min_samples_to_train:
             logger.debug(
-                f"Not enough samples to train. Have {len(self.data_X)}, need {self.min_samples_to_train}."
-            )  # Add this
+                f"Not enough samples to train. Have {self.num_samples}, need {self.min_samples_to_train}."
+            )
             self.is_trained = False
             return False
 
         try:
-            X = np.array(self.data_X)
-            y = np.array(self.data_y)
+            X, y, w = self.sample_store.to_arrays()
 
             if X.ndim == 1:
                 X = X.reshape(-1, 1)
 
-            # Check for sufficient data for split more carefully
-            min_test_samples = (
-                1  # We need at least 1 sample in the test set for evaluation
-            )
-            min_train_samples = 1  # And at least 1 in the train set
-
-            # Ensure there's enough data for a split that results in non-empty train/test sets
-            # A common rule is test_size should not lead to test set < 1, and train set should also not be < 1
-            if len(X) * self.test_set_size < 1 or len(X) * (1 - self.test_set_size) < 1:
-                logger.warning(
-                    f"Not enough data for a meaningful train-test split (Total: {len(X)}). Training on all data. Metrics will be on training data."
-                )
-                X_train, X_test, y_train, y_test = X, X, y, y
-            else:
-                X_train, X_test, y_train, y_test = train_test_split(
-                    X, y, test_size=self.test_set_size, random_state=42
-                )
-
-            logger.debug(
-                f"Train set size: {len(X_train)}, Test set size: {len(X_test)}"
-            )  # Add this
-
-            if (
-                len(X_train) < min_train_samples
-            ):  # Should be caught by above, but as a safeguard
-                logger.warning(
-                    "Training set is effectively empty ({len(X_train)} samples). Cannot train model."
-                )
-                self.is_trained = False
-                return False
-
-            self.model.fit(X_train, y_train)
+            # No hold-out split: evaluation is prequential (every sample was already
+            # scored before it joined the training data), so all data is used to fit.
+            self.model.fit(X, y, sample_weight=w)
             self.is_trained = True  # Set only after successful fit.
-            self.training_samples_count = len(X_train)  # Correctly set here
-
-            # --- Evaluate on test set (if X_test is not same as X_train due to split) ---
-            if len(X_test) > 0:
-                y_pred_test = self.model.predict(X_test)
-                self.mse = mean_squared_error(y_test, y_pred_test)
-                self.r2 = r2_score(y_test, y_pred_test)
-                eval_set_type = "Test" if X_test is not X_train else "Train (no split)"
-                logger.info(
-                    f"Slippage model trained with {len(X_train)} samples. {eval_set_type} MSE: {self.mse:.10e}, {eval_set_type} R2: {self.r2:.4f}"
-                )
-            else:
-                # Should not happen if checks above are correct
-                logger.warning("Test set was empty, cannot evaluate metrics.")
-                self.mse = None
-                self.r2 = None
-
+            self.training_samples_count = len(X)
+            self._coef = [float(c) for c in np.ravel(self.model.coef_)]
+            self._intercept = float(self.model.intercept_)
+
+            metrics = self.get_metrics()
+            logger.info(
+                f"Slippage model trained with {len(X)} samples. "
+                f"Prequential MSE: {metrics['mse']}, R2: {metrics['r2']} "
+                f"(over last {self.prequential.count} scored samples)"
+            )
             return True  # Successfully trained
         except Exception as e:
             logger.error(
                 f"Error training slippage regression model: {e}", exc_info=True
             )
             self.is_trained = False
-            self.mse = None  # Reset metrics on error
-            self.r2 = None
+            self._coef = None
             return False  # Training failed
 
     def predict(self, features: List[float]) -> Optional[float]:
@@ -347,8 +501,11 @@ class SlippageRegressionModel:
     # --- Getter methods for metrics ---
     def get_metrics(self) -> Dict[str, Optional[float]]:
         return {
-            "mse": self.mse,
-            "r2": self.r2,
+            "mse": self.prequential.mse,
+            "r2": self.prequential.r2,
+            "bias": self.prequential.bias,
+            "bias_by_size": self.prequential.bias_by_size_bucket(),
+            "evaluated_samples": float(self.prequential.count),
             "training_samples": (
                 float(self.training_samples_count) if self.is_trained else 0.0
             ),
@@ -401,13 +558,15 @@ if __name__ == "__main__":
     reg_model = SlippageRegressionModel(min_samples_to_train=2)
     reg_model.add_data_point(features=[1000, 1.0, 100000], target_slippage_pct=0.01)
     reg_model.add_data_point(features=[2000, 1.2, 80000], target_slippage_pct=0.03)
-    reg_model.add_data_point(
-        features=[500, 0.8, 120000], target_slippage_pct=0.005
-    )  # More data for split
+    reg_model.add_data_point(features=[500, 0.8, 120000], target_slippage_pct=0.005)
     reg_model.add_data_point(features=[2500, 1.5, 70000], target_slippage_pct=0.04)
     reg_model.add_data_point(features=[1200, 0.9, 110000], target_slippage_pct=0.015)
     print(f"Training possible: {reg_model.train()}")
     print(f"Model trained: {reg_model.is_trained}")
+    # Samples arriving after training are scored before being added (prequential metrics)
+    reg_model.add_data_point(features=[1800, 1.1, 90000], target_slippage_pct=0.025)
+    reg_model.add_data_point(features=[700, 0.9, 115000], target_slippage_pct=0.008)
+    reg_model.add_data_point(features=[3000, 1.6, 60000], target_slippage_pct=0.05)
     if reg_model.is_trained:
         prediction1 = reg_model.predict(features=[1500, 1.1, 90000])
         print(f"Prediction for [1500, 1.1, 90000]: {prediction1}")
@@ -415,3 +574,4 @@ if __name__ == "__main__":
         print(
             f"Model Metrics: MSE={metrics.get('mse', 'N/A')}, R2={metrics.get('r2', 'N/A')}, Samples={metrics.get('training_samples', 'N/A')}"
         )
+        print(f"Prequential bias by size bucket: {metrics.get('bias_by_size')}")
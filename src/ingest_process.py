@@ -0,0 +1,265 @@
+# src/ingest_process.py
+"""
+Optional multi-process ingest: the feed runs in its own process.
+
+With INGEST_PROCESS_ENABLED (or `--ingest-process`), receiving, decoding and
+applying feed messages no longer share the GIL with compute and rendering.
+The ingest process runs the usual supervised connection (run_supervised, with
+its own IngestStats, FeedClock, ConnectionSupervisor and FeedRecorder) and
+publishes every applied book into a SharedBook (shared_book.py), then sets an
+event. In the app process, IngestProcess waits on that event, reads the newest
+book and hands it to the compute worker; versions published while it was busy
+are skipped (counted), like conflated messages. Arrival times are
+perf_counter() values, which come from a system-wide monotonic clock, so
+queue-wait and end-to-end latencies stay valid across the process boundary.
+
+Connection status changes and, every INGEST_PROCESS_STATS_INTERVAL_S, the
+ingest counters (feed, connection, clock, decode/book update latencies) come
+over a multiprocessing queue; `feed_stats` holds the latest.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import platform
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from .config import (
+    FEED_INGEST_CONFLATE,
+    FEED_RECORD_ENABLED,
+    INGEST_PROCESS_STATS_INTERVAL_S,
+    SHARED_BOOK_DEPTH,
+)
+from .connection_supervisor import ConnectionSupervisor, run_supervised
+from .feed_clock import FeedClock
+from .latency_histogram import LatencyRecorder
+from .order_book_manager import OrderBookManager
+from .shared_book import (
+    SEQLOCK_SUPPORTED,
+    SharedBook,
+    SharedBookReader,
+    SharedBookWriter,
+)
+from .websocket_handler import FeedRecorder, IngestStats
+
+logger = logging.getLogger(__name__)
+
+# Latency stages measured in the ingest process
+INGEST_STAGES = ("exchange", "decode", "book_update")
+
+
+def run_ingest_process(
+    shm_name: str,
+    url: Optional[str],
+    conflate: bool,
+    record: bool,
+    notify,
+    events,
+    stop,
+):
+    """Entry point of the ingest process; runs until `stop` is set."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - [%(name)s:%(processName)s] - %(message)s",
+    )
+    shared = SharedBook.attach(shm_name)
+    writer = SharedBookWriter(shared)
+    book_manager = OrderBookManager()
+    stats = IngestStats()
+    latency = LatencyRecorder(stages=INGEST_STAGES)
+    feed_clock = FeedClock(latency)
+    supervisor = ConnectionSupervisor()
+    recorder = FeedRecorder() if record else None
+
+    def feed_stats() -> Dict[str, Any]:
+        return {
+            "ingest": stats.get_stats(),
+            "connection": supervisor.get_stats(),
+            "feed_clock": feed_clock.get_stats(),
+            "latency": latency.summaries(),
+            "shared_book": writer.get_stats(),
+        }
+
+    def on_update(book, status, arrival_perf=None):
+        if status == "data_update":
+            writer.publish(book, arrival_perf)
+            notify.set()
+        else:
+            events.put((status, feed_stats()))
+
+    async def main():
+        feed = asyncio.create_task(
+            run_supervised(
+                book_manager,
+                on_update,
+                supervisor,
+                recorder=recorder,
+                url=url,
+                stats=stats,
+                conflate=conflate,
+                latency=latency,
+                feed_clock=feed_clock,
+            )
+        )
+        loop = asyncio.get_running_loop()
+        while not await loop.run_in_executor(
+            None, stop.wait, INGEST_PROCESS_STATS_INTERVAL_S
+        ):
+            events.put((None, feed_stats()))
+        feed.cancel()
+        await asyncio.gather(feed, return_exceptions=True)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass  # Ctrl+C reaches the whole process group; the app shuts down
+    finally:
+        if recorder is not None:
+            recorder.close()
+        events.put((None, feed_stats()))
+        shared.close()
+
+
+class IngestProcess:
+    def __init__(
+        self,
+        on_book: Callable[[Any, Optional[float]], Any],
+        on_status: Callable[[str], Any],
+        url: Optional[str] = None,
+        conflate: bool = FEED_INGEST_CONFLATE,
+        record: bool = FEED_RECORD_ENABLED,
+        depth: int = SHARED_BOOK_DEPTH,
+    ):
+        """
+        Args:
+            on_book (Callable): Called with (SharedBookSnapshot, arrival_perf) for each
+                book read, on a reader thread (e.g. ComputeWorker.submit_book).
+            on_status (Callable): Called with each connection status ("connected",
+                "disconnected_error", "reconnecting", ...), on another thread.
+            url (Optional[str]): Feed URL; None for WEBSOCKET_URL.
+            conflate (bool): See connect_and_listen.
+            record (bool): Record the raw feed in the ingest process (FeedRecorder).
+            depth (int): Levels per side in shared memory.
+
+        Raises:
+            RuntimeError: On platforms where the shared book's seqlock is not safe
+                (not x86; see shared_book.SEQLOCK_SUPPORTED).
+        """
+        if not SEQLOCK_SUPPORTED:
+            raise RuntimeError(
+                f"The shared-memory book needs x86 memory ordering; "
+                f"{platform.machine()} is not supported."
+            )
+        self.on_book = on_book
+        self.on_status = on_status
+        # A fresh interpreter: forking the Tk process is not safe
+        context = multiprocessing.get_context("spawn")
+        self.shared = SharedBook.create(depth)
+        self.reader = SharedBookReader(self.shared)
+        self._notify = context.Event()
+        self._stop = context.Event()
+        self._events = context.Queue()
+        self.process = context.Process(
+            target=run_ingest_process,
+            args=(
+                self.shared.name,
+                url,
+                conflate,
+                record,
+                self._notify,
+                self._events,
+                self._stop,
+            ),
+            name="IngestProcess",
+            daemon=True,
+        )
+        # Latest counters from the ingest process, in the shape of the local objects'
+        self.feed_stats: Dict[str, Any] = {
+            "ingest": IngestStats().get_stats(),
+            "connection": ConnectionSupervisor().get_stats(),
+            "feed_clock": FeedClock().get_stats(),
+            "latency": {},
+            "shared_book": {},
+        }
+        self._closed = False
+        self._book_thread = threading.Thread(
+            target=self._read_books, name="SharedBookReader", daemon=True
+        )
+        self._event_thread = threading.Thread(
+            target=self._read_events, name="IngestEvents", daemon=True
+        )
+
+        # --- Metrics ---
+        self.books_read = 0
+        self.versions_skipped = 0  # Published but superseded before they were read
+
+    def start(self):
+        self.process.start()
+        self._book_thread.start()
+        self._event_thread.start()
+        logger.info(
+            f"Ingest process started (pid {self.process.pid}, shared book "
+            f"{self.shared.name}, depth {self.shared.depth})."
+        )
+
+    def _read_books(self):
+        last_version = 0
+        while not self._closed:
+            if not self._notify.wait(timeout=0.5):
+                continue
+            # Clear before reading: a book published meanwhile sets it again
+            self._notify.clear()
+            if self._closed:
+                break
+            book = self.reader.read()
+            if book is None or book.version == last_version:
+                continue
+            if last_version:
+                self.versions_skipped += book.version - last_version - 1
+            last_version = book.version
+            self.books_read += 1
+            try:
+                self.on_book(book, book.arrival_perf)
+            except Exception as e:
+                logger.error(f"Error handing over a shared book: {e}", exc_info=True)
+
+    def _read_events(self):
+        while True:
+            item = self._events.get()
+            if item is None:
+                break
+            status, feed_stats = item
+            self.feed_stats = feed_stats
+            if status is not None:
+                try:
+                    self.on_status(status)
+                except Exception as e:
+                    logger.error(f"Error handling ingest status: {e}", exc_info=True)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Stops the ingest process and the reader threads, then removes the segment."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            logger.warning("Ingest process did not stop in time; terminating it.")
+            self.process.terminate()
+            self.process.join(timeout)
+        self._notify.set()
+        self._events.put(None)
+        self._book_thread.join(timeout)
+        self._event_thread.join(timeout)
+        self.shared.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            "books_read": self.books_read,
+            "versions_skipped": self.versions_skipped,
+            "exitcode": self.process.exitcode,
+        }
+        stats.update(self.reader.get_stats())
+        stats.update(self.feed_stats["shared_book"])
+        return stats
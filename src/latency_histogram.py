@@ -0,0 +1,288 @@
+# src/latency_histogram.py
+"""
+Fixed-memory latency histograms with rolling-window percentiles.
+
+Values are counted in log-spaced buckets (HDR-histogram style): bucket i covers
+[min * r^i, min * r^(i+1)) with r = 10^(1 / buckets_per_decade), so every
+reported percentile is within one bucket (~5% at 50 per decade) of the true
+value, whatever the range. Recording is a log, a floor and an increment.
+
+Each pipeline stage has a RollingHistogram: a ring of slices covering the last
+LATENCY_WINDOW_S, plus a lifetime total. LatencyRecorder holds one per stage,
+is safe to record into from any thread, and appends JSON-lines snapshots
+(percentiles plus the raw bucket counts, so runs can be merged and compared
+offline):
+
+    python -m src.latency_histogram latency_histograms.jsonl [other.jsonl ...]
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import (
+    LATENCY_HIST_MIN_MS,
+    LATENCY_HIST_MAX_MS,
+    LATENCY_HIST_BUCKETS_PER_DECADE,
+    LATENCY_WINDOW_S,
+    LATENCY_WINDOW_SLICES,
+    LATENCY_SNAPSHOT_FILE,
+)
+from .log_writer import BufferedLogWriter
+
+PERCENTILES = (50.0, 90.0, 99.0)
+
+# Stages recorded by the app, in pipeline order (see README, "Latency Measurement")
+STAGES = (
+    "exchange",  # Exchange timestamp to arrival, above the clock offset (feed_clock.py)
+    "decode",  # json.loads of the applied feed messages
+    "book_update",  # OrderBookManager update for one ingest batch
+    "queue_wait",  # L1: message arrival to compute start
+    "probes",  # Feature extraction + probe walk-the-book
+    "training",  # Model fit, when one runs
+    "estimate",  # L2: cost estimate for the user order
+    "ui_update",  # L3: rendering a result on the Tk thread
+    "end_to_end",  # L4: message arrival to rendered
+)
+
+
+class LatencyHistogram:
+    def __init__(
+        self,
+        min_ms: float = LATENCY_HIST_MIN_MS,
+        max_ms: float = LATENCY_HIST_MAX_MS,
+        buckets_per_decade: int = LATENCY_HIST_BUCKETS_PER_DECADE,
+    ):
+        self.min_ms = min_ms
+        self.buckets_per_decade = buckets_per_decade
+        self._scale = buckets_per_decade / math.log(10)
+        # Bucket 0 also holds everything below min_ms, the last one everything above max_ms
+        self.num_buckets = math.ceil(math.log10(max_ms / min_ms) * buckets_per_decade)
+        self.counts = [0] * self.num_buckets
+        self.count = 0
+        self.max_value_ms = 0.0
+
+    def bucket(self, value_ms: float) -> int:
+        if value_ms <= self.min_ms:
+            return 0
+        return min(
+            int(math.log(value_ms / self.min_ms) * self._scale), self.num_buckets - 1
+        )
+
+    def upper_edge(self, bucket: int) -> float:
+        return self.min_ms * 10 ** ((bucket + 1) / self.buckets_per_decade)
+
+    def record(self, value_ms: float):
+        self.counts[self.bucket(value_ms)] += 1
+        self.count += 1
+        if value_ms > self.max_value_ms:
+            self.max_value_ms = value_ms
+
+    def merge(self, other: "LatencyHistogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.max_value_ms = max(self.max_value_ms, other.max_value_ms)
+
+    def reset(self):
+        self.counts = [0] * self.num_buckets
+        self.count = 0
+        self.max_value_ms = 0.0
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Upper edge of the bucket holding the p-th percentile (never above the
+        observed max), or None if empty.
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100.0))
+        seen = 0
+        for bucket, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.upper_edge(bucket), self.max_value_ms)
+        return self.max_value_ms
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        summary = {"count": self.count}
+        for p in PERCENTILES:
+            summary[f"p{p:g}"] = self.percentile(p)
+        summary["max"] = self.max_value_ms if self.count else None
+        return summary
+
+    def nonzero_buckets(self) -> Dict[int, int]:
+        return {bucket: n for bucket, n in enumerate(self.counts) if n}
+
+
+class RollingHistogram:
+    """A LatencyHistogram over the last `window_s`, advancing one slice at a time."""
+
+    def __init__(
+        self,
+        window_s: float = LATENCY_WINDOW_S,
+        slices: int = LATENCY_WINDOW_SLICES,
+        clock=time.monotonic,
+        **histogram_kwargs,
+    ):
+        self.window_s = window_s
+        self.slice_s = window_s / slices
+        self.clock = clock
+        self._histogram_kwargs = histogram_kwargs
+        self._slices = [LatencyHistogram(**histogram_kwargs) for _ in range(slices)]
+        self.total = LatencyHistogram(**histogram_kwargs)
+        self._slice_index = int(clock() // self.slice_s)  # Absolute slice number
+        self._lock = threading.Lock()
+
+    def _advance(self):
+        current = int(self.clock() // self.slice_s)
+        # Clear the slices that fell out of the window since the last call
+        for index in range(
+            max(self._slice_index + 1, current - len(self._slices) + 1), current + 1
+        ):
+            self._slices[index % len(self._slices)].reset()
+        self._slice_index = max(self._slice_index, current)
+
+    def record(self, value_ms: float):
+        with self._lock:
+            self._advance()
+            self._slices[self._slice_index % len(self._slices)].record(value_ms)
+            self.total.record(value_ms)
+
+    def window(self) -> LatencyHistogram:
+        """Merged copy of the slices in the current window."""
+        with self._lock:
+            self._advance()
+            merged = LatencyHistogram(**self._histogram_kwargs)
+            for hist in self._slices:
+                merged.merge(hist)
+            return merged
+
+
+class JSONLinesSink:
+    """Log sink (see BufferedLogWriter) appending one JSON document per row."""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file = open(file_path, "a")
+
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        self._file.writelines(json.dumps(row) + "\n" for row in rows)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class LatencyRecorder:
+    def __init__(self, stages=STAGES, snapshot_file: Optional[str] = None, **kwargs):
+        """
+        Args:
+            stages (Sequence[str]): Stage names; more are added on first record.
+            snapshot_file (str): JSON-lines file for `dump_snapshot()`; None disables it.
+            **kwargs: Passed to every RollingHistogram (window_s, slices, ...).
+        """
+        self._kwargs = kwargs
+        self.histograms: Dict[str, RollingHistogram] = {
+            stage: RollingHistogram(**kwargs) for stage in stages
+        }
+        self._writer = (
+            BufferedLogWriter(JSONLinesSink(snapshot_file), name="LatencySnapshots")
+            if snapshot_file
+            else None
+        )
+        self.watchdog = None  # Optional LatencyWatchdog; sees every recorded value
+
+    def record(self, stage: str, value_ms: Optional[float]):
+        if value_ms is None:
+            return
+        hist = self.histograms.get(stage)
+        if hist is None:
+            hist = self.histograms.setdefault(stage, RollingHistogram(**self._kwargs))
+        hist.record(value_ms)
+        if self.watchdog is not None:
+            self.watchdog.observe(stage, value_ms)
+
+    def summaries(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Rolling-window count, p50/p90/p99 and max per stage."""
+        return {
+            stage: hist.window().summary() for stage, hist in self.histograms.items()
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        stages = {}
+        for stage, hist in self.histograms.items():
+            window = hist.window()
+            stages[stage] = {
+                "window": window.summary(),
+                "total": hist.total.summary(),
+                "total_buckets": hist.total.nonzero_buckets(),
+            }
+        any_hist = next(iter(self.histograms.values()), None)
+        return {
+            "wall_time": time.time(),
+            "window_s": any_hist.window_s if any_hist else None,
+            "min_ms": any_hist.total.min_ms if any_hist else None,
+            "buckets_per_decade": (
+                any_hist.total.buckets_per_decade if any_hist else None
+            ),
+            "stages": stages,
+        }
+
+    def dump_snapshot(self) -> bool:
+        """Queues a snapshot for the snapshot file (written off the caller's thread)."""
+        if self._writer is None:
+            return False
+        return self._writer.write_row(self.snapshot())
+
+    def close(self):
+        if self._writer is not None:
+            self.dump_snapshot()
+            self._writer.close()
+
+
+def format_summary(summary: Dict[str, Optional[float]]) -> str:
+    """'p50 / p90 / p99 / max' in ms, e.g. for one UI row."""
+    values = [summary[f"p{p:g}"] for p in PERCENTILES] + [summary["max"]]
+    return " / ".join(f"{v:.3f}" if v is not None else "N/A" for v in values)
+
+
+def read_snapshots(file_path: str = LATENCY_SNAPSHOT_FILE) -> Iterator[Dict[str, Any]]:
+    with open(file_path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Torn last line after a crash
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare lifetime stage latencies from latency snapshot files."
+    )
+    parser.add_argument("files", nargs="+", help="JSON-lines files from the app")
+    args = parser.parse_args()
+    print(f"{'stage':<12} {'file':<32} {'count':>9}  p50 / p90 / p99 / max (ms)")
+    rows: Dict[str, List[str]] = {}
+    for file_path in args.files:
+        last = None
+        for last in read_snapshots(file_path):
+            pass
+        if last is None:
+            continue
+        for stage, data in last["stages"].items():
+            total = data["total"]
+            rows.setdefault(stage, []).append(
+                f"{stage:<12} {file_path[-32:]:<32} {total['count']:>9}  "
+                f"{format_summary(total)}"
+            )
+    for stage_rows in rows.values():
+        print("\n".join(stage_rows))
+
+
+if __name__ == "__main__":
+    main()
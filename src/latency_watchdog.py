@@ -0,0 +1,202 @@
+# src/latency_watchdog.py
+"""
+Latency budgets and graceful degradation.
+
+LatencyWatchdog sees every value the LatencyRecorder records (set it as the
+recorder's `watchdog`) and checks the stages listed in LATENCY_BUDGETS_MS.
+Each WATCHDOG_WINDOW_S it takes the WATCHDOG_PERCENTILE of every watched stage
+over that window:
+
+- Any stage over its budget: the next kind of optional work is shed. Actions
+  are shed in the order they were added (the app adds fewer probes, deferred
+  retrains, sampled logging, then a lower UI refresh rate), one per window, so
+  the cheapest loss of quality comes first.
+- Every stage below WATCHDOG_RESTORE_RATIO of its budget for
+  WATCHDOG_RESTORE_AFTER_WINDOWS windows in a row: the most recently shed
+  work is restored. Windows in between reset that count, so the level does
+  not flap around a budget.
+
+Every degrade and restore is a DegradationEvent: logged, kept in memory (the
+last WATCHDOG_MAX_EVENTS) and appended to WATCHDOG_EVENT_FILE as JSON lines.
+"""
+
+import collections
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .config import (
+    LATENCY_BUDGETS_MS,
+    WATCHDOG_EVENT_FILE,
+    WATCHDOG_MAX_EVENTS,
+    WATCHDOG_PERCENTILE,
+    WATCHDOG_RESTORE_AFTER_WINDOWS,
+    WATCHDOG_RESTORE_RATIO,
+    WATCHDOG_WINDOW_S,
+)
+from .latency_histogram import JSONLinesSink, LatencyHistogram
+from .log_writer import BufferedLogWriter
+
+logger = logging.getLogger(__name__)
+
+
+class DegradationEvent(NamedTuple):
+    wall_time: float
+    action: str  # "degrade" or "restore"
+    work: str  # Name of the work shed or restored, e.g. "probes"
+    level: int  # Number of kinds of work shed after the event
+    # Stage that drove the decision (the one furthest over budget, or closest to it on
+    # a restore), with its windowed percentile and budget
+    stage: Optional[str]
+    percentile_ms: Optional[float]
+    budget_ms: Optional[float]
+
+
+class LatencyWatchdog:
+    def __init__(
+        self,
+        budgets_ms: Optional[Dict[str, float]] = None,
+        percentile: float = WATCHDOG_PERCENTILE,
+        window_s: float = WATCHDOG_WINDOW_S,
+        restore_ratio: float = WATCHDOG_RESTORE_RATIO,
+        restore_after_windows: int = WATCHDOG_RESTORE_AFTER_WINDOWS,
+        event_file: Optional[str] = WATCHDOG_EVENT_FILE,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            budgets_ms (Dict[str, float]): Budget per stage; defaults to LATENCY_BUDGETS_MS.
+            percentile (float): Percentile of a window compared with the budget.
+            window_s (float): Length of an evaluation window.
+            restore_ratio (float): Fraction of the budgets every stage must stay under ...
+            restore_after_windows (int): ... for this many windows before a restore.
+            event_file (Optional[str]): JSON-lines file for the events; None disables it.
+            clock (Callable[[], float]): Monotonic time source.
+        """
+        self.budgets_ms = dict(LATENCY_BUDGETS_MS if budgets_ms is None else budgets_ms)
+        self.percentile = percentile
+        self.window_s = window_s
+        self.restore_ratio = restore_ratio
+        self.restore_after_windows = restore_after_windows
+        self.clock = clock
+        self._windows = {stage: LatencyHistogram() for stage in self.budgets_ms}
+        self._window_start = clock()
+        self._headroom_windows = 0
+        self._actions: List[Tuple[str, Callable[[], Any], Callable[[], Any]]] = []
+        self._lock = threading.Lock()
+        self.level = 0  # The first `level` actions are shed
+        self.events = collections.deque(maxlen=WATCHDOG_MAX_EVENTS)
+        self._writer = (
+            BufferedLogWriter(JSONLinesSink(event_file), name="DegradationEvents")
+            if event_file
+            else None
+        )
+
+        # --- Metrics ---
+        self.windows = 0
+        self.windows_over_budget = 0
+        self.degradations = 0
+        self.restorations = 0
+
+    def add_action(
+        self, work: str, degrade: Callable[[], Any], restore: Callable[[], Any]
+    ):
+        """Adds optional work; it is shed after all work added before it."""
+        with self._lock:
+            self._actions.append((work, degrade, restore))
+
+    @property
+    def shed(self) -> List[str]:
+        """Names of the work currently shed, in shedding order."""
+        return [work for work, _, _ in self._actions[: self.level]]
+
+    def observe(self, stage: str, value_ms: float):
+        """Counts one stage latency; evaluates the window once it is over. Any thread."""
+        hist = self._windows.get(stage)
+        if hist is None:
+            return
+        with self._lock:
+            hist.record(value_ms)
+            now = self.clock()
+            if now - self._window_start >= self.window_s:
+                self._window_start = now
+                self._evaluate()
+
+    def _evaluate(self):
+        worst = None  # (ratio, stage, percentile_ms)
+        for stage, hist in self._windows.items():
+            value = hist.percentile(self.percentile)
+            hist.reset()
+            if value is None:
+                continue  # Not run in this window
+            ratio = value / self.budgets_ms[stage]
+            if worst is None or ratio > worst[0]:
+                worst = (ratio, stage, value)
+        self.windows += 1
+        if worst is not None and worst[0] > 1.0:
+            self.windows_over_budget += 1
+            self._headroom_windows = 0
+            if self.level < len(self._actions):
+                work, degrade, _ = self._actions[self.level]
+                self.level += 1
+                self.degradations += 1
+                self._run(degrade, work)
+                self._record("degrade", work, worst)
+            return
+        if worst is not None and worst[0] >= self.restore_ratio:
+            self._headroom_windows = 0  # Within budget, but too close to restore
+            return
+        self._headroom_windows += 1
+        if self.level > 0 and self._headroom_windows >= self.restore_after_windows:
+            self._headroom_windows = 0
+            self.level -= 1
+            work, _, restore = self._actions[self.level]
+            self.restorations += 1
+            self._run(restore, work)
+            self._record("restore", work, worst)
+
+    @staticmethod
+    def _run(func: Callable[[], Any], work: str):
+        try:
+            func()
+        except Exception as e:
+            logger.error(f"Error changing {work} for degradation: {e}", exc_info=True)
+
+    def _record(self, action: str, work: str, worst):
+        _, stage, value = worst if worst is not None else (None, None, None)
+        event = DegradationEvent(
+            wall_time=time.time(),
+            action=action,
+            work=work,
+            level=self.level,
+            stage=stage,
+            percentile_ms=value,
+            budget_ms=self.budgets_ms.get(stage),
+        )
+        self.events.append(event)
+        if self._writer is not None:
+            self._writer.write_row(event._asdict())
+        if action == "degrade":
+            logger.warning(
+                f"Latency over budget ({stage} p{self.percentile:g} {value:.2f} ms > "
+                f"{event.budget_ms:.2f} ms): shedding {work} (level {self.level})."
+            )
+        else:
+            logger.info(
+                f"Latency headroom restored: resuming {work} (level {self.level})."
+            )
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "level": self.level,
+            "shed": self.shed,
+            "windows": self.windows,
+            "windows_over_budget": self.windows_over_budget,
+            "degradations": self.degradations,
+            "restorations": self.restorations,
+        }
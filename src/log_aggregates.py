@@ -0,0 +1,301 @@
+# src/log_aggregates.py
+"""
+Bounded-memory running aggregates for streaming analysis of the simulator logs.
+
+Every structure here has a fixed size regardless of how many rows it has seen,
+so analyze_slippage_data.py can stream arbitrarily long logs chunk by chunk:
+histograms, 2D (density) histograms and binned means over signed logarithmic
+bins (no value range needs to be known up front), exact running moments, and a
+fixed-size uniform reservoir sample of rows for scatter plots.
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class SignedLogBins:
+    """
+    Maps real values to bins that are logarithmic in |x| on each side of zero:
+    `bins_per_decade` per decade between `min_abs` and `max_abs`, plus one bin
+    for |x| < min_abs. Values beyond max_abs fall into the outermost bins.
+    """
+
+    def __init__(
+        self,
+        bins_per_decade: int = 50,
+        min_abs: float = 1e-8,
+        max_abs: float = 1e10,
+    ):
+        self.bins_per_decade = bins_per_decade
+        self.min_abs = min_abs
+        self.max_abs = max_abs
+        self.bins_per_side = int(
+            math.ceil(math.log10(max_abs / min_abs) * bins_per_decade)
+        )
+        self.num_bins = 2 * self.bins_per_side + 1
+        self.zero_bin = self.bins_per_side
+
+    def index(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        magnitude = np.abs(values)
+        with np.errstate(divide="ignore"):
+            steps = np.floor(
+                np.log10(np.maximum(magnitude, self.min_abs) / self.min_abs)
+                * self.bins_per_decade
+            ).astype(np.int64)
+        steps = np.clip(steps + 1, 1, self.bins_per_side)
+        steps[magnitude < self.min_abs] = 0
+        return self.zero_bin + np.sign(values).astype(np.int64) * steps
+
+    def edges(self, index: np.ndarray):
+        """Lower and upper value edges of the given bins."""
+        index = np.asarray(index)
+        steps = np.abs(index - self.zero_bin)
+        inner = self.min_abs * 10 ** ((steps - 1) / self.bins_per_decade)
+        outer = self.min_abs * 10 ** (steps / self.bins_per_decade)
+        inner = np.where(steps == 0, 0.0, inner)
+        outer = np.where(steps == 0, self.min_abs, outer)
+        positive = index >= self.zero_bin
+        lower = np.where(positive, np.where(steps == 0, -self.min_abs, inner), -outer)
+        upper = np.where(positive, outer, -inner)
+        return lower, upper
+
+    def centers(self, index: np.ndarray) -> np.ndarray:
+        lower, upper = self.edges(index)
+        return (lower + upper) / 2
+
+
+class RunningMoments:
+    """Exact count/mean/variance/min/max, mergeable (Chan et al. parallel update)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        if values.size == 0:
+            return
+        other = RunningMoments()
+        other.count = values.size
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other: "RunningMoments"):
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta**2 * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> Optional[float]:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None
+
+
+class StreamingHistogram:
+    """Counts over SignedLogBins plus exact moments; quantiles are bin-resolution."""
+
+    def __init__(self, bins: Optional[SignedLogBins] = None):
+        self.bins = bins if bins is not None else SignedLogBins()
+        self.counts = np.zeros(self.bins.num_bins, dtype=np.int64)
+        self.moments = RunningMoments()
+
+    def add(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        self.counts += np.bincount(
+            self.bins.index(values), minlength=self.bins.num_bins
+        )
+        self.moments.add(values)
+
+    def merge(self, other: "StreamingHistogram"):
+        self.counts += other.counts
+        self.moments.merge(other.moments)
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.counts.sum()
+        if total == 0:
+            return None
+        bin_index = int(np.searchsorted(np.cumsum(self.counts), q * total))
+        bin_index = min(bin_index, self.bins.num_bins - 1)
+        return float(self.bins.centers(np.array([bin_index]))[0])
+
+    def nonempty(self, low: float = -math.inf, high: float = math.inf):
+        """(lower edges, upper edges, counts) of the non-empty bins within [low, high]."""
+        index = np.nonzero(self.counts)[0]
+        lower, upper = self.bins.edges(index)
+        keep = (upper >= low) & (lower <= high)
+        return lower[keep], upper[keep], self.counts[index][keep]
+
+
+class BinnedMeans:
+    """Per-bin count, mean and std of y, with x binned over SignedLogBins."""
+
+    def __init__(self, bins: Optional[SignedLogBins] = None):
+        self.bins = bins if bins is not None else SignedLogBins(bins_per_decade=10)
+        self.count = np.zeros(self.bins.num_bins, dtype=np.int64)
+        self.sum_y = np.zeros(self.bins.num_bins)
+        self.sum_y2 = np.zeros(self.bins.num_bins)
+
+    def add(self, x: np.ndarray, y: np.ndarray):
+        index = self.bins.index(x)
+        y = np.asarray(y, dtype=float)
+        self.count += np.bincount(index, minlength=self.bins.num_bins)
+        self.sum_y += np.bincount(index, weights=y, minlength=self.bins.num_bins)
+        self.sum_y2 += np.bincount(index, weights=y * y, minlength=self.bins.num_bins)
+
+    def merge(self, other: "BinnedMeans"):
+        self.count += other.count
+        self.sum_y += other.sum_y
+        self.sum_y2 += other.sum_y2
+
+    def to_frame(self, min_count: int = 1) -> pd.DataFrame:
+        index = np.nonzero(self.count >= min_count)[0]
+        n = self.count[index]
+        mean = self.sum_y[index] / n
+        var = np.maximum(self.sum_y2[index] / n - mean**2, 0.0)
+        return pd.DataFrame(
+            {
+                "x": self.bins.centers(index),
+                "count": n,
+                "mean": mean,
+                "std": np.sqrt(var),
+            }
+        )
+
+
+class Histogram2D:
+    """Joint counts of (x, y) over SignedLogBins on both axes, for density plots."""
+
+    def __init__(
+        self,
+        x_bins: Optional[SignedLogBins] = None,
+        y_bins: Optional[SignedLogBins] = None,
+    ):
+        self.x_bins = (
+            x_bins if x_bins is not None else SignedLogBins(bins_per_decade=20)
+        )
+        self.y_bins = (
+            y_bins
+            if y_bins is not None
+            else SignedLogBins(bins_per_decade=20, min_abs=1e-7, max_abs=1e3)
+        )
+        # int32 keeps a 721 x 401 grid near 1 MB; counts per cell stay far below 2**31
+        self.counts = np.zeros((self.x_bins.num_bins, self.y_bins.num_bins), np.int32)
+
+    def add(self, x: np.ndarray, y: np.ndarray):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        finite = np.isfinite(x) & np.isfinite(y)
+        flat = self.x_bins.index(x[finite]) * self.y_bins.num_bins + self.y_bins.index(
+            y[finite]
+        )
+        self.counts += (
+            np.bincount(flat, minlength=self.counts.size)
+            .reshape(self.counts.shape)
+            .astype(np.int32)
+        )
+
+    def merge(self, other: "Histogram2D"):
+        self.counts += other.counts
+
+    def mesh(self, y_low: float = -math.inf, y_high: float = math.inf):
+        """
+        (x edges, y edges, counts) over the smallest block of bins holding every
+        non-empty cell (y limited to [y_low, y_high]); counts are indexed [y, x] as
+        pcolormesh expects. None if there is no data.
+        """
+        y_index = np.arange(self.y_bins.num_bins)
+        y_lower, y_upper = self.y_bins.edges(y_index)
+        y_keep = (y_upper >= y_low) & (y_lower <= y_high)
+        counts = self.counts[:, y_keep]
+        x_used = np.nonzero(counts.sum(axis=1))[0]
+        y_used = np.nonzero(counts.sum(axis=0))[0]
+        if len(x_used) == 0:
+            return None
+        x_index = np.arange(x_used[0], x_used[-1] + 1)
+        y_index = y_index[y_keep][y_used[0] : y_used[-1] + 1]
+        x_lower, x_upper = self.x_bins.edges(x_index)
+        y_lower, y_upper = self.y_bins.edges(y_index)
+        return (
+            np.append(x_lower, x_upper[-1]),
+            np.append(y_lower, y_upper[-1]),
+            self.counts[np.ix_(x_index, y_index)].T,
+        )
+
+
+class ReservoirSample:
+    """Fixed-size uniform sample (Algorithm R) of DataFrame rows seen across chunks."""
+
+    def __init__(self, columns: Sequence[str], capacity: int = 10_000, seed: int = 1):
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.data = np.empty((capacity, len(self.columns)))
+        self.filled = 0
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, df: pd.DataFrame):
+        rows = df[self.columns].to_numpy(dtype=float)
+        take = min(len(rows), self.capacity - self.filled)
+        if take:
+            self.data[self.filled : self.filled + take] = rows[:take]
+            self.filled += take
+        rest = rows[take:]
+        if len(rest):
+            # Row i of `rest` is the (seen + take + i + 1)-th row overall
+            positions = self.seen + take + np.arange(1, len(rest) + 1)
+            slots = (self._rng.random(len(rest)) * positions).astype(np.int64)
+            selected = np.nonzero(slots < self.capacity)[0]
+            # Later rows overwrite earlier ones in the same slot, as sequential Algorithm R would
+            self.data[slots[selected]] = rest[selected]
+        self.seen += len(rows)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.data[: self.filled], columns=self.columns)
+
+
+class ProbeAggregates:
+    """Running aggregates over probe rows, for the slippage/feature plots."""
+
+    SLIPPAGE_COLUMN = "true_slippage_pct_walk_the_book"
+
+    def __init__(self, feature_columns: List[str]):
+        """
+        Args:
+            feature_columns (List[str]): x columns (probe_order_size_usd and market_* features).
+        """
+        self.feature_columns = list(feature_columns)
+        self.slippage = StreamingHistogram()
+        self.binned: Dict[str, BinnedMeans] = {
+            feature: BinnedMeans() for feature in self.feature_columns
+        }
+        self.density: Dict[str, Histogram2D] = {
+            feature: Histogram2D() for feature in self.feature_columns
+        }
+        self.rows = 0
+
+    def add(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        y = df[self.SLIPPAGE_COLUMN].to_numpy(dtype=float)
+        self.slippage.add(y)
+        for feature in self.feature_columns:
+            x = df[feature].to_numpy(dtype=float)
+            self.binned[feature].add(x, y)
+            self.density[feature].add(x, y)
+        self.rows += len(df)
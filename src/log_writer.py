@@ -0,0 +1,356 @@
+# src/log_writer.py
+"""
+Background logging that keeps disk I/O off the UI/tick path.
+
+Each log gets one long-lived sink (e.g. an open CSV handle) owned by a writer
+thread. Producers only enqueue rows (`write_row` never blocks); the thread
+drains the queue in batches and flushes on size, on interval and on shutdown.
+If the queue is full rows are dropped and counted instead of stalling the caller.
+Sinks only need `write_rows(rows)`, `flush()` and `close()`; see CSVSink here
+and ColumnarSink in columnar_log.py.
+"""
+
+import csv
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from .config import (
+    LOG_QUEUE_MAX_ROWS,
+    LOG_FLUSH_BATCH_ROWS,
+    LOG_FLUSH_INTERVAL_S,
+    LOG_FORMAT,
+    REGRESSION_DATA_LOG_FILE,
+    MODEL_PERFORMANCE_LOG_FILE,
+    COLUMNAR_LOG_DIR,
+)
+from .columnar_log import (
+    ColumnarSink,
+    PROBE_STREAM,
+    USER_PREDICTION_STREAM,
+    PERFORMANCE_STREAM,
+    USER_PREDICTION_SCHEMA,
+    probe_schema,
+    performance_schema,
+)
+from .utils import ensure_csv_header
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()  # Queue sentinel for shutdown
+
+
+class CSVSink:
+    """Appends rows to one CSV file through a single long-lived handle."""
+
+    def __init__(self, file_path: str, header: List[str]):
+        self.file_path = file_path
+        self.header = list(header)
+        ensure_csv_header(file_path, self.header)
+        self._file = open(file_path, "a", newline="")
+        self._writer = csv.writer(self._file)
+
+    def write_rows(self, rows: List[List[Any]]):
+        self._writer.writerows(rows)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BufferedLogWriter:
+    def __init__(
+        self,
+        sink,
+        name: str,
+        max_queue_rows: int = LOG_QUEUE_MAX_ROWS,
+        flush_batch_rows: int = LOG_FLUSH_BATCH_ROWS,
+        flush_interval_s: float = LOG_FLUSH_INTERVAL_S,
+    ):
+        self.sink = sink
+        self.name = name
+        self.flush_batch_rows = flush_batch_rows
+        self.flush_interval_s = flush_interval_s
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue_rows)
+
+        # --- Metrics ---
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.batches_written = 0
+        self.flushes = 0
+        self.max_queue_depth = 0
+
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"LogWriter-{name}", daemon=True
+        )
+        self._thread.start()
+
+    def write_row(self, row: List[Any]) -> bool:
+        """Enqueues one row. Returns False (and counts a drop) if the queue is full or closed."""
+        if self._closed:
+            self.rows_dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.rows_dropped += 1
+            return False
+        return True
+
+    def _run(self):
+        rows_since_flush = 0
+        last_flush_time = time.monotonic()
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                item = None
+
+            batch = []
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                batch.append(item)
+            # Drain whatever else is already queued, in one batch
+            while not stopping:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                # Everything drained at once was queued simultaneously
+                self.max_queue_depth = max(self.max_queue_depth, len(batch))
+                try:
+                    self.sink.write_rows(batch)
+                    self.rows_written += len(batch)
+                    self.batches_written += 1
+                    rows_since_flush += len(batch)
+                except Exception as e:
+                    logger.error(
+                        f"Error writing {len(batch)} rows to {self.name}: {e}",
+                        exc_info=True,
+                    )
+                    self.rows_dropped += len(batch)
+
+            now = time.monotonic()
+            if rows_since_flush and (
+                stopping
+                or rows_since_flush >= self.flush_batch_rows
+                or now - last_flush_time >= self.flush_interval_s
+            ):
+                self.sink.flush()
+                self.flushes += 1
+                rows_since_flush = 0
+                last_flush_time = now
+
+        self.sink.close()
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Stops accepting rows, writes out everything queued and closes the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Log writer for {self.name} did not finish in time.")
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "batches_written": self.batches_written,
+            "flushes": self.flushes,
+        }
+
+
+class BufferedCSVWriter(BufferedLogWriter):
+    """BufferedLogWriter appending to a CSV file (header checked on open)."""
+
+    def __init__(self, file_path: str, header: List[str], **kwargs):
+        super().__init__(CSVSink(file_path, header), name=file_path, **kwargs)
+        self.file_path = file_path
+
+
+class SimulatorLogs:
+    """
+    The simulator's probe, user-prediction and model-performance logs.
+
+    With `log_format="csv"` probe and user-prediction rows share the wide
+    regression CSV (unused columns left empty), as analyze_slippage_data.py
+    has always read it. With "npz"/"parquet" each row type is its own typed
+    columnar stream under `columnar_dir`, and only the columns of that row type
+    are written.
+    """
+
+    def __init__(
+        self,
+        feature_names: Sequence[str],
+        size_bucket_labels: Sequence[str],
+        log_format: str = LOG_FORMAT,
+        regression_csv: str = REGRESSION_DATA_LOG_FILE,
+        performance_csv: str = MODEL_PERFORMANCE_LOG_FILE,
+        columnar_dir: str = COLUMNAR_LOG_DIR,
+    ):
+        self.log_format = log_format
+        # Degraded mode (set by the LatencyWatchdog, latency_watchdog.py): write only
+        # 1 in N probe/user-prediction rows; performance rows are always written
+        self.sample_every_n = 1
+        self._rows_offered = 0
+        self.rows_sampled_out = 0
+        self.num_features = len(feature_names)
+        self.size_bucket_labels = list(size_bucket_labels)
+        if log_format == "csv":
+            regression_header = (
+                ["timestamp_data_collected", "probe_order_size_usd"]
+                # One column per configured model book feature, e.g. market_spread_bps
+                + [f"market_{name}" for name in feature_names]
+                + [
+                    "true_slippage_pct_walk_the_book",
+                    "feature_extraction_ms",
+                    "probe_sample_weight",
+                    "is_model_trained_at_prediction",
+                    "user_order_size_usd",
+                    "predicted_slippage_pct_regression",
+                ]
+            )
+            # Metrics are prequential (test-then-train, see PrequentialMetrics): each row
+            # is a snapshot of the rolling window at retrain time.
+            performance_header = [
+                name for name, _ in performance_schema(self.size_bucket_labels)
+            ]
+            self._probes = BufferedCSVWriter(regression_csv, regression_header)
+            self._user_predictions = self._probes  # Same wide file
+            self._performance = BufferedCSVWriter(performance_csv, performance_header)
+        else:
+
+            def columnar(stream, schema):
+                sink = ColumnarSink(columnar_dir, stream, schema, fmt=log_format)
+                return BufferedLogWriter(sink, name=f"{columnar_dir}/{stream}")
+
+            self._probes = columnar(PROBE_STREAM, probe_schema(feature_names))
+            self._user_predictions = columnar(
+                USER_PREDICTION_STREAM, USER_PREDICTION_SCHEMA
+            )
+            self._performance = columnar(
+                PERFORMANCE_STREAM, performance_schema(self.size_bucket_labels)
+            )
+
+    @property
+    def writers(self) -> List[BufferedLogWriter]:
+        unique = []
+        for writer in (self._probes, self._user_predictions, self._performance):
+            if writer not in unique:
+                unique.append(writer)
+        return unique
+
+    @staticmethod
+    def _timestamp(wall_time: Optional[float], as_csv: bool):
+        wall_time = time.time() if wall_time is None else wall_time
+        return (
+            time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(wall_time))
+            if as_csv
+            else wall_time
+        )
+
+    def _sampled_out(self) -> bool:
+        if self.sample_every_n <= 1:
+            return False
+        self._rows_offered += 1
+        if self._rows_offered % self.sample_every_n:
+            self.rows_sampled_out += 1
+            return True
+        return False
+
+    def log_probe(
+        self,
+        probe_size_usd: float,
+        book_features: List[float],
+        true_slippage_pct: float,
+        extraction_ms: Optional[float],
+        sample_weight: float,
+        wall_time: Optional[float] = None,
+    ):
+        if self._sampled_out():
+            return
+        is_csv = self.log_format == "csv"
+        row = (
+            [self._timestamp(wall_time, is_csv), probe_size_usd]
+            + list(book_features)
+            + [true_slippage_pct, extraction_ms, sample_weight]
+        )
+        if is_csv:
+            row += [None, None, None]  # User-prediction columns
+        self._probes.write_row(row)
+
+    def log_user_prediction(
+        self,
+        is_model_trained: bool,
+        user_order_size_usd: float,
+        predicted_slippage_pct: Optional[float],
+        wall_time: Optional[float] = None,
+    ):
+        if self._sampled_out():
+            return
+        is_csv = self.log_format == "csv"
+        timestamp = self._timestamp(wall_time, is_csv)
+        if is_csv:
+            # Probe columns (size, market_* features, slippage, extraction ms, weight) empty
+            row = [timestamp] + [None] * (self.num_features + 4)
+        else:
+            row = [timestamp]
+        self._user_predictions.write_row(
+            row + [is_model_trained, user_order_size_usd, predicted_slippage_pct]
+        )
+
+    def log_performance(
+        self,
+        metrics: Dict[str, Any],
+        retrain_reason: str,
+        wall_time: Optional[float] = None,
+    ):
+        bias_by_size = metrics.get("bias_by_size", {})
+        self._performance.write_row(
+            [
+                self._timestamp(wall_time, self.log_format == "csv"),
+                metrics.get("training_samples", 0),
+                metrics.get("mse"),
+                metrics.get("r2"),
+                metrics.get("bias"),
+                metrics.get("evaluated_samples", 0),
+                retrain_reason,
+            ]
+            + [bias_by_size.get(label) for label in self.size_bucket_labels]
+        )
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+            logger.info(f"Closed log {writer.name}: {writer.get_stats()}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Queue depth and dropped rows summed over all writers, plus sampled-out rows."""
+        stats = [writer.get_stats() for writer in self.writers]
+        totals = {
+            key: sum(s[key] for s in stats)
+            for key in ("queue_depth", "rows_written", "rows_dropped")
+        }
+        totals["rows_sampled_out"] = self.rows_sampled_out
+        return totals
@@ -7,11 +7,15 @@ and triggers financial calculations.
 
 import tkinter as tk
 from tkinter import ttk
+import argparse
 import threading
 import asyncio
 import logging
+import platform
+import signal
 import time
-import csv  # NEW import for CSV logging
+from functools import partial
+from typing import Dict
 
 # --- (Imports from our src modules, including SlippageRegressionModel) ---
 import sys
@@ -19,13 +23,32 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from src.order_book_manager import OrderBookManager
-from src.websocket_handler import connect_and_listen
-from src.financial_calculations import (
-    calculate_expected_fees,
-    calculate_slippage_walk_book,
-    calculate_market_impact_cost,
-    SlippageRegressionModel,
+from src.websocket_handler import FeedRecorder, IngestStats
+from src.connection_supervisor import ConnectionSupervisor, run_supervised
+from src.pipeline import TickPipeline
+from src.compute_worker import ComputeWorker, ComputeResult, OrderInputs
+from src.ui_conflator import UpdateConflator
+from src.config import (
+    FEED_RECORD_ENABLED,
+    INGEST_PROCESS_ENABLED,
+    LATENCY_SNAPSHOT_FILE,
+    LATENCY_SNAPSHOT_INTERVAL_S,
+    LATENCY_WINDOW_S,
+    PROFILE_SIGNAL_POLL_S,
+    RECONNECT_KEEP_BOOK_S,
+    UI_MAX_FPS,
+    WATCHDOG_DEGRADED_LOG_EVERY_N,
+    WATCHDOG_DEGRADED_MAX_PROBES,
+    WATCHDOG_DEGRADED_UI_FPS,
+    WATCHDOG_ENABLED,
 )
+from src.latency_histogram import LatencyRecorder, format_summary
+from src.latency_watchdog import LatencyWatchdog
+from src.feed_clock import FeedClock
+from src.ingest_process import INGEST_STAGES, IngestProcess
+from src.shared_book import SEQLOCK_SUPPORTED
+from src.profiling_hooks import ProfilingHooks
+from src.log_writer import SimulatorLogs
 
 # --- (Logging setup) ---
 logging.basicConfig(
@@ -34,78 +57,109 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# --- CSV File for logging regression data ---
-REGRESSION_DATA_LOG_FILE = "slippage_regression_log.csv"
-# Write header if file doesn't exist or is empty
-if (
-    not os.path.exists(REGRESSION_DATA_LOG_FILE)
-    or os.path.getsize(REGRESSION_DATA_LOG_FILE) == 0
-):
-    with open(REGRESSION_DATA_LOG_FILE, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(
-            [
-                "timestamp_data_collected",
-                "probe_order_size_usd",
-                "market_spread_bps",
-                "market_depth_best_ask_usd",
-                "true_slippage_pct_walk_the_book",
-                "is_model_trained_at_prediction",
-                "user_order_size_usd",
-                "predicted_slippage_pct_regression",
-            ]
-        )
-
-# --- CSV File for logging model performance over training ---
-MODEL_PERFORMANCE_LOG_FILE = "model_performance_log.csv"
-if (
-    not os.path.exists(MODEL_PERFORMANCE_LOG_FILE)
-    or os.path.getsize(MODEL_PERFORMANCE_LOG_FILE) == 0
-):
-    with open(MODEL_PERFORMANCE_LOG_FILE, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(
-            ["training_timestamp", "num_training_samples", "test_mse", "test_r2_score"]
-        )
-
 
 class TradingSimulatorApp(tk.Tk):
-    def __init__(self):
+    _COST_VAR_NAMES = ("fees_var", "slippage_var", "market_impact_var", "net_cost_var")
+    _MODEL_VAR_NAMES = (
+        "reg_mse_var",
+        "reg_r2_var",
+        "reg_samples_var",
+        "reg_bias_var",
+        "reg_bias_by_size_var",
+        "reg_retrains_var",
+        "recalc_var",
+    )
+    # Reset to "N/A" on disconnect
+    _OUTPUT_VAR_NAMES = (
+        (
+            "timestamp_var",
+            "current_best_bid_var",
+            "current_best_ask_var",
+            "current_spread_var",
+            "book_age_var",
+            "exchange_latency_var",
+        )
+        + _COST_VAR_NAMES
+        + (
+            "maker_taker_proportion_var",
+            "calc_latency_var",
+            "ws_processing_latency_var",
+            "ui_update_latency_var",
+            "e2e_latency_var",
+            "feature_extract_latency_var",
+            "probe_schedule_var",
+        )
+        + _MODEL_VAR_NAMES
+    )
+
+    def __init__(self, websocket_url=None, ingest_process=INGEST_PROCESS_ENABLED):
         super().__init__()
         self.title("GoQuant Trade Simulator")
-        self.geometry("850x780")
+        self.geometry("850x1050")
         # Increased height for new latency vars
 
         # --- (Core components: OrderBookManager, WebSocket thread management) ---
 
         self.order_book = OrderBookManager()
+        self.websocket_url = websocket_url  # None: WEBSOCKET_URL (env-overridable)
         self.websocket_thread = None
         self.loop = None
         self.is_connected_with_symbol = False
-
-        # --- Slippage Regression Model ---
-        self.slippage_reg_model = SlippageRegressionModel(
-            min_samples_to_train=1000, test_set_size=0.2
-        )  # Train with more samples (500)
-        self.ticks_since_last_train = 0
-        self.train_interval_ticks = 200  # Retrain every 200 data updates (generating 200 * num_probes data points)
-        self.probe_order_sizes_usd = [
-            1000,
-            5000,
-            10000,
-            50000,
-            100000,
-            500000,
-            1e6,
-        ]  # USD sizes for probing
-
-        # --- (Intermediate calculation result storage) ---
-        self.avg_execution_price = None
-        self.actual_asset_traded = None
-        self.actual_usd_spent_slippage = None  # USD spent during slippage walk
-        self.slippage_percentage_val = None  # Store numeric slippage percentage
-        self.fee_cost_usd_val = None  # Store numeric fee cost
-        self.market_impact_usd_val = None  # Store numeric market impact cost
+        # Feed in a separate process, books via shared memory (see ingest_process.py)
+        if ingest_process and not SEQLOCK_SUPPORTED:
+            logger.warning(
+                f"Ingest process not supported on {platform.machine()} (the shared "
+                f"book needs x86 memory ordering); ingesting in this process."
+            )
+            ingest_process = False
+        self.use_ingest_process = ingest_process
+        self.ingest_process = None
+
+        # --- Tick pipeline: probes, slippage model, retrain policy, cost estimates ---
+        self.pipeline = TickPipeline(self.order_book)
+        # --- Logs (probe/user-prediction/performance rows; disk I/O runs on writer
+        # threads, off the UI path). Format and file names are set in config.py ---
+        self.logs = SimulatorLogs(
+            self.pipeline.feature_extractor.feature_names,
+            self.pipeline.slippage_reg_model.prequential.bucket_labels,
+        )
+        self.pipeline.logs = self.logs
+        # Per-stage latency histograms (L1-L4 plus decode/book update/probes/training)
+        self.latency = LatencyRecorder(snapshot_file=LATENCY_SNAPSHOT_FILE)
+        self.pipeline.latency = self.latency
+        self._latency_rendered_at = 0.0
+        # Raw L2 messages for offline reproduction (off by default)
+        # (recorded by the ingest process instead when it is used)
+        self.feed_recorder = (
+            FeedRecorder() if FEED_RECORD_ENABLED and not ingest_process else None
+        )
+        # Received/applied/skipped feed messages (skipped: superseded while we were busy)
+        self.ingest_stats = IngestStats()
+        # Exchange timestamps: clock offset, exchange-to-arrival latency, book age
+        self.feed_clock = FeedClock(self.latency)
+        # Opt-in cProfile/tracemalloc/GC reports of the ingest, compute and render ticks
+        self.profiling = ProfilingHooks()
+        # Reconnects with backoff; downtime and connect-to-first-book metrics
+        self.supervisor = ConnectionSupervisor()
+
+        # --- Compute worker: runs the pipeline off the Tk thread; Tk only renders ---
+        # Results reach Tk through a latest-wins conflator capped at UI_MAX_FPS renders/s,
+        # so a fast feed can never queue up stale renders on the event loop
+        self.ui_conflator = UpdateConflator(self.after, self._render)
+        self.compute_worker = ComputeWorker(
+            self.pipeline,
+            self.logs,
+            on_result=self.ui_conflator.offer,
+            profiling=self.profiling,
+        )
+        # --- Latency budgets: shed optional work under pressure, restore it after ---
+        self.watchdog = LatencyWatchdog() if WATCHDOG_ENABLED else None
+        if self.watchdog is not None:
+            self._add_degradation_actions(self.watchdog)
+            self.latency.watchdog = self.watchdog
+        self._displayed: Dict[str, str] = {}  # Last text set per output StringVar
+        self.ui_var_sets = 0
+        self.ui_var_sets_skipped = 0  # Unchanged text, not re-set
 
         # --- (Tkinter StringVars for UI inputs) ---
 
@@ -129,7 +183,18 @@ class TradingSimulatorApp(tk.Tk):
             value="N/A"
         )  # UI StringVar set latency
         self.e2e_latency_var = tk.StringVar(value="N/A")  # End-to-End Latency
+        self.feature_extract_latency_var = tk.StringVar(value="N/A")
+        self.probe_schedule_var = tk.StringVar(value="N/A")
+        self.log_queue_var = tk.StringVar(value="N/A")
+        self.recalc_var = tk.StringVar(value="N/A")
+        self.ui_conflation_var = tk.StringVar(value="N/A")
+        self.feed_ingest_var = tk.StringVar(value="N/A")
+        self.connection_var = tk.StringVar(value="N/A")
+        self.degradation_var = tk.StringVar(value="N/A")
+        self.latency_percentiles_var = tk.StringVar(value="N/A")
         self.timestamp_var = tk.StringVar(value="N/A")
+        self.book_age_var = tk.StringVar(value="N/A")
+        self.exchange_latency_var = tk.StringVar(value="N/A")
         self.current_best_bid_var = tk.StringVar(value="N/A")
         self.current_best_ask_var = tk.StringVar(value="N/A")
         self.current_spread_var = tk.StringVar(value="N/A")
@@ -137,12 +202,19 @@ class TradingSimulatorApp(tk.Tk):
         self.reg_mse_var = tk.StringVar(value="N/A")
         self.reg_r2_var = tk.StringVar(value="N/A")
         self.reg_samples_var = tk.StringVar(value="N/A")
+        self.reg_bias_var = tk.StringVar(value="N/A")
+        self.reg_bias_by_size_var = tk.StringVar(value="N/A")
+        self.reg_retrains_var = tk.StringVar(value="N/A")
 
         # --- (UI setup, WebSocket start, Close protocol) ---
 
         self._setup_ui()
         self._start_websocket_connection()
         self.protocol("WM_DELETE_WINDOW", self._on_closing)
+        # Profiling toggle: Ctrl+P in the window, or `kill -USR1 <pid>`
+        self.bind_all("<Control-p>", self.profiling.toggle)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self.profiling.request_toggle)
 
     def _setup_ui(self):
         # ... (UI setup code as before, including traces) ...
@@ -228,6 +300,25 @@ class TradingSimulatorApp(tk.Tk):
         self.fee_tier_var.trace_add("write", self._trigger_recalculation)
         row_num_input += 1
 
+        # --- Latency Percentiles (rolling window, refreshed once per second) ---
+        ttk.Separator(self.input_panel, orient="horizontal").grid(
+            row=row_num_input, column=0, columnspan=2, sticky="ew", pady=5
+        )
+        row_num_input += 1
+        ttk.Label(
+            self.input_panel,
+            text=f"Latency p50/p90/p99/max (ms, last {LATENCY_WINDOW_S:.0f}s):",
+            font=("Arial", 10, "bold"),
+        ).grid(row=row_num_input, column=0, columnspan=2, sticky="w", pady=(5, 2))
+        row_num_input += 1
+        ttk.Label(
+            self.input_panel,
+            textvariable=self.latency_percentiles_var,
+            font="TkFixedFont",
+            justify=tk.LEFT,
+        ).grid(row=row_num_input, column=0, columnspan=2, sticky="w", pady=2)
+        row_num_input += 1
+
         self.input_panel.grid_rowconfigure(row_num_input, weight=1)
 
         # --- Right Panel (Outputs) ---
@@ -253,6 +344,20 @@ class TradingSimulatorApp(tk.Tk):
             row=row_num_output, column=1, sticky="ew", pady=2
         )
         row_num_output += 1
+        ttk.Label(self.output_panel, text="Book Age (ms):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(self.output_panel, textvariable=self.book_age_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
+        ttk.Label(self.output_panel, text="Exch.->Arrival (ms, raw/excess):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(self.output_panel, textvariable=self.exchange_latency_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
 
         ttk.Label(self.output_panel, text="Best Bid:").grid(
             row=row_num_output, column=0, sticky="w", pady=2
@@ -371,6 +476,62 @@ class TradingSimulatorApp(tk.Tk):
             row=row_num_output, column=1, sticky="ew", pady=2
         )
         row_num_output += 1  # NEW E2E latency label
+        ttk.Label(self.output_panel, text="Probe Ticks (run/skip):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(self.output_panel, textvariable=self.probe_schedule_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
+        ttk.Label(self.output_panel, text="Log Queue (depth/dropped):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(self.output_panel, textvariable=self.log_queue_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
+        ttk.Label(self.output_panel, text="Recalcs (run/avoided):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(self.output_panel, textvariable=self.recalc_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
+        ttk.Label(self.output_panel, text="UI Renders (drawn/conflated):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(self.output_panel, textvariable=self.ui_conflation_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
+        ttk.Label(self.output_panel, text="Feed Msgs/s (recv/applied/skipped):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(self.output_panel, textvariable=self.feed_ingest_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
+        ttk.Label(
+            self.output_panel, text="Reconnects / Downtime (s) / 1st Book (ms):"
+        ).grid(row=row_num_output, column=0, sticky="w", pady=2)
+        ttk.Label(self.output_panel, textvariable=self.connection_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
+        ttk.Label(self.output_panel, text="Degraded (level: shed / events):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(self.output_panel, textvariable=self.degradation_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
+        ttk.Label(self.output_panel, text="Feature Extract. (ms):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(
+            self.output_panel, textvariable=self.feature_extract_latency_var
+        ).grid(row=row_num_output, column=1, sticky="ew", pady=2)
+        row_num_output += 1
 
         # --- Regression Model Metrics UI ---
         ttk.Separator(self.output_panel, orient="horizontal").grid(
@@ -388,20 +549,41 @@ class TradingSimulatorApp(tk.Tk):
             row=row_num_output, column=1, sticky="ew", pady=2
         )
         row_num_output += 1
-        ttk.Label(self.output_panel, text="Test MSE:").grid(
+        ttk.Label(self.output_panel, text="Retrains (drift/max/skip):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(self.output_panel, textvariable=self.reg_retrains_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
+        ttk.Label(self.output_panel, text="Prequential MSE:").grid(
             row=row_num_output, column=0, sticky="w", pady=2
         )
         ttk.Label(self.output_panel, textvariable=self.reg_mse_var).grid(
             row=row_num_output, column=1, sticky="ew", pady=2
         )
         row_num_output += 1
-        ttk.Label(self.output_panel, text="Test R2 Score:").grid(
+        ttk.Label(self.output_panel, text="Prequential R2 Score:").grid(
             row=row_num_output, column=0, sticky="w", pady=2
         )
         ttk.Label(self.output_panel, textvariable=self.reg_r2_var).grid(
             row=row_num_output, column=1, sticky="ew", pady=2
         )
         row_num_output += 1
+        ttk.Label(self.output_panel, text="Prequential Bias (%):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(self.output_panel, textvariable=self.reg_bias_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
+        ttk.Label(self.output_panel, text="Bias by Size (%):").grid(
+            row=row_num_output, column=0, sticky="w", pady=2
+        )
+        ttk.Label(self.output_panel, textvariable=self.reg_bias_by_size_var).grid(
+            row=row_num_output, column=1, sticky="ew", pady=2
+        )
+        row_num_output += 1
 
         self.output_panel.grid_rowconfigure(row_num_output, weight=1)
 
@@ -412,607 +594,339 @@ class TradingSimulatorApp(tk.Tk):
         )
         self.status_bar.grid(row=1, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
 
+    def _add_degradation_actions(self, watchdog: LatencyWatchdog):
+        """Optional work the watchdog may shed, cheapest loss of quality first."""
+        pipeline = self.pipeline
+        watchdog.add_action(
+            "probes",
+            partial(
+                setattr, pipeline, "max_probes_per_tick", WATCHDOG_DEGRADED_MAX_PROBES
+            ),
+            partial(setattr, pipeline, "max_probes_per_tick", None),
+        )
+        watchdog.add_action(
+            "retrains",
+            partial(setattr, pipeline, "defer_retrains", True),
+            partial(setattr, pipeline, "defer_retrains", False),
+        )
+        watchdog.add_action(
+            "logging",
+            partial(
+                setattr, self.logs, "sample_every_n", WATCHDOG_DEGRADED_LOG_EVERY_N
+            ),
+            partial(setattr, self.logs, "sample_every_n", 1),
+        )
+        watchdog.add_action(
+            "ui_fps",
+            partial(self.ui_conflator.set_max_fps, WATCHDOG_DEGRADED_UI_FPS),
+            partial(self.ui_conflator.set_max_fps, UI_MAX_FPS),
+        )
+
     def _trigger_recalculation(self, *args):
-        self.after(50, self._recalculate_all_outputs)
+        # The compute worker's RecalcScheduler drops unchanged inputs and coalesces
+        # changes per frame, so inputs are handed over as soon as they are written
+        self._recalculate_all_outputs()
 
     def _recalculate_all_outputs(self):
-        # --- Start Latency Measurement ---
-        calc_start_time = time.perf_counter()  # Start of L2 latency measurement
+        """Validates the order inputs and hands them to the compute worker."""
+        self.compute_worker.set_inputs(self._read_order_inputs())
 
-        # Reset numeric values at the start of each calculation attempt
-        self.slippage_percentage_val = None
-        self.fee_cost_usd_val = None
-        self.market_impact_usd_val = None
-        self.avg_execution_price = None
-        self.actual_asset_traded = None
-        self.actual_usd_spent_slippage = None  # Important to reset this
+    def _read_order_inputs(self) -> OrderInputs:
+        fee_tier_val = self.fee_tier_var.get()
+        asset_symbol_val = self.spot_asset_var.get()  # Fixed var for now
+        try:
+            quantity_usd_val = float(self.quantity_usd_var.get())
+            if quantity_usd_val < 0:  # Allow 0 for no trade scenario
+                raise ValueError
+        except ValueError:
+            return OrderInputs(
+                None, fee_tier_val, None, asset_symbol_val, error="Invalid Qty"
+            )
+        try:
+            volatility_val = float(self.volatility_var.get())
+            if volatility_val < 0:
+                raise ValueError
+        except ValueError:
+            return OrderInputs(
+                quantity_usd_val,
+                fee_tier_val,
+                None,
+                asset_symbol_val,
+                error="Invalid Vol",
+            )
+        return OrderInputs(
+            quantity_usd_val, fee_tier_val, volatility_val, asset_symbol_val
+        )
 
-        current_calc_latency = "N/A"  # Default latency display
-        predicted_slippage_pct_for_log = None  # For CSV logging
+    def _set_var(self, name: str, text: str):
+        """Sets an output StringVar only if its text changed (every set redraws its label)."""
+        if self._displayed.get(name) == text:
+            self.ui_var_sets_skipped += 1
+            return
+        self._displayed[name] = text
+        getattr(self, name).set(text)
+        self.ui_var_sets += 1
+
+    @staticmethod
+    def _format_result(result: ComputeResult) -> Dict[str, str]:
+        """Display text per output StringVar name for one compute result."""
+        display = {"timestamp_var": result.book_timestamp}
+        display["book_age_var"] = (
+            f"{result.book_age_ms:.0f}{' (STALE)' if result.book_stale else ''}"
+            if result.book_age_ms is not None
+            else "N/A"
+        )
+        best_bid, best_ask = result.best_bid, result.best_ask
+        display["current_best_bid_var"] = (
+            f"{best_bid[0]:.2f} ({best_bid[1]:.2f})" if best_bid else "N/A"
+        )
+        display["current_best_ask_var"] = (
+            f"{best_ask[0]:.2f} ({best_ask[1]:.2f})" if best_ask else "N/A"
+        )
+        display["current_spread_var"] = (
+            f"{result.spread:.2f}" if result.spread is not None else "N/A"
+        )
+        if result.tick is not None:
+            display["feature_extract_latency_var"] = (
+                f"{result.tick.extraction_ms:.3f}"
+                if result.tick.extraction_ms is not None
+                else "N/A"
+            )
 
-        try:
-            # 1. Read Input: Quantity USD
-            try:
-                quantity_usd_val = float(self.quantity_usd_var.get())
-                if quantity_usd_val < 0:  # Allow 0 for no trade scenario
-                    raise ValueError
-            except ValueError:
-                for var in [
-                    self.fees_var,
-                    self.slippage_var,
-                    self.market_impact_var,
-                    self.net_cost_var,
-                ]:
-                    var.set("Invalid Qty")
-                self.avg_execution_price = None  #
-                self.actual_asset_traded = None  #
-                self.actual_usd_spent_slippage = None  #
-                return
-
-            # 2. Read Input: Fee Tier
-            fee_tier_val = self.fee_tier_var.get()
-
-            # 3. Read Input: Volatility
-            try:
-                volatility_val = float(self.volatility_var.get())
-                if volatility_val < 0:
-                    raise ValueError
-            except ValueError:
-                self.market_impact_var.set("Invalid Vol")
-                self.net_cost_var.set("Invalid Vol")
-                return
-
-            # 4. Read Input: Asset Symbol (from fixed var for now)
-            asset_symbol_val = self.spot_asset_var.get()
-
-            #     # --- Calculate Slippage (Walk the Book) ---
-            #     # Requires live order book data, so self.order_book must be up-to-date
-            #     slippage_cost_usd = 0.0 # Default to 0 if not calculable
-            #     if not self.order_book.asks or not self.order_book.bids: # Check if book has data
-            #         self.slippage_var.set("No book data")
-            #         self.avg_execution_price = None #
-            #         self.actual_asset_traded = None #
-            #         self.actual_usd_spent_slippage = None #
-            #     else:
-            #         slp_pct, avg_exec_p, asset_acq, usd_spent = calculate_slippage_walk_book(
-            #             quantity_usd_val, self.order_book
-            #         )
-            #         # Store these values for other calculations (e.g. market impact)
-            #         self.avg_execution_price = avg_exec_p
-            #         self.actual_asset_traded = asset_acq
-            #         self.actual_usd_spent_slippage = usd_spent
-
-            #         if slp_pct is not None:
-            #             self.slippage_percentage_val = slp_pct # Store numeric value
-            #             self.slippage_var.set(f"{slp_pct:.4f}%")
-            #             # Calculate slippage cost in USD.
-            #             # Slippage cost is the difference between what you actually paid (usd_spent)
-            #             # and what you would have paid at the mid-price for the asset_acquired.
-            #             # mid_price_snapshot used inside calculate_slippage_walk_book for asset_acquired:
-            #             if self.order_book.get_best_ask() and self.order_book.get_best_bid():
-            #                 mid_price = (self.order_book.get_best_ask()[0] + self.order_book.get_best_bid()[0]) / 2
-            #                 if asset_acq > 0 : # if any asset was acquired
-            #                     slippage_cost_usd = usd_spent - asset_acq * mid_price
-            #                 # If slp_pct is positive (paid more), slippage_cost_usd will be positive.
-            #             # Alternative simpler slippage cost based on target USD, but less accurate if fill is partial:
-            #             # slippage_cost_usd = (slp_pct / 100.0) * quantity_usd_val
-
-            #         else:
-            #             if quantity_usd_val > 0 and asset_acq == 0 : # Tried to buy but got nothing
-            #                  self.slippage_var.set("Depth Exceeded?")
-            #             elif quantity_usd_val == 0:
-            #                  self.slippage_var.set("0.0000%") # No slippage for no trade
-            #             else: # Other error cases from slippage function
-            #                  self.slippage_var.set("Error/No Trade")
-            #         logger.debug(f"Slippage: {slp_pct}%, AvgPrice: {avg_exec_p}, Asset: {asset_acq}, Spent: {usd_spent}")
-
-            #     # --- Calculate Expected Fees ---
-            #     # Fees should ideally be based on the actual USD spent if slippage is significant
-            #     # or if the order couldn't be fully filled for target_usd_val.
-            #     # For now, let's use target quantity_usd_val for simplicity as per problem statement.
-            #     # Or, use self.actual_usd_spent_slippage if available.
-            #     # Let's use quantity_usd_val as it's the "target".
-            #     calculated_fees = calculate_expected_fees(quantity_usd_val, fee_tier_val)
-            #     self.fees_var.set(f"{calculated_fees:.4f}")
-            #     self.fee_cost_usd_val = calculated_fees
-
-            #     # --- Calculate Market Impact Cost ---
-            #     # Use actual USD spent from slippage calculation if available and valid, else target quantity
-            #     # For simplicity, assignment implies using the input "Quantity (~100 USD equivalent)"
-            #     # Let's use quantity_usd_val (target order size) for market impact calculation as well.
-            #     market_impact_usd = calculate_market_impact_cost(quantity_usd_val, volatility_val, asset_symbol_val)
-            #     if market_impact_usd is not None:
-            #         self.market_impact_var.set(f"{market_impact_usd:.4f}")
-            #     else:
-            #         self.market_impact_var.set("Error")
-            #     self.market_impact_usd_val = market_impact_usd
-
-            #     # --- Calculate Net Cost ---
-            #     if self.fee_cost_usd_val is not None and \
-            #        self.market_impact_usd_val is not None and \
-            #        self.slippage_percentage_val is not None: # Check if all components are valid
-
-            #         # If quantity_usd_val is 0, all costs should be 0
-            #         if quantity_usd_val == 0:
-            #             net_total_cost_usd = 0.0
-            #             slippage_cost_usd = 0.0 # Ensure this is zero for zero quantity
-            #         else:
-            #             net_total_cost_usd = slippage_cost_usd + self.fee_cost_usd_val + self.market_impact_usd_val
-
-            #         self.net_cost_var.set(f"{net_total_cost_usd:.4f}")
-            #     else:
-            #         self.net_cost_var.set("Error")
-
-            #     # --- Maker/Taker Proportion ---
-            #     if quantity_usd_val == 0:
-            #          self.maker_taker_proportion_var.set("N/A (No Trade)")
-            #     else:
-            #          self.maker_taker_proportion_var.set("100% Taker")
-
-            #     # --- End Latency Measurement & Update UI ---
-            #     calc_end_time = time.perf_counter()
-            #     processing_time_ms = (calc_end_time - calc_start_time) * 1000
-            #     current_calc_latency = f"{processing_time_ms:.3f}" # Store as string for UI
-            #     logger.debug(f"Internal processing latency: {processing_time_ms:.3f} ms")
-
-            # except Exception as e:
-            #     logger.error(f"Error during recalculation: {e}", exc_info=True)
-            #     self.fees_var.set("Error")
-            #     self.slippage_var.set("Error")
-            #     self.market_impact_var.set("Error")
-            #     self.net_cost_var.set("Error")
-            #     self.maker_taker_proportion_var.set("Error")
-            #     self.slippage_var.set("Error")
-            # finally:
-            #     # This ensures latency is updated even if an error occurred mid-calculation,
-            #     # showing the time taken up to the error point or full calculation.
-            #     self.calc_latency_var.set(current_calc_latency)
-
-            # --- Calculate Slippage (INTEGRATING REGRESSION) ---
-            slippage_cost_usd = 0.0
-
-            # A. Using Regression Model (Primary for UI display)
-            if (
-                self.slippage_reg_model.is_trained
-                and self.order_book.get_best_ask()
-                and self.order_book.get_best_bid()
+        estimate = result.estimate
+        if result.error == "Error":
+            for name in TradingSimulatorApp._COST_VAR_NAMES + (
+                "maker_taker_proportion_var",
             ):
-                best_ask_price, best_ask_qty = self.order_book.get_best_ask()
-                best_bid_price, _ = self.order_book.get_best_bid()
-
-                spread_val = best_ask_price - best_bid_price
-                mid_price_for_bps = (best_ask_price + best_bid_price) / 2
-                spread_bps = (
-                    (spread_val / mid_price_for_bps) * 10000
-                    if mid_price_for_bps > 0
-                    else 0
-                )
-
-                depth_best_ask_usd = best_ask_price * best_ask_qty
+                display[name] = "Error"
+            for name in TradingSimulatorApp._MODEL_VAR_NAMES:
+                display[name] = "Error"
+        elif result.error == "Stale Book":
+            for name in TradingSimulatorApp._COST_VAR_NAMES + (
+                "maker_taker_proportion_var",
+            ):
+                display[name] = "Stale Book"
+        elif result.error == "Invalid Qty":
+            for name in TradingSimulatorApp._COST_VAR_NAMES:
+                display[name] = "Invalid Qty"
+        elif result.error == "Invalid Vol":
+            display["market_impact_var"] = "Invalid Vol"
+            display["net_cost_var"] = "Invalid Vol"
+        elif estimate is not None:
+            # --- Slippage (regression model), fees, market impact, net cost ---
+            if estimate.slippage_source == "regression":
+                display["slippage_var"] = f"{estimate.slippage_pct:.4f}% (Reg)"
+            elif estimate.slippage_source == "regression_error":
+                display["slippage_var"] = "Reg Pred Err"
+            elif estimate.slippage_source == "zero":
+                display["slippage_var"] = "0.0000%"
+            else:  # Model not trained or book data missing for features
+                display["slippage_var"] = "N/A (Model Pending)"
+            display["fees_var"] = f"{estimate.fees_usd:.4f}"
+            display["market_impact_var"] = (
+                f"{estimate.market_impact_usd:.4f}"
+                if estimate.market_impact_usd is not None
+                else "Error"
+            )
+            display["net_cost_var"] = (
+                f"{estimate.net_cost_usd:.4f}"
+                if estimate.net_cost_usd is not None
+                else "Waiting..."  # More informative than "Error" if components are pending
+            )
+            display["maker_taker_proportion_var"] = estimate.maker_taker
+        # L2: internal processing latency of the cost estimate
+        display["calc_latency_var"] = (
+            f"{result.estimate_ms:.3f}" if result.estimate_ms is not None else "N/A"
+        )
 
-                features_for_prediction = [
-                    quantity_usd_val,
-                    spread_bps,
-                    depth_best_ask_usd,
-                ]
-                predicted_slippage_pct = self.slippage_reg_model.predict(
-                    features_for_prediction
+        # --- Regression metrics, probe schedule, log queue ---
+        model = result.model
+        if model is not None:
+            display["reg_samples_var"] = f"{model.training_samples:.0f}"
+            display["reg_mse_var"] = (
+                f"{model.mse:.3e}" if model.mse is not None else "N/A"
+            )  # e.g., 1.234e-08
+            display["reg_r2_var"] = f"{model.r2:.4f}" if model.r2 is not None else "N/A"
+            display["reg_bias_var"] = (
+                f"{model.bias:+.3e}" if model.bias is not None else "N/A"
+            )
+            display["reg_bias_by_size_var"] = (
+                "  ".join(
+                    f"{label}: {bias:+.1e}"
+                    for label, bias in model.bias_by_size
+                    if bias is not None
                 )
-                predicted_slippage_pct_for_log = predicted_slippage_pct  # For CSV
-
-                if predicted_slippage_pct is not None:
-                    # --- Cap negative slippage prediction for BUY orders at 0 ---
-                    effective_predicted_slippage_pct = max(0.0, predicted_slippage_pct)
-                    self.slippage_var.set(
-                        f"{effective_predicted_slippage_pct:.4f}% (Reg)"
-                    )
-                    self.slippage_percentage_val = (
-                        effective_predicted_slippage_pct  # Store this for net cost
-                    )
-                    # For net cost, we need slippage_cost_usd based on this percentage
-                    slippage_cost_usd = (
-                        effective_predicted_slippage_pct / 100.0
-                    ) * quantity_usd_val
-                else:
-                    self.slippage_var.set("Reg Pred Err")
-            elif quantity_usd_val == 0:
-                self.slippage_var.set("0.0000%")
-                self.slippage_percentage_val = 0.0
-            else:  # Fallback if model not trained or book data missing for features
-                self.slippage_var.set("N/A (Model Pending)")
-                # Could fall back to walk-the-book for self.slippage_percentage_val if needed for net cost
-                # For now, net cost will show error if regression isn't ready.
-
-            # B. Walk-the-book (Internal reference, or fallback if strict)
-            # We still need its outputs (actual_usd_spent, asset_acquired) for accurate fee/impact on executed value
-            if self.order_book.asks and self.order_book.bids:
-                (
-                    _,
-                    self.avg_execution_price,
-                    self.actual_asset_traded,
-                    self.actual_usd_spent_slippage,
-                ) = calculate_slippage_walk_book(quantity_usd_val, self.order_book)
-
-            # --- Calculate Expected Fees ---
-            # Use actual_usd_spent_slippage if available and valid for more accuracy, else target quantity_usd_val
-            fee_calc_base_usd = (
-                self.actual_usd_spent_slippage
-                if self.actual_usd_spent_slippage is not None
-                and self.actual_usd_spent_slippage > 0
-                else quantity_usd_val
+                or "N/A"
             )
-            self.fee_cost_usd_val = calculate_expected_fees(
-                fee_calc_base_usd, fee_tier_val
+            display["reg_retrains_var"] = (
+                f"{model.retrains_on_drift} / {model.retrains_on_max_interval} / "
+                f"{model.retrains_skipped}"
             )
-            self.fees_var.set(f"{self.fee_cost_usd_val:.4f}")
-
-            # --- Calculate Market Impact Cost ---
-            # Use actual_usd_spent_slippage if available and valid, else target quantity_usd_val
-            impact_calc_base_usd = (
-                self.actual_usd_spent_slippage
-                if self.actual_usd_spent_slippage is not None
-                and self.actual_usd_spent_slippage > 0
-                else quantity_usd_val
+            display["probe_schedule_var"] = (
+                f"{model.probe_ticks_used} / {model.probe_ticks_skipped}"
+                f" (vol {model.volatility_bps:.2f} bps)"
             )
-            self.market_impact_usd_val = calculate_market_impact_cost(
-                impact_calc_base_usd, volatility_val, asset_symbol_val
+            display["log_queue_var"] = (
+                f"{model.log_queue_depth} / {model.log_rows_dropped}"
             )
-            if self.market_impact_usd_val is not None:
-                self.market_impact_var.set(f"{self.market_impact_usd_val:.4f}")
-            else:
-                self.market_impact_var.set("Error")
-
-            # --- Calculate Net Cost ---
-            # Uses slippage_cost_usd derived from the regression model's percentage
-            if (
-                self.fee_cost_usd_val is not None
-                and self.market_impact_usd_val is not None
-                and self.slippage_percentage_val is not None
-            ):
-                net_total_cost_usd = (
-                    (
-                        slippage_cost_usd
-                        + self.fee_cost_usd_val
-                        + self.market_impact_usd_val
-                    )
-                    if quantity_usd_val > 0
-                    else 0.0
-                )
-                self.net_cost_var.set(f"{net_total_cost_usd:.4f}")
-            else:
-                self.net_cost_var.set(
-                    "Waiting..."
-                )  # More informative than "Error" if components are pending
-
-            # --- Maker/Taker Proportion ---
-            self.maker_taker_proportion_var.set(
-                "N/A (No Trade)" if quantity_usd_val == 0 else "100% Taker"
+            display["recalc_var"] = (
+                f"{model.recomputes} / {model.recomputations_avoided}"
             )
+        return display
 
-            # --- Update Regression Metrics UI ---
-            metrics = self.slippage_reg_model.get_metrics()
-            self.reg_samples_var.set(f"{metrics.get('training_samples', 0.0):.0f}")
-            # --- MSE Display format ---
-            self.reg_mse_var.set(
-                f"{metrics.get('mse', float('nan')):.3e}"
-                if metrics.get("mse") is not None
-                else "N/A"
-            )  # e.g., 1.234e-08
-            self.reg_r2_var.set(
-                f"{metrics.get('r2', float('nan')):.4f}"
-                if metrics.get("r2") is not None
+    def _render(self, result: ComputeResult):
+        if self.profiling.enabled:
+            self.profiling.run("render", self._render_result, result)
+        else:
+            self._render_result(result)
+
+    def _render_result(self, result: ComputeResult):
+        """Renders the newest compute result (runs on the Tk thread, via the conflator)."""
+        # --- START: UI Update Latency (L3) Measurement ---
+        ui_update_start_time = time.perf_counter()
+
+        if not self.is_connected_with_symbol and result.symbol:
+            self.status_bar_text.set(
+                f"Status: Connected to WebSocket ({result.symbol})"
+            )
+            self.is_connected_with_symbol = True
+        for name, text in self._format_result(result).items():
+            self._set_var(name, text)
+
+        # --- END: UI Update Latency (L3) Measurement ---
+        ui_update_end_time = time.perf_counter()
+        ui_update_latency_ms = (ui_update_end_time - ui_update_start_time) * 1000
+        self._set_var("ui_update_latency_var", f"{ui_update_latency_ms:.3f}")
+        self._set_var(
+            "ui_conflation_var",
+            f"{self.ui_conflator.rendered} / {self.ui_conflator.conflated}",
+        )
+        if self.watchdog is not None:
+            self._set_var(
+                "degradation_var",
+                f"{self.watchdog.level}: {', '.join(self.watchdog.shed) or 'none'} / "
+                f"{self.watchdog.degradations + self.watchdog.restorations}",
+            )
+        feed_stats = self._feed_stats()
+        ingest = feed_stats["ingest"]
+        self._set_var(
+            "feed_ingest_var",
+            f"{ingest['received_per_s']:.0f} / {ingest['applied_per_s']:.0f} / "
+            f"{ingest['skipped_per_s']:.0f}",
+        )
+        connection = feed_stats["connection"]
+        self._set_var(
+            "connection_var",
+            f"{connection['disconnects']} / {connection['total_downtime_s']:.1f} / "
+            + (
+                f"{connection['last_first_book_ms']:.0f}"
+                if connection["last_first_book_ms"] is not None
                 else "N/A"
+            ),
+        )
+        feed_clock = feed_stats["feed_clock"]
+        if feed_clock["last_raw_ms"] is not None:
+            self._set_var(
+                "exchange_latency_var",
+                f"{feed_clock['last_raw_ms']:.1f} / {feed_clock['last_excess_ms']:.1f}",
             )
 
-            calc_end_time = time.perf_counter()
-            processing_time_ms = (calc_end_time - calc_start_time) * 1000
-            current_calc_latency = f"{processing_time_ms:.3f}"  # This is L2.
-
-            # --- Log data for user's current prediction to CSV ---
-            # This logs the features for the user's actual order and the model's prediction for it.
-            # It does NOT log the probe data here, that's implicit in the model's training data.
-            if (
-                self.slippage_reg_model.is_trained and self.order_book.get_best_ask()
-            ):  # Check if features are available
-                # Re-extract features for user's current order size for logging consistency
-                best_ask_price_log, best_ask_qty_log = self.order_book.get_best_ask()
-                best_bid_price_log, _ = (
-                    self.order_book.get_best_bid()
-                    if self.order_book.get_best_bid()
-                    else (0, 0)
-                )
-                spread_val_log = best_ask_price_log - best_bid_price_log
-                mid_price_for_bps_log = (best_ask_price_log + best_bid_price_log) / 2
-                spread_bps_log = (
-                    (spread_val_log / mid_price_for_bps_log) * 10000
-                    if mid_price_for_bps_log > 0
-                    else 0
-                )
-                depth_best_ask_usd_log = best_ask_price_log * best_ask_qty_log
-
-                with open(REGRESSION_DATA_LOG_FILE, "a", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow(
-                        [
-                            time.strftime(
-                                "%Y-%m-%dT%H:%M:%S"
-                            ),  # timestamp_data_collected (approximate)
-                            None,  # probe_order_size_usd (N/A for user prediction row)
-                            None,  # market_spread_bps (N/A for user prediction row - features for probes are not re-logged here)
-                            None,  # market_depth_best_ask_usd (N/A for user prediction row)
-                            None,  # true_slippage_pct_walk_the_book (N/A for user prediction row)
-                            self.slippage_reg_model.is_trained,
-                            quantity_usd_val,  # user_order_size_usd
-                            predicted_slippage_pct_for_log,  # predicted_slippage_pct_regression for user's order
-                        ]
-                    )
+        if result.arrival_perf is not None:
+            # L1: message arrival to compute start; L4: arrival to rendered
+            self._set_var("ws_processing_latency_var", f"{result.queue_wait_ms:.3f}")
+            e2e_latency_ms = (ui_update_end_time - result.arrival_perf) * 1000
+            self._set_var("e2e_latency_var", f"{e2e_latency_ms:.3f}")
+            self.latency.record("end_to_end", e2e_latency_ms)
+        self.latency.record("ui_update", ui_update_latency_ms)
+        if ui_update_end_time - self._latency_rendered_at >= 1.0:
+            self._latency_rendered_at = ui_update_end_time
+            self._set_var("latency_percentiles_var", self._format_latencies())
+
+    def _feed_stats(self) -> Dict[str, Dict]:
+        """Ingest, connection and feed clock counters, from wherever the feed runs."""
+        if self.ingest_process is not None:
+            return self.ingest_process.feed_stats
+        return {
+            "ingest": self.ingest_stats.get_stats(),
+            "connection": self.supervisor.get_stats(),
+            "feed_clock": self.feed_clock.get_stats(),
+        }
+
+    def _format_latencies(self) -> str:
+        summaries = self.latency.summaries()
+        if self.ingest_process is not None:
+            # The feed stages are measured in the ingest process
+            remote = self.ingest_process.feed_stats["latency"]
+            summaries.update(
+                (stage, remote[stage]) for stage in INGEST_STAGES if stage in remote
+            )
+        return "\n".join(
+            f"{stage:<11} {format_summary(summary)}"
+            for stage, summary in summaries.items()
+        )
 
-        except Exception as e:
-            logger.error(
-                f"Error during recalculation: {e}", exc_info=True
-            )  # error handling
-            for var in [
-                self.fees_var,
-                self.slippage_var,
-                self.market_impact_var,
-                self.net_cost_var,
-                self.maker_taker_proportion_var,
-                self.reg_mse_var,
-                self.reg_r2_var,
-                self.reg_samples_var,
-            ]:
-                var.set("Error")
-        finally:
-            self.calc_latency_var.set(
-                current_calc_latency
-            )  # Update calculation latency UI
+    def _poll_profiling_toggle(self):
+        """Applies a SIGUSR1 toggle request outside the signal handler, then reschedules."""
+        self.profiling.apply_requested_toggle()
+        self.after(int(PROFILE_SIGNAL_POLL_S * 1000), self._poll_profiling_toggle)
 
-    # --- _update_ui_from_websocket method ---
-    def _update_ui_from_websocket(self, book_manager, status_and_timestamps):
-        # Unpack status and timestamps (ws_msg_arrival_time is from websockets_handler)
-        if isinstance(status_and_timestamps, tuple):
-            status, ws_msg_arrival_time = status_and_timestamps
-            # Set WS processing latency (L1) as soon as received
-            if ws_msg_arrival_time is not None:
-                ws_proc_latency_ms = (time.perf_counter() - ws_msg_arrival_time) * 1000
-                self.ws_processing_latency_var.set(f"{ws_proc_latency_ms:.3f}")
-            else:
-                self.ws_processing_latency_var.set("N/A")
-        else:  # Fallback for older calls or if latency not passed
-            status = status_and_timestamps
-            self.ws_processing_latency_var.set("N/A")
+    def _dump_latency_snapshot(self):
+        """Appends the histograms to LATENCY_SNAPSHOT_FILE, then reschedules itself."""
+        self.latency.dump_snapshot()
+        self.after(int(LATENCY_SNAPSHOT_INTERVAL_S * 1000), self._dump_latency_snapshot)
 
+    # --- _update_ui_from_websocket method (connection status; book data goes to the compute worker) ---
+    def _update_ui_from_websocket(self, book_manager, status_and_timestamps):
+        status, _ = status_and_timestamps
         if status == "connected":
             self.status_bar_text.set(
                 f"Status: Connected to WebSocket. Waiting for data..."
             )
             logger.info("UI updated: Connected")
-            self.after(100, self._trigger_recalculation)
-        elif status == "data_update":
-            # --- START: UI Update Latency (L3) Measurement ---
-            ui_update_start_time = time.perf_counter()
-
-            if not self.is_connected_with_symbol and book_manager.symbol:
-                self.status_bar_text.set(
-                    f"Status: Connected to WebSocket ({book_manager.symbol})"
-                )
-                self.is_connected_with_symbol = True
-            self.timestamp_var.set(book_manager.timestamp)
-            best_bid = book_manager.get_best_bid()
-            self.current_best_bid_var.set(
-                f"{best_bid[0]:.2f} ({best_bid[1]:.2f})" if best_bid else "N/A"
-            )
-            best_ask = book_manager.get_best_ask()
-            self.current_best_ask_var.set(
-                f"{best_ask[0]:.2f} ({best_ask[1]:.2f})" if best_ask else "N/A"
+        elif status == "data_error":
+            self._set_var("ws_processing_latency_var", "N/A")
+        elif status in ("disconnected_error", "disconnected_clean"):
+            # Keep showing the last book (the worker flags it stale) through short
+            # outages; the outputs are cleared only if the feed stays down
+            self.status_bar_text.set(
+                "Status: WebSocket Disconnected"
+                f"{' (Error)' if status == 'disconnected_error' else ''}. "
+                "Showing last book; reconnecting..."
             )
-            spread_val = book_manager.get_spread()
-            self.current_spread_var.set(
-                f"{spread_val:.2f}" if spread_val is not None else "N/A"
+            self.is_connected_with_symbol = False
+            self.after(int(RECONNECT_KEEP_BOOK_S * 1000), self._clear_outputs_if_down)
+            logger.warning(f"UI updated: {status}")
+        elif status == "reconnecting":
+            connection = self._feed_stats()["connection"]
+            delay = connection["next_attempt_in_s"] or 0.0
+            self.status_bar_text.set(
+                f"Status: Feed down. Reconnecting in {delay:.1f}s "
+                f"(attempt {connection['attempts'] + 1})..."
             )
 
-            # --- Data Collection for Regression & Periodic Training ---
-            if best_ask and best_bid:  # Ensure we have basic book data
-
-                # --- RIGOROUS CHECK FOR CROSSED BOOK ---
-                # Recalculate best_ask_price and best_bid_price directly from book_manager for this check
-                # to avoid using potentially stale `best_ask` or `best_bid` from above if updates are rapid.
-                current_ba_tuple = book_manager.get_best_ask()
-                current_bb_tuple = book_manager.get_best_bid()
-
-                if (
-                    current_ba_tuple
-                    and current_bb_tuple
-                    and current_ba_tuple[0] > current_bb_tuple[0]
-                ):
-                    # Book is NOT crossed, proceed with probe data generation
-                    current_best_ask_price, current_best_ask_qty = current_ba_tuple
-                    current_best_bid_price, _ = current_bb_tuple
-
-                    current_spread_value = (
-                        current_best_ask_price - current_best_bid_price
-                    )
-                    mid_price_for_bps_calc = (
-                        current_best_ask_price + current_best_bid_price
-                    ) / 2
-                    current_spread_bps = (
-                        (current_spread_value / mid_price_for_bps_calc) * 10000
-                        if mid_price_for_bps_calc > 0
-                        else 0
-                    )
-                    current_depth_best_ask_usd = (
-                        current_best_ask_price * current_best_ask_qty
-                    )
-
-                    # Additional check: Ensure spread_bps is not negative due to float issues if very close
-                    if current_spread_bps < 0:
-                        logger.warning(
-                            f"Calculated negative spread_bps ({current_spread_bps:.4f}) even after checking ask > bid. Ask: {current_best_ask_price}, Bid: {current_best_bid_price}. Skipping probes."
-                        )
-                    else:
-                        for probe_size_usd in self.probe_order_sizes_usd:
-                            probe_slippage_pct, _, _, _ = calculate_slippage_walk_book(
-                                probe_size_usd, book_manager
-                            )  # book_manager is up-to-date
-                            if probe_slippage_pct is not None:
-                                features = [
-                                    float(probe_size_usd),
-                                    float(current_spread_bps),
-                                    float(current_depth_best_ask_usd),
-                                ]
-                                self.slippage_reg_model.add_data_point(
-                                    features, probe_slippage_pct
-                                )
-
-                                # Log probe data to CSV
-                                with open(
-                                    REGRESSION_DATA_LOG_FILE, "a", newline=""
-                                ) as f:
-                                    writer = csv.writer(f)
-                                    writer.writerow(
-                                        [
-                                            time.strftime("%Y-%m-%dT%H:%M:%S"),
-                                            probe_size_usd,
-                                            current_spread_bps,
-                                            current_depth_best_ask_usd,
-                                            probe_slippage_pct,
-                                            None,
-                                            None,
-                                            None,
-                                        ]
-                                    )
-
-                        self.ticks_since_last_train += 1
-                        total_data_points = len(
-                            self.slippage_reg_model.data_X
-                        )  # Get current total data points
-
-                        # Check conditions for training
-                        # Condition 1: Model is not yet trained AND we have enough samples for the first train
-                        ready_for_initial_train = (
-                            not self.slippage_reg_model.is_trained
-                        ) and (
-                            total_data_points
-                            >= self.slippage_reg_model.min_samples_to_train
-                        )
-
-                        # Condition 2: Model is already trained AND enough new ticks have passed for a retrain
-                        # Retrain interval should be based on number of data points generated, not just ticks if num_probes varies
-                        # For simplicity, let's stick to ticks_since_last_train for now.
-                        # The number of actual data points added since last train is ticks_since_last_train * len(self.probe_order_sizes_usd)
-                        samples_since_last_train = self.ticks_since_last_train * (
-                            len(self.probe_order_sizes_usd)
-                            if len(self.probe_order_sizes_usd) > 0
-                            else 1
-                        )
-
-                        # Let's use self.train_interval_ticks directly as the number of *WebSocket updates* between retrains
-                        time_for_retrain = self.slippage_reg_model.is_trained and (
-                            self.ticks_since_last_train >= self.train_interval_ticks
-                        )
-
-                        if ready_for_initial_train or time_for_retrain:
-                            logger.info(
-                                f"Attempting to train model. Initial: {ready_for_initial_train}, Retrain: {time_for_retrain}, Total data: {total_data_points}"
-                            )
-                            if self.slippage_reg_model.train():
-                                logger.info(
-                                    f"Model (re)trained successfully with {self.slippage_reg_model.training_samples_count} samples. Updating metrics."
-                                )
-                                # --- Log model performance to separate CSV ---
-                                metrics = self.slippage_reg_model.get_metrics()
-                                with open(
-                                    MODEL_PERFORMANCE_LOG_FILE, "a", newline=""
-                                ) as f:
-                                    writer = csv.writer(f)
-                                    writer.writerow(
-                                        [
-                                            time.strftime("%Y-%m-%dT%H:%M:%S"),
-                                            metrics.get("training_samples", 0),
-                                            metrics.get("mse", float("nan")),
-                                            metrics.get("r2", float("nan")),
-                                        ]
-                                    )
-                            else:
-                                logger.warning(
-                                    f"Model training attempt failed or not enough data for split. Total data points: {total_data_points}"
-                                )
-                            self.ticks_since_last_train = (
-                                0  # Reset counter after attempting to train
-                            )
-                else:
-                    crossed_ask = current_ba_tuple[0] if current_ba_tuple else "N/A"
-                    crossed_bid = current_bb_tuple[0] if current_bb_tuple else "N/A"
-                    logger.warning(
-                        f"Book crossed or incomplete: Best Ask {crossed_ask} / Best Bid {crossed_bid}. Skipping probe data generation for this tick."
-                    )
-            # This call will update self.calc_latency_var (L2)
-            self._recalculate_all_outputs()  # This will use the latest model state
-
-            # --- END: UI Update Latency (L3) Measurement ---
-            ui_update_end_time = time.perf_counter()
-            ui_update_latency_ms = (ui_update_end_time - ui_update_start_time) * 1000
-            self.ui_update_latency_var.set(f"{ui_update_latency_ms:.3f}")
-
-            # --- Calculate End-to-End Latency (L4) ---
-            if ws_msg_arrival_time is not None:
-                e2e_latency_ms = (ui_update_end_time - ws_msg_arrival_time) * 1000
-                self.e2e_latency_var.set(f"{e2e_latency_ms:.3f}")
-            else:
-                self.e2e_latency_var.set("N/A")
-
-        elif status == "disconnected_error":
-            self.status_bar_text.set("Status: WebSocket Disconnected (Error).")
-            self.is_connected_with_symbol = False
-            for var in [
-                self.timestamp_var,
-                self.current_best_bid_var,
-                self.current_best_ask_var,
-                self.current_spread_var,
-                self.fees_var,
-                self.slippage_var,
-                self.market_impact_var,
-                self.net_cost_var,
-                self.maker_taker_proportion_var,
-                self.calc_latency_var,
-                self.ws_processing_latency_var,
-                self.ui_update_latency_var,
-                self.e2e_latency_var,
-                self.reg_mse_var,
-                self.reg_r2_var,
-                self.reg_samples_var,
-            ]:
-                var.set("N/A")
-            logger.warning("UI updated: Disconnected (Error)")
-        elif status == "disconnected_clean":
-            self.status_bar_text.set("Status: WebSocket Disconnected.")
-            self.is_connected_with_symbol = False
-            for var in [
-                self.timestamp_var,
-                self.current_best_bid_var,
-                self.current_best_ask_var,
-                self.current_spread_var,
-                self.fees_var,
-                self.slippage_var,
-                self.market_impact_var,
-                self.net_cost_var,
-                self.maker_taker_proportion_var,
-                self.calc_latency_var,
-                self.ws_processing_latency_var,
-                self.ui_update_latency_var,
-                self.e2e_latency_var,
-                self.reg_mse_var,
-                self.reg_r2_var,
-                self.reg_samples_var,
-            ]:
-                var.set("N/A")
-            logger.info("UI updated: Disconnected (Cleanly)")
+    def _clear_outputs_if_down(self):
+        outage_s = self._feed_stats()["connection"]["current_outage_s"]
+        if outage_s is not None and outage_s >= RECONNECT_KEEP_BOOK_S:
+            for name in self._OUTPUT_VAR_NAMES:
+                self._set_var(name, "N/A")
+            logger.warning(f"Feed down for {outage_s:.0f}s; cleared the outputs.")
 
     # --- WebSocket and Shutdown methods remain the same ---
     def _start_websocket_connection(self):
         # ...
         self.status_bar_text.set("Status: Connecting to WebSocket...")
         self.is_connected_with_symbol = False
+        if self.use_ingest_process:
+            # Shared-memory books are read-only copies: straight to the compute worker
+            self.ingest_process = IngestProcess(
+                self.compute_worker.submit_book,
+                lambda status: self.after(
+                    0, self._update_ui_from_websocket, None, (status, None)
+                ),
+                url=self.websocket_url,
+            )
+            self.ingest_process.start()
+            return
         self.loop = asyncio.new_event_loop()
 
         self.websocket_thread = threading.Thread(
@@ -1026,7 +940,17 @@ class TradingSimulatorApp(tk.Tk):
         asyncio.set_event_loop(loop)
         try:
             loop.run_until_complete(
-                connect_and_listen(self.order_book, self.schedule_ui_update)
+                run_supervised(
+                    self.order_book,
+                    self.schedule_ui_update,
+                    self.supervisor,
+                    recorder=self.feed_recorder,
+                    url=self.websocket_url,
+                    stats=self.ingest_stats,
+                    latency=self.latency,
+                    feed_clock=self.feed_clock,
+                    profiling=self.profiling,
+                )
             )
         except Exception as e:
             logger.error(f"Critical exception in WebSocket run_until_complete: {e}")
@@ -1035,17 +959,21 @@ class TradingSimulatorApp(tk.Tk):
                 loop.call_soon_threadsafe(loop.stop)
             logger.info("Asyncio event loop tasks finished in WebSocket thread.")
 
-    # --- schedule_ui_update  to pass L1 latency) ---
-    def schedule_ui_update(
-        self, book_manager, status, ws_processing_latency_ms=None
-    ):  # Add new arg
+    # --- schedule_ui_update (called on the WebSocket thread) ---
+    def schedule_ui_update(self, book_manager, status, ws_msg_arrival_time=None):
+        if status == "data_update":
+            # Compute runs on the worker thread; the snapshot stays consistent while
+            # the WebSocket thread moves on to the next message
+            self.compute_worker.submit_book(
+                book_manager.snapshot(), ws_msg_arrival_time
+            )
+            return
         # Use self.after to ensure UI updates happen in the main Tkinter thread.
-        # Pass status and latency as a tuple.
         self.after(
             0,
             self._update_ui_from_websocket,
             book_manager,
-            (status, ws_processing_latency_ms),
+            (status, ws_msg_arrival_time),
         )
 
     def _on_closing(self):
@@ -1076,6 +1004,26 @@ class TradingSimulatorApp(tk.Tk):
                 logger.info("WebSocket thread joined successfully.")
         else:
             logger.info("WebSocket thread was not alive or not initialized at close.")
+        if self.ingest_process is not None:
+            self.ingest_process.close()
+            logger.info(f"Closed ingest process: {self.ingest_process.get_stats()}")
+
+        # Finish queued books (they may still log rows), then flush the logs to disk
+        self.compute_worker.close()
+        logger.info(f"Closed compute worker: {self.compute_worker.get_stats()}")
+        self.profiling.disable()  # Writes a last report if profiling was on
+        logger.info(f"UI conflation: {self.ui_conflator.get_stats()}")
+        feed_stats = self._feed_stats()
+        logger.info(f"Feed ingest: {feed_stats['ingest']}")
+        logger.info(f"Feed clock: {feed_stats['feed_clock']}")
+        if self.watchdog is not None:
+            self.watchdog.close()
+            logger.info(f"Latency watchdog: {self.watchdog.get_stats()}")
+        self.latency.close()  # Writes a final snapshot
+        self.logs.close()
+        if self.feed_recorder is not None:
+            self.feed_recorder.close()
+            logger.info(f"Closed feed recorder: {self.feed_recorder.get_stats()}")
 
         logger.info("Destroying Tkinter window.")
         self.destroy()
@@ -1083,10 +1031,34 @@ class TradingSimulatorApp(tk.Tk):
     def run(self):
         # ...
         self.status_bar_text.set("Status: UI Ready. Initializing WebSocket...")
-        self.after(100, self._trigger_recalculation)
+        self._trigger_recalculation()
+        self.after(int(LATENCY_SNAPSHOT_INTERVAL_S * 1000), self._dump_latency_snapshot)
+        self.after(int(PROFILE_SIGNAL_POLL_S * 1000), self._poll_profiling_toggle)
         self.mainloop()
 
 
 if __name__ == "__main__":
-    app = TradingSimulatorApp()
+    parser = argparse.ArgumentParser(description="GoQuant Trade Simulator")
+    parser.add_argument(
+        "--ws-url",
+        help="L2 feed WebSocket URL (default: TRADE_SIM_WEBSOCKET_URL or the GoQuant endpoint)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Start with the profiling hooks enabled (see src/profiling_hooks.py)",
+    )
+    parser.add_argument(
+        "--ingest-process",
+        action="store_true",
+        default=INGEST_PROCESS_ENABLED,
+        help="Run the feed in a separate process, sharing books via shared memory "
+        "(see src/ingest_process.py)",
+    )
+    args = parser.parse_args()
+    app = TradingSimulatorApp(
+        websocket_url=args.ws_url, ingest_process=args.ingest_process
+    )
+    if args.profile:
+        app.profiling.enable()
     app.run()
@@ -1,6 +1,9 @@
+import copy
 import logging
 from typing import List, Tuple, Dict, Any
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,6 +19,15 @@ class OrderBookManager:
         self.timestamp: str = ""
         self.symbol: str = ""
         self.exchange: str = ""
+        # Incremented on every update; lets consumers cache per-book-state work.
+        self.version: int = 0
+        # Exchange timestamp as epoch seconds, on the exchange's and on the local clock;
+        # set by FeedClock (feed_clock.py) after each update, None if unknown
+        self.exchange_time: float | None = None
+        self.local_exchange_time: float | None = None
+        self._arrays_version: int = -1
+        self._ask_array = np.empty((0, 2))
+        self._bid_array = np.empty((0, 2))
         logger.info("OrderBookManager initialized.")
 
     def update_book(self, data: Dict[str, Any]):
@@ -42,6 +54,7 @@ class OrderBookManager:
                 key=lambda x: x[0],  # Sort by price (first element)
                 reverse=True,
             )
+            self.version += 1
             # logger.debug(f"Order book updated for {self.symbol} @ {self.timestamp}. "
             #              f"Asks: {len(self.asks)}, Bids: {len(self.bids)}")
         except KeyError as e:
@@ -53,6 +66,62 @@ class OrderBookManager:
         except Exception as e:
             logger.error(f"Unexpected error updating order book: {e} in data {data}")
 
+    def apply_deltas(self, updates: List[Dict[str, Any]]):
+        """
+        Applies incremental updates on top of the current book as one new version.
+        Each update carries only changed levels; a level with quantity 0 is removed.
+        """
+        if not updates:
+            return
+        try:
+            asks = dict(self.asks)
+            bids = dict(self.bids)
+            for data in updates:
+                for levels, raw_levels in (
+                    (asks, data.get("asks", [])),
+                    (bids, data.get("bids", [])),
+                ):
+                    for price, quantity in raw_levels:
+                        price, quantity = float(price), float(quantity)
+                        if quantity == 0:
+                            levels.pop(price, None)
+                        else:
+                            levels[price] = quantity
+            last = updates[-1]
+            self.timestamp = last.get("timestamp", self.timestamp)
+            self.symbol = last.get("symbol", self.symbol)
+            self.exchange = last.get("exchange", self.exchange)
+            # New lists, never mutated in place (see snapshot)
+            self.asks = sorted(asks.items())
+            self.bids = sorted(bids.items(), reverse=True)
+            self.version += 1
+        except ValueError as e:
+            logger.error(
+                f"ValueError (likely float conversion) while applying book deltas: {e}"
+            )
+        except Exception as e:
+            logger.error(f"Unexpected error applying book deltas: {e}")
+
+    def get_book_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the asks and bids as (N, 2) float arrays of [price, quantity], in the
+        same order as the lists. Built lazily once per book version, so several
+        vectorized consumers in the same tick share a single conversion.
+        """
+        if self._arrays_version != self.version:
+            self._ask_array = np.array(self.asks, dtype=float).reshape(-1, 2)
+            self._bid_array = np.array(self.bids, dtype=float).reshape(-1, 2)
+            self._arrays_version = self.version
+        return self._ask_array, self._bid_array
+
+    def snapshot(self) -> "OrderBookManager":
+        """
+        Returns a consistent copy of the current book for use on another thread.
+        Cheap: update_book replaces the level lists instead of mutating them, so the
+        copy can share them with this manager.
+        """
+        return copy.copy(self)
+
     def get_best_ask(self) -> Tuple[float, float] | None:
         """Returns the best (lowest) ask price and its quantity."""
         return self.asks[0] if self.asks else None
@@ -0,0 +1,350 @@
+# src/pipeline.py
+"""
+The per-tick simulation pipeline, independent of Tk and of the network.
+
+TickPipeline owns the feature extractor, probe scheduler, slippage model and
+retrain policy. `on_book_update()` runs probes and (re)training for the current
+book state; `estimate_costs()` computes the fee/slippage/impact/net cost shown
+for a user order. The UI (main_app.py) and the headless replay engine
+(replay.py) both drive the same pipeline, so replays reproduce the live app.
+"""
+
+import logging
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+from .config import (
+    SLIPPAGE_MODEL_FEATURES,
+    PROBE_ORDER_SIZES_USD,
+    SLIPPAGE_MODEL_MIN_SAMPLES_TO_TRAIN,
+)
+from .book_features import BookFeatureExtractor
+from .drift_detection import RetrainScheduler
+from .financial_calculations import (
+    calculate_expected_fees,
+    calculate_slippage_walk_book,
+    calculate_market_impact_cost,
+    SlippageRegressionModel,
+)
+from .probe_scheduler import ProbeScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class TickResult(NamedTuple):
+    book_features: Optional[List[float]]  # None if the book was crossed/incomplete
+    extraction_ms: Optional[float]
+    probes_run: int
+    retrain_reason: Optional[str]  # "initial", "drift", "max_interval" or None
+    trained: bool  # A (re)fit was attempted and succeeded on this tick
+
+
+class SlippageEstimate(NamedTuple):
+    # "regression", "regression_error", "zero" (no trade) or "pending" (model not trained)
+    source: str
+    predicted_slippage_pct: Optional[float]
+    slippage_pct: Optional[float]
+    slippage_cost_usd: float
+
+
+class FillEstimate(NamedTuple):
+    avg_execution_price: Optional[float]
+    asset_traded: Optional[float]
+    usd_spent: Optional[float]
+
+
+class CostEstimate(NamedTuple):
+    quantity_usd: float
+    # "regression", "regression_error", "zero" (no trade) or "pending" (model not trained)
+    slippage_source: str
+    predicted_slippage_pct: Optional[float]  # Raw model output, as logged
+    slippage_pct: Optional[float]  # Capped at 0 for buys; used for net cost
+    slippage_cost_usd: float
+    avg_execution_price: Optional[float]
+    asset_traded: Optional[float]
+    usd_spent: Optional[float]
+    fees_usd: float
+    market_impact_usd: Optional[float]
+    net_cost_usd: Optional[float]  # None while a component is pending
+    maker_taker: str
+
+
+class TickPipeline:
+    def __init__(
+        self,
+        order_book,
+        logs=None,
+        probe_order_sizes_usd: Optional[List[float]] = None,
+        min_samples_to_train: int = SLIPPAGE_MODEL_MIN_SAMPLES_TO_TRAIN,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            order_book (OrderBookManager): The book the pipeline reads on every tick.
+            logs (Optional[SimulatorLogs]): Where probe/prediction/performance rows go; None disables logging.
+            probe_order_sizes_usd (Optional[List[float]]): USD sizes probed per accepted tick.
+            min_samples_to_train (int): Samples needed before the first model fit.
+            clock (Callable[[], float]): Wall-clock source for log timestamps. Replays pass
+                a simulated clock so their output is deterministic.
+        """
+        self.order_book = order_book
+        self.logs = logs
+        self.latency = None  # Optional LatencyRecorder for the probe/training stages
+        self.clock = clock
+        self.probe_order_sizes_usd = list(
+            probe_order_sizes_usd
+            if probe_order_sizes_usd is not None
+            else PROBE_ORDER_SIZES_USD
+        )
+
+        self.feature_extractor = BookFeatureExtractor(SLIPPAGE_MODEL_FEATURES)
+        self.slippage_reg_model = SlippageRegressionModel(
+            min_samples_to_train=min_samples_to_train,
+            feature_names=["order_size_usd"] + self.feature_extractor.feature_names,
+        )
+        # Skip (or down-weight) probes when the book state did not materially change
+        self.probe_scheduler = ProbeScheduler(
+            self.probe_order_sizes_usd, self.feature_extractor.feature_names
+        )
+        # Retrain on residual drift, bounded by min/max intervals (see RetrainScheduler)
+        self.retrain_scheduler = RetrainScheduler()
+        self.ticks_since_last_train = 0
+        # Degraded mode (set by the LatencyWatchdog, latency_watchdog.py): probe at most
+        # this many sizes per tick (None: all), and hold off retrains after the first fit
+        self.max_probes_per_tick: Optional[int] = None
+        self.defer_retrains = False
+
+        # --- Counters ---
+        self.ticks = 0
+        self.ticks_rejected = 0  # Crossed/incomplete books
+        self.retrains = 0
+        self.probes_shed = 0  # Scheduled probe sizes not run while probes are limited
+        self.retrains_deferred = 0  # Ticks a due retrain was held off
+
+    def on_book_update(self) -> TickResult:
+        """Runs probe generation and (re)training for the current book state."""
+        self.ticks += 1
+        best_ask = self.order_book.get_best_ask()
+        best_bid = self.order_book.get_best_bid()
+        if not (best_ask and best_bid and best_ask[0] > best_bid[0]):
+            self.ticks_rejected += 1
+            logger.warning(
+                f"Book crossed or incomplete: Best Ask {best_ask[0] if best_ask else 'N/A'} / "
+                f"Best Bid {best_bid[0] if best_bid else 'N/A'}. Skipping probe data generation for this tick."
+            )
+            return TickResult(None, None, 0, None, False)
+
+        probes_start = time.perf_counter()
+        # All model features for this book state, computed once and shared by every probe
+        book_features = self.feature_extractor.extract(self.order_book)
+        extraction_ms = self.feature_extractor.last_extraction_ms
+        if book_features is None:
+            self.ticks_rejected += 1
+            return TickResult(None, extraction_ms, 0, None, False)
+
+        probe_sizes_usd, probe_weight = self.probe_scheduler.schedule(
+            best_ask[0], best_bid[0], book_features
+        )
+        max_probes = self.max_probes_per_tick
+        if max_probes is not None and len(probe_sizes_usd) > max_probes:
+            self.probes_shed += len(probe_sizes_usd) - max_probes
+            probe_sizes_usd = spread_subset(probe_sizes_usd, max_probes)
+        probes_run = 0
+        for probe_size_usd in probe_sizes_usd:
+            probe_slippage_pct, _, _, _ = calculate_slippage_walk_book(
+                probe_size_usd, self.order_book
+            )
+            if probe_slippage_pct is None:
+                continue
+            probes_run += 1
+            features = [float(probe_size_usd)] + book_features
+            residual = self.slippage_reg_model.add_data_point(
+                features, probe_slippage_pct, probe_weight
+            )
+            self.retrain_scheduler.observe(residual)
+            if self.logs is not None:
+                self.logs.log_probe(
+                    probe_size_usd,
+                    book_features,
+                    probe_slippage_pct,
+                    extraction_ms,
+                    probe_weight,
+                    wall_time=self.clock(),
+                )
+
+        if self.latency is not None:
+            self.latency.record("probes", (time.perf_counter() - probes_start) * 1000)
+        retrain_reason, trained = self._maybe_train()
+        return TickResult(
+            book_features, extraction_ms, probes_run, retrain_reason, trained
+        )
+
+    def _maybe_train(self):
+        self.ticks_since_last_train += 1
+        model = self.slippage_reg_model
+        total_data_points = model.num_samples  # Bounded by the sample store
+
+        # Initial fit once enough samples exist; afterwards on residual drift
+        # (or when the max-interval safety net elapses)
+        if not model.is_trained:
+            reason = (
+                "initial" if total_data_points >= model.min_samples_to_train else None
+            )
+        else:
+            reason = self.retrain_scheduler.should_retrain(self.ticks_since_last_train)
+        if reason is None:
+            return None, False
+        if self.defer_retrains and model.is_trained:
+            # Still due once the deferral ends: the drift state and tick count are kept
+            self.retrains_deferred += 1
+            return None, False
+
+        if reason == "drift":
+            # Refitting the same store would mostly refit pre-drift data: keep only
+            # the samples from after the estimated change point
+            model.age_out_samples(self.retrain_scheduler.detector.samples_since_change)
+            total_data_points = model.num_samples
+        logger.info(
+            f"Attempting to train model. Reason: {reason}, Total data: {total_data_points}"
+        )
+        train_start = time.perf_counter()
+        trained = model.train()
+        if self.latency is not None:
+            self.latency.record("training", (time.perf_counter() - train_start) * 1000)
+        if trained:
+            logger.info(
+                f"Model (re)trained successfully with {model.training_samples_count} samples."
+            )
+            self.retrains += 1
+            self.retrain_scheduler.on_retrained(reason)
+            if self.logs is not None:
+                self.logs.log_performance(
+                    model.get_metrics(), reason, wall_time=self.clock()
+                )
+        else:
+            logger.warning(
+                f"Model training attempt failed. Total data points: {total_data_points}"
+            )
+        self.ticks_since_last_train = 0  # Reset counter after attempting to train
+        return reason, trained
+
+    def estimate_costs(
+        self,
+        quantity_usd: float,
+        fee_tier: str,
+        volatility: float,
+        asset_symbol: str,
+        log_prediction: bool = True,
+    ) -> CostEstimate:
+        """
+        Expected costs of a market buy of `quantity_usd` on the current book.
+
+        Slippage comes from the regression model; walk-the-book is still run for the
+        executed value that fees and market impact are based on. The parts are also
+        available separately (see RecalcScheduler, which only recomputes stale ones).
+        """
+        slippage = self.estimate_slippage(quantity_usd, log_prediction)
+        fill = self.estimate_fill(quantity_usd)
+        base_usd = execution_base_usd(quantity_usd, fill)
+        return combine_costs(
+            quantity_usd,
+            slippage,
+            fill,
+            calculate_expected_fees(base_usd, fee_tier),
+            calculate_market_impact_cost(base_usd, volatility, asset_symbol),
+        )
+
+    def estimate_slippage(
+        self, quantity_usd: float, log_prediction: bool = True
+    ) -> SlippageEstimate:
+        """Regression-model slippage for `quantity_usd` on the current book."""
+        book_features = self.feature_extractor.extract(self.order_book)
+        model = self.slippage_reg_model
+        predicted_slippage_pct = None
+        slippage_pct = None
+        slippage_cost_usd = 0.0
+        if model.is_trained and book_features is not None:
+            predicted_slippage_pct = model.predict([quantity_usd] + book_features)
+            if predicted_slippage_pct is not None:
+                slippage_source = "regression"
+                # --- Cap negative slippage prediction for BUY orders at 0 ---
+                slippage_pct = max(0.0, predicted_slippage_pct)
+                slippage_cost_usd = (slippage_pct / 100.0) * quantity_usd
+            else:
+                slippage_source = "regression_error"
+        elif quantity_usd == 0:
+            slippage_source = "zero"
+            slippage_pct = 0.0
+        else:
+            slippage_source = "pending"
+
+        if (
+            log_prediction
+            and self.logs is not None
+            and model.is_trained
+            and book_features is not None
+        ):
+            self.logs.log_user_prediction(
+                model.is_trained,
+                quantity_usd,
+                predicted_slippage_pct,
+                wall_time=self.clock(),
+            )
+        return SlippageEstimate(
+            slippage_source, predicted_slippage_pct, slippage_pct, slippage_cost_usd
+        )
+
+    def estimate_fill(self, quantity_usd: float) -> FillEstimate:
+        """Walk-the-book fill of a market buy of `quantity_usd` on the current book."""
+        if len(self.order_book.asks) and len(self.order_book.bids):
+            _, avg_execution_price, asset_traded, usd_spent = (
+                calculate_slippage_walk_book(quantity_usd, self.order_book)
+            )
+            return FillEstimate(avg_execution_price, asset_traded, usd_spent)
+        return FillEstimate(None, None, None)
+
+
+def spread_subset(values: List[float], n: int) -> List[float]:
+    """`n` of `values` spread evenly over the list, keeping the first and last."""
+    if n <= 0:
+        return []
+    if n == 1:
+        return [values[0]]
+    last = len(values) - 1
+    return [values[round(i * last / (n - 1))] for i in range(n)]
+
+
+def execution_base_usd(quantity_usd: float, fill: FillEstimate) -> float:
+    """Fees and impact are based on the executed value when available."""
+    usd_spent = fill.usd_spent
+    return usd_spent if usd_spent is not None and usd_spent > 0 else quantity_usd
+
+
+def combine_costs(
+    quantity_usd: float,
+    slippage: SlippageEstimate,
+    fill: FillEstimate,
+    fees_usd: float,
+    market_impact_usd: Optional[float],
+) -> CostEstimate:
+    net_cost_usd = None
+    if market_impact_usd is not None and slippage.slippage_pct is not None:
+        net_cost_usd = (
+            slippage.slippage_cost_usd + fees_usd + market_impact_usd
+            if quantity_usd > 0
+            else 0.0
+        )
+    return CostEstimate(
+        quantity_usd=quantity_usd,
+        slippage_source=slippage.source,
+        predicted_slippage_pct=slippage.predicted_slippage_pct,
+        slippage_pct=slippage.slippage_pct,
+        slippage_cost_usd=slippage.slippage_cost_usd,
+        avg_execution_price=fill.avg_execution_price,
+        asset_traded=fill.asset_traded,
+        usd_spent=fill.usd_spent,
+        fees_usd=fees_usd,
+        market_impact_usd=market_impact_usd,
+        net_cost_usd=net_cost_usd,
+        maker_taker="N/A (No Trade)" if quantity_usd == 0 else "100% Taker",
+    )
@@ -0,0 +1,131 @@
+# src/probe_scheduler.py
+"""
+Decides on which ticks the slippage probes are run.
+
+Probing every tick floods the training data with near-identical rows while the
+book is quiet and wastes walk-the-book time. The scheduler fingerprints each
+book state (quantized top-of-book and depth features) and skips probes when the
+fingerprint has not changed since the last probed state. Long runs of
+duplicates still get an occasional down-weighted sample so quiet regimes are
+represented, just not over-represented. When the mid-price is volatile the
+quantization is made finer, which increases sampling intensity.
+"""
+
+import logging
+import math
+from typing import Dict, List, Optional, Tuple
+
+from .config import (
+    PROBE_PRICE_QUANTUM_BPS,
+    PROBE_DEPTH_QUANTUM_LOG2,
+    PROBE_MAX_SKIP_TICKS,
+    PROBE_DUPLICATE_SAMPLE_WEIGHT,
+    PROBE_VOLATILITY_EWMA_ALPHA,
+    PROBE_VOLATILE_THRESHOLD_BPS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ProbeScheduler:
+    def __init__(
+        self,
+        probe_sizes_usd: List[float],
+        feature_names: List[str],
+        price_quantum_bps: float = PROBE_PRICE_QUANTUM_BPS,
+        depth_quantum_log2: float = PROBE_DEPTH_QUANTUM_LOG2,
+        max_skip_ticks: int = PROBE_MAX_SKIP_TICKS,
+        duplicate_weight: float = PROBE_DUPLICATE_SAMPLE_WEIGHT,
+        volatility_ewma_alpha: float = PROBE_VOLATILITY_EWMA_ALPHA,
+        volatile_threshold_bps: float = PROBE_VOLATILE_THRESHOLD_BPS,
+    ):
+        self.probe_sizes_usd = list(probe_sizes_usd)
+        self.price_quantum_bps = price_quantum_bps
+        self.depth_quantum_log2 = depth_quantum_log2
+        self.max_skip_ticks = max_skip_ticks
+        self.duplicate_weight = duplicate_weight
+        self.volatility_ewma_alpha = volatility_ewma_alpha
+        self.volatile_threshold_bps = volatile_threshold_bps
+        # Only depth-like features go into the fingerprint; they are log-quantized
+        self._depth_indices = [
+            i for i, name in enumerate(feature_names) if "depth" in name
+        ]
+
+        self._last_fingerprint: Optional[Tuple] = None
+        self._consecutive_duplicates = 0
+        self._last_mid_price: Optional[float] = None
+        self.volatility_bps = 0.0  # EWMA of |mid return| per tick, in bps
+
+        # --- Counters ---
+        self.accepted_ticks = 0
+        self.skipped_ticks = 0
+        self.downweighted_ticks = 0
+        self.probes_run = 0
+        self.probes_skipped = 0
+
+    @property
+    def is_volatile(self) -> bool:
+        return self.volatility_bps > self.volatile_threshold_bps
+
+    def _update_volatility(self, mid_price: float):
+        if self._last_mid_price and mid_price > 0:
+            abs_return_bps = abs(math.log(mid_price / self._last_mid_price)) * 10000
+            self.volatility_bps += self.volatility_ewma_alpha * (
+                abs_return_bps - self.volatility_bps
+            )
+        self._last_mid_price = mid_price
+
+    def _fingerprint(
+        self, best_ask_price: float, best_bid_price: float, book_features: List[float]
+    ) -> Tuple:
+        # Volatile books get a finer grid, so more ticks count as new states
+        scale = 2.0 if self.is_volatile else 1.0
+        price_step = self.price_quantum_bps / 10000 / scale
+        depth_step = self.depth_quantum_log2 / scale
+        return (
+            round(math.log(best_ask_price) / price_step),
+            round(math.log(best_bid_price) / price_step),
+            scale,
+        ) + tuple(
+            round(math.log2(1.0 + max(0.0, book_features[i])) / depth_step)
+            for i in self._depth_indices
+        )
+
+    def schedule(
+        self, best_ask_price: float, best_bid_price: float, book_features: List[float]
+    ) -> Tuple[List[float], float]:
+        """
+        Returns the probe sizes to run for this book state and the sample weight
+        to train them with. An empty list means the tick is skipped.
+        """
+        self._update_volatility((best_ask_price + best_bid_price) / 2.0)
+        fingerprint = self._fingerprint(best_ask_price, best_bid_price, book_features)
+
+        if fingerprint != self._last_fingerprint:
+            self._last_fingerprint = fingerprint
+            self._consecutive_duplicates = 0
+            self.accepted_ticks += 1
+            self.probes_run += len(self.probe_sizes_usd)
+            return self.probe_sizes_usd, 1.0
+
+        self._consecutive_duplicates += 1
+        if self._consecutive_duplicates >= self.max_skip_ticks:
+            # Heartbeat sample for a persisting state, at reduced weight
+            self._consecutive_duplicates = 0
+            self.downweighted_ticks += 1
+            self.probes_run += len(self.probe_sizes_usd)
+            return self.probe_sizes_usd, self.duplicate_weight
+
+        self.skipped_ticks += 1
+        self.probes_skipped += len(self.probe_sizes_usd)
+        return [], 0.0
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "accepted_ticks": self.accepted_ticks,
+            "skipped_ticks": self.skipped_ticks,
+            "downweighted_ticks": self.downweighted_ticks,
+            "probes_run": self.probes_run,
+            "probes_skipped": self.probes_skipped,
+            "volatility_bps": self.volatility_bps,
+        }
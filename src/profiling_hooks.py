@@ -0,0 +1,270 @@
+# src/profiling_hooks.py
+"""
+Opt-in profiling of the tick path, toggled at runtime.
+
+While enabled:
+  * One tick in PROFILE_SAMPLE_EVERY_N_TICKS of each stage ("ingest" on the
+    WebSocket thread, "compute" on the worker, "render" on Tk) runs under
+    cProfile; the samples are accumulated per stage.
+  * tracemalloc traces allocations; each report diffs a snapshot against the
+    previous report's, listing the sites whose memory grew the most.
+  * A gc callback times every collection, per generation.
+Every PROFILE_REPORT_EVERY_N_TICKS compute ticks (and when disabled) a text
+report with the three sections is written to PROFILE_DIR, keeping only the
+newest PROFILE_MAX_REPORTS files.
+
+A signal handler must not toggle directly: it runs on the main thread, which
+may be inside `run()` holding the lock (the Tk "render" stage). It calls
+`request_toggle()`, which only sets a flag, and the app applies the request
+from its event loop with `apply_requested_toggle()`.
+
+Disabled, the hooks cost one attribute check per tick: call sites only go
+through `run()` when `enabled` is set, and tracemalloc and the gc callback are
+only installed while enabled.
+"""
+
+import cProfile
+import gc
+import glob
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import (
+    PROFILE_DIR,
+    PROFILE_SAMPLE_EVERY_N_TICKS,
+    PROFILE_REPORT_EVERY_N_TICKS,
+    PROFILE_MAX_REPORTS,
+    PROFILE_TOP_N,
+    PROFILE_TRACEMALLOC_FRAMES,
+)
+
+logger = logging.getLogger(__name__)
+
+REPORT_STAGE = "compute"  # Its tick count drives the reports
+
+
+class GCPauses:
+    """Count, total and max pause per gc generation."""
+
+    def __init__(self):
+        self.count = [0, 0, 0]
+        self.total_ms = [0.0, 0.0, 0.0]
+        self.max_ms = [0.0, 0.0, 0.0]
+
+    def add(self, generation: int, pause_ms: float):
+        self.count[generation] += 1
+        self.total_ms[generation] += pause_ms
+        self.max_ms[generation] = max(self.max_ms[generation], pause_ms)
+
+    def format(self) -> str:
+        lines = []
+        for generation in range(3):
+            n = self.count[generation]
+            mean = self.total_ms[generation] / n if n else 0.0
+            lines.append(
+                f"gen {generation}: {n} collections, total {self.total_ms[generation]:.3f} ms, "
+                f"mean {mean:.3f} ms, max {self.max_ms[generation]:.3f} ms"
+            )
+        return "\n".join(lines)
+
+
+class ProfilingHooks:
+    def __init__(
+        self,
+        directory: str = PROFILE_DIR,
+        sample_every: int = PROFILE_SAMPLE_EVERY_N_TICKS,
+        report_every: int = PROFILE_REPORT_EVERY_N_TICKS,
+        max_reports: int = PROFILE_MAX_REPORTS,
+        top_n: int = PROFILE_TOP_N,
+    ):
+        self.directory = directory
+        self.sample_every = max(1, sample_every)
+        self.report_every = max(1, report_every)
+        self.max_reports = max_reports
+        self.top_n = top_n
+        self.enabled = False  # Checked by the call sites before run()
+        self._toggle_requested = False
+        self._started_tracemalloc = False  # Only tracing we started is stopped
+        self._lock = threading.Lock()
+        # Only one cProfile can be active per process; other stages skip their sample
+        self._profile_lock = threading.Lock()
+        self._ticks: Dict[str, int] = {}
+        self._stats: Dict[str, pstats.Stats] = {}
+        self._samples: Dict[str, int] = {}
+        self._gc = GCPauses()
+        self._gc_start: Optional[float] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._interval_start = time.time()
+        self._run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._report_seq = 0
+
+        # --- Metrics ---
+        self.reports_written = 0
+        self.samples_taken = 0
+        self.samples_skipped = 0  # Another stage was being profiled
+
+    # --- Toggling (any thread, but not from a signal handler: see request_toggle) ---
+    def enable(self):
+        with self._lock:
+            if self.enabled:
+                return
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+                self._started_tracemalloc = True
+            self._snapshot = tracemalloc.take_snapshot()
+            gc.callbacks.append(self._on_gc)
+            self._reset_interval()
+            self.enabled = True
+        logger.info(f"Profiling enabled; reports go to {self.directory}")
+
+    def disable(self):
+        with self._lock:
+            if not self.enabled:
+                return
+            self.enabled = False
+            self._write_report("disabled")
+            gc.callbacks.remove(self._on_gc)
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+            self._snapshot = None
+        logger.info("Profiling disabled.")
+
+    def toggle(self, *args):
+        """Enables or disables profiling; usable directly as a Tk event handler."""
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def request_toggle(self, *args):
+        """Signal handler: only records the request (no locks, no I/O)."""
+        self._toggle_requested = True
+
+    def apply_requested_toggle(self) -> bool:
+        """Toggles if `request_toggle()` was called since; returns True if it did."""
+        if not self._toggle_requested:
+            return False
+        self._toggle_requested = False
+        self.toggle()
+        return True
+
+    # --- Tick hooks ---
+    def run(self, stage: str, func: Callable[..., Any], *args) -> Any:
+        """
+        Runs `func(*args)` as one tick of `stage`, profiled if it is a sampled tick.
+        Call only when `enabled` is set.
+        """
+        with self._lock:
+            tick = self._ticks.get(stage, 0) + 1
+            self._ticks[stage] = tick
+        if tick % self.sample_every:
+            result = func(*args)
+        elif not self._profile_lock.acquire(blocking=False):
+            self.samples_skipped += 1
+            result = func(*args)
+        else:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                try:
+                    result = func(*args)
+                finally:
+                    profile.disable()
+            finally:
+                self._profile_lock.release()
+            self._add_sample(stage, profile)
+        if stage == REPORT_STAGE and tick % self.report_every == 0:
+            with self._lock:
+                if self.enabled:
+                    self._write_report(f"{self.report_every} ticks")
+        return result
+
+    def _add_sample(self, stage: str, profile: cProfile.Profile):
+        with self._lock:
+            if stage in self._stats:
+                self._stats[stage].add(profile)
+            else:
+                self._stats[stage] = pstats.Stats(profile)
+            self._samples[stage] = self._samples.get(stage, 0) + 1
+            self.samples_taken += 1
+
+    def _on_gc(self, phase: str, info: Dict[str, int]):
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            self._gc.add(
+                info["generation"], (time.perf_counter() - self._gc_start) * 1000
+            )
+            self._gc_start = None
+
+    # --- Reports (called with self._lock held) ---
+    def _reset_interval(self):
+        self._stats = {}
+        self._samples = {}
+        self._gc = GCPauses()
+        self._interval_start = time.time()
+
+    def _write_report(self, reason: str):
+        sections = [
+            f"Profiling report ({reason}): "
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self._interval_start))}"
+            f" to {time.strftime('%Y-%m-%d %H:%M:%S')}",
+            f"Ticks so far per stage: {self._ticks}",
+        ]
+        for stage, stats in self._stats.items():
+            stream = io.StringIO()
+            stats.stream = stream
+            stats.sort_stats("cumulative").print_stats(self.top_n)
+            sections.append(
+                f"=== cProfile: {stage} ({self._samples[stage]} sampled ticks) ===\n"
+                + stream.getvalue()
+            )
+        if self._snapshot is not None and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                (tracemalloc.Filter(False, tracemalloc.__file__),)
+            )
+            growth = snapshot.compare_to(self._snapshot, "lineno")[: self.top_n]
+            current, peak = tracemalloc.get_traced_memory()
+            sections.append(
+                f"=== tracemalloc: top growth since last report "
+                f"(traced {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB) ===\n"
+                + "\n".join(str(stat) for stat in growth)
+            )
+            self._snapshot = snapshot
+        sections.append("=== GC pauses ===\n" + self._gc.format())
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._report_seq += 1
+            path = os.path.join(
+                self.directory, f"profile-{self._run_id}-{self._report_seq:05d}.txt"
+            )
+            with open(path, "w") as f:
+                f.write("\n\n".join(sections) + "\n")
+            self.reports_written += 1
+            self._rotate()
+        except OSError as e:
+            logger.error(f"Could not write profiling report: {e}")
+        self._reset_interval()
+
+    def _rotate(self):
+        reports: List[str] = sorted(
+            glob.glob(os.path.join(self.directory, "profile-*.txt"))
+        )
+        for path in reports[: max(0, len(reports) - self.max_reports)]:
+            os.remove(path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "reports_written": self.reports_written,
+            "samples_taken": self.samples_taken,
+            "samples_skipped": self.samples_skipped,
+        }
@@ -0,0 +1,192 @@
+# src/recalc_scheduler.py
+"""
+Dirty-flag scheduling of the user-order cost estimate.
+
+Every input of the estimate is tracked: the book version, the model version
+(successful retrains), and the order inputs (quantity, volatility, fee tier,
+symbol). An input that is set to the value it already has does not dirty
+anything. When a recompute runs, only the parts of the estimate that depend on
+a changed input are recomputed; the rest are reused from the previous estimate:
+
+    slippage (regression)  <- book, quantity, model
+    fill (walk-the-book)   <- book, quantity
+    fees                   <- fill, fee tier
+    market impact          <- fill, volatility, symbol
+
+Recomputes are coalesced to at most one per frame (1 / UI_MAX_FPS) while more
+work is queued; once the caller is idle the pending changes are computed
+right away. Counters record what was recomputed and what was avoided.
+"""
+
+import time
+from typing import Dict, Optional, Set
+
+from .config import UI_MAX_FPS
+from .financial_calculations import (
+    calculate_expected_fees,
+    calculate_market_impact_cost,
+)
+from .pipeline import (
+    CostEstimate,
+    FillEstimate,
+    SlippageEstimate,
+    TickPipeline,
+    combine_costs,
+    execution_base_usd,
+)
+
+# "order_error" is the validation message of the order inputs (None when valid) and
+# "book_stale" flags a book too old to estimate on; they dirty no part, but a change
+# must still be re-rendered
+INPUTS = (
+    "book",
+    "model",
+    "quantity",
+    "volatility",
+    "fee_tier",
+    "symbol",
+    "order_error",
+    "book_stale",
+)
+# Inputs each part depends on; fees/impact depend on the fill, hence book and quantity
+PART_DEPENDENCIES = {
+    "slippage": {"book", "quantity", "model"},
+    "fill": {"book", "quantity"},
+    "fees": {"book", "quantity", "fee_tier"},
+    "impact": {"book", "quantity", "volatility", "symbol"},
+}
+
+
+class RecalcScheduler:
+    def __init__(self, pipeline: TickPipeline, max_fps: float = UI_MAX_FPS):
+        self.pipeline = pipeline
+        self.min_interval_s = 1.0 / max_fps if max_fps > 0 else 0.0
+        self._values: Dict[str, object] = {name: None for name in INPUTS}
+        self._dirty: Set[str] = set(INPUTS)  # Changed since the last recompute
+        self._pending_parts: Set[str] = set(PART_DEPENDENCIES)
+        self._last_compute = -float("inf")
+        self._slippage: Optional[SlippageEstimate] = None
+        self._fill: Optional[FillEstimate] = None
+        self._fees_usd: Optional[float] = None
+        self._impact_usd: Optional[float] = None
+        self.estimate: Optional[CostEstimate] = None
+
+        # --- Metrics ---
+        self.unchanged_inputs = (
+            0  # Updates (an input, or a whole order) that changed nothing
+        )
+        self.recomputes = 0
+        self.coalesced = 0  # Dirty checks deferred into a later recompute (same frame)
+        self.parts_recomputed = {part: 0 for part in PART_DEPENDENCIES}
+        self.parts_reused = {part: 0 for part in PART_DEPENDENCIES}
+
+    def set_input(self, name: str, value, count_unchanged: bool = True) -> bool:
+        """Records the current value of an input; returns True if it changed."""
+        if self._values[name] == value:
+            if count_unchanged:
+                self.unchanged_inputs += 1
+            return False
+        self._values[name] = value
+        self._dirty.add(name)
+        self._pending_parts.update(
+            part
+            for part, dependencies in PART_DEPENDENCIES.items()
+            if name in dependencies
+        )
+        return True
+
+    def set_order(
+        self, quantity_usd: float, fee_tier: str, volatility: float, asset_symbol: str
+    ):
+        """
+        Records the order inputs. An edit usually changes one of them; the others
+        are not counted as unchanged updates, only an order that changed nothing is.
+        """
+        changed = False
+        for name, value in (
+            ("quantity", quantity_usd),
+            ("fee_tier", fee_tier),
+            ("volatility", volatility),
+            ("symbol", asset_symbol),
+        ):
+            changed |= self.set_input(name, value, count_unchanged=False)
+        if not changed:
+            self.unchanged_inputs += 1
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty)
+
+    def due(self, idle: bool, now: Optional[float] = None) -> bool:
+        """
+        True if something changed and either the caller is idle (nothing else queued)
+        or a frame has passed since the last recompute. Otherwise the change is left
+        for a later, coalesced recompute.
+        """
+        if not self._dirty:
+            return False
+        now = time.monotonic() if now is None else now
+        if idle or now - self._last_compute >= self.min_interval_s:
+            return True
+        self.coalesced += 1
+        return False
+
+    def recompute(self) -> Optional[CostEstimate]:
+        """
+        Recomputes the pending parts of the estimate on the pipeline's current book.
+        Returns None while the order inputs are missing or invalid or the book is
+        stale; those parts then stay pending until an estimate is possible again.
+        """
+        self._dirty = set()
+        self._last_compute = time.monotonic()
+        quantity_usd = self._values["quantity"]
+        if (
+            quantity_usd is None
+            or self._values["order_error"] is not None
+            or self._values["book_stale"]
+        ):
+            return None
+        pending = self._pending_parts
+        self._pending_parts = set()
+        pipeline = self.pipeline
+        try:
+            if "slippage" in pending:
+                self._slippage = pipeline.estimate_slippage(quantity_usd)
+            if "fill" in pending:
+                self._fill = pipeline.estimate_fill(quantity_usd)
+            base_usd = execution_base_usd(quantity_usd, self._fill)
+            if "fees" in pending:
+                self._fees_usd = calculate_expected_fees(
+                    base_usd, self._values["fee_tier"]
+                )
+            if "impact" in pending:
+                self._impact_usd = calculate_market_impact_cost(
+                    base_usd, self._values["volatility"], self._values["symbol"]
+                )
+        except Exception:
+            self._pending_parts = set(
+                PART_DEPENDENCIES
+            )  # Nothing cached can be trusted
+            raise
+        for part in PART_DEPENDENCIES:
+            if part in pending:
+                self.parts_recomputed[part] += 1
+            else:
+                self.parts_reused[part] += 1
+        self.recomputes += 1
+        self.estimate = combine_costs(
+            quantity_usd, self._slippage, self._fill, self._fees_usd, self._impact_usd
+        )
+        return self.estimate
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = {
+            "recomputes": self.recomputes,
+            "coalesced": self.coalesced,
+            "unchanged_inputs": self.unchanged_inputs,
+        }
+        stats.update({f"{p}_reused": n for p, n in self.parts_reused.items()})
+        stats["recomputations_avoided"] = (
+            self.coalesced + self.unchanged_inputs + sum(self.parts_reused.values())
+        )
+        return stats
@@ -0,0 +1,294 @@
+# src/replay.py
+"""
+Headless replay of recorded L2 feeds through the full tick pipeline.
+
+Recorded messages (see FeedRecorder) are applied to an OrderBookManager with
+the live ingest's apply_message_batch (snapshots and deltas) and fed through
+probe generation, model training and the cost functions exactly as the live app does,
+without Tk or the network. Log timestamps come from a simulated clock driven by
+the recorded arrival times, so a replay of the same data is deterministic. Book
+ages are taken on that clock too: a book older than BOOK_STALE_AFTER_MS when it
+arrives is skipped like the compute worker skips it (no probes, no estimate).
+Staleness that only builds up while a live feed is silent is not modelled.
+
+Speed: 0 replays as fast as possible (throughput benchmark), 1 in real time,
+N at N times real time.
+
+    python -m src.replay --dir feed_recordings --speed 0
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import (
+    BOOK_STALE_AFTER_MS,
+    COLUMNAR_LOG_DIR,
+    FEED_RECORD_DIR,
+    MODEL_PERFORMANCE_LOG_FILE,
+    PROBE_ORDER_SIZES_USD,
+    REGRESSION_DATA_LOG_FILE,
+    REPLAY_LOG_DIR,
+    SLIPPAGE_MODEL_MIN_SAMPLES_TO_TRAIN,
+)
+from .feed_clock import FeedClock
+from .order_book_manager import OrderBookManager
+from .pipeline import TickPipeline
+from .websocket_handler import apply_message_batch, read_recorded_feed
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatedClock:
+    """Wall clock that only moves when the replay advances it. Call it for the time."""
+
+    def __init__(self, start_time: float = 0.0):
+        self.now = start_time
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance_to(self, wall_time: float):
+        if wall_time > self.now:  # Never runs backwards, even on out-of-order records
+            self.now = wall_time
+
+
+class ReplayEngine:
+    def __init__(
+        self,
+        messages: Iterable[Tuple[float, float, str]],
+        speed: float = 0.0,
+        quantity_usd: Optional[float] = 100.0,
+        fee_tier: str = "Regular User LV1",
+        volatility: float = 0.02,
+        asset_symbol: str = "BTC-USDT-SWAP",
+        logs=None,
+        probe_order_sizes_usd: Optional[List[float]] = None,
+        min_samples_to_train: int = SLIPPAGE_MODEL_MIN_SAMPLES_TO_TRAIN,
+        stale_after_ms: float = BOOK_STALE_AFTER_MS,
+    ):
+        """
+        Args:
+            messages (Iterable[Tuple[float, float, str]]): (wall_time, perf_time, raw_message)
+                records, e.g. from read_recorded_feed().
+            speed (float): 0 for as fast as possible, otherwise the replay speed multiplier.
+            quantity_usd (Optional[float]): User order size costed on every tick, as the UI
+                does; None skips cost estimation.
+            fee_tier (str), volatility (float), asset_symbol (str): The remaining UI inputs.
+            logs (Optional[SimulatorLogs]): Where to write probe/prediction/performance rows.
+            probe_order_sizes_usd (Optional[List[float]]): Probe sizes (defaults from config).
+            min_samples_to_train (int): Samples needed before the first model fit.
+            stale_after_ms (float): Book age at which a book is stale, as in the
+                compute worker; the age is taken on the simulated clock.
+        """
+        if speed < 0:
+            raise ValueError(f"speed must be >= 0, got {speed}")
+        self.messages = messages
+        self.speed = speed
+        self.quantity_usd = quantity_usd
+        self.fee_tier = fee_tier
+        self.volatility = volatility
+        self.asset_symbol = asset_symbol
+        self.stale_after_ms = stale_after_ms
+        self.clock = SimulatedClock()
+        # Offset window and book ages follow the recorded arrival times
+        self.feed_clock = FeedClock(clock=self.clock)
+        self.order_book = OrderBookManager()
+        self.pipeline = TickPipeline(
+            self.order_book,
+            logs=logs,
+            probe_order_sizes_usd=(
+                probe_order_sizes_usd
+                if probe_order_sizes_usd is not None
+                else PROBE_ORDER_SIZES_USD
+            ),
+            min_samples_to_train=min_samples_to_train,
+            clock=self.clock,
+        )
+
+    def _pace(self, wall_time: float, anchor: Optional[Tuple[float, float]]):
+        """Sleeps until `wall_time` is due at the configured speed; returns the anchor."""
+        if anchor is None:
+            return wall_time, time.monotonic()
+        recorded_start, real_start = anchor
+        due = real_start + (wall_time - recorded_start) / self.speed
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return anchor
+
+    def _book_stale(self) -> bool:
+        local_exchange_time = self.order_book.local_exchange_time
+        if local_exchange_time is None:
+            return False
+        return (self.clock() - local_exchange_time) * 1000 > self.stale_after_ms
+
+    def run(self, max_messages: Optional[int] = None) -> Dict[str, Any]:
+        """Replays the messages and returns a summary report (counts, timings, metrics)."""
+        messages = 0
+        parse_errors = 0
+        probes_run = 0
+        update_s = tick_s = estimate_s = 0.0
+        first_wall = last_wall = None
+        anchor = None
+        # Deltas only make sense on top of a snapshot, as in the live ingest
+        awaiting_snapshot = True
+        skipped_before_snapshot = 0
+        books_stale = 0
+        # Digest of every model-dependent output, for comparing replays of the same data
+        digest = hashlib.sha256()
+
+        start = time.perf_counter()
+        for wall_time, perf_time, raw_message in self.messages:
+            if max_messages is not None and messages >= max_messages:
+                break
+            if self.speed > 0:
+                anchor = self._pace(wall_time, anchor)
+            self.clock.advance_to(wall_time)
+            first_wall = wall_time if first_wall is None else first_wall
+            last_wall = wall_time
+            messages += 1
+
+            t0 = time.perf_counter()
+            version = self.order_book.version
+            applied, _ = apply_message_batch(
+                self.order_book, [raw_message], require_snapshot=awaiting_snapshot
+            )
+            t1 = time.perf_counter()
+            update_s += t1 - t0
+            if not applied:
+                if awaiting_snapshot:
+                    skipped_before_snapshot += 1
+                else:
+                    parse_errors += 1
+                continue
+            awaiting_snapshot = False
+            if self.order_book.version == version:
+                parse_errors += 1  # The book rejected the message
+                continue
+            if not (self.order_book.asks and self.order_book.bids):
+                continue
+            # Like the compute worker: a stale book gets no probes and no estimate
+            self.feed_clock.on_book(self.order_book, perf_time, arrival_time=wall_time)
+            if self._book_stale():
+                books_stale += 1
+                continue
+
+            tick = self.pipeline.on_book_update()
+            t2 = time.perf_counter()
+            tick_s += t2 - t1
+            probes_run += tick.probes_run
+
+            if self.quantity_usd is not None:
+                estimate = self.pipeline.estimate_costs(
+                    self.quantity_usd,
+                    self.fee_tier,
+                    self.volatility,
+                    self.asset_symbol,
+                )
+                estimate_s += time.perf_counter() - t2
+                digest.update(
+                    repr(
+                        (estimate.predicted_slippage_pct, estimate.net_cost_usd)
+                    ).encode()
+                )
+        elapsed_s = time.perf_counter() - start
+
+        ticks = self.pipeline.ticks
+
+        def per_tick_ms(total_s: float) -> Optional[float]:
+            return total_s / ticks * 1000 if ticks else None
+
+        return {
+            "messages": messages,
+            "parse_errors": parse_errors,
+            "skipped_before_snapshot": skipped_before_snapshot,
+            "ticks": ticks,
+            "books_stale": books_stale,
+            "ticks_rejected": self.pipeline.ticks_rejected,
+            "probes_run": probes_run,
+            "retrains": self.pipeline.retrains,
+            "recorded_span_s": (
+                last_wall - first_wall if first_wall is not None else 0.0
+            ),
+            "elapsed_s": elapsed_s,
+            "messages_per_s": messages / elapsed_s if elapsed_s > 0 else None,
+            "update_book_ms_per_tick": per_tick_ms(update_s),
+            "pipeline_ms_per_tick": per_tick_ms(tick_s),
+            "estimate_ms_per_tick": per_tick_ms(estimate_s),
+            "model_metrics": self.pipeline.slippage_reg_model.get_metrics(),
+            "probe_schedule": self.pipeline.probe_scheduler.get_stats(),
+            "retrain_schedule": self.pipeline.retrain_scheduler.get_stats(),
+            "result_digest": digest.hexdigest(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay recorded L2 feeds through the simulator pipeline."
+    )
+    parser.add_argument("--dir", default=FEED_RECORD_DIR, help="Recording directory.")
+    parser.add_argument("--start", type=float, help="Window start (epoch seconds).")
+    parser.add_argument("--end", type=float, help="Window end (epoch seconds).")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0.0,
+        help="0 = as fast as possible, 1 = real time, N = N times real time.",
+    )
+    parser.add_argument("--max-messages", type=int)
+    parser.add_argument("--quantity-usd", type=float, default=100.0)
+    parser.add_argument("--fee-tier", default="Regular User LV1")
+    parser.add_argument("--volatility", type=float, default=0.02)
+    parser.add_argument(
+        "--min-samples-to-train", type=int, default=SLIPPAGE_MODEL_MIN_SAMPLES_TO_TRAIN
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=["csv", "npz", "parquet"],
+        help="Also write the simulator logs (with simulated timestamps) in this format.",
+    )
+    parser.add_argument(
+        "--log-dir",
+        default=REPLAY_LOG_DIR,
+        help="Directory for the --log-format logs, kept apart from the live app's logs.",
+    )
+    args = parser.parse_args()
+
+    engine = ReplayEngine(
+        read_recorded_feed(args.dir, args.start, args.end),
+        speed=args.speed,
+        quantity_usd=args.quantity_usd,
+        fee_tier=args.fee_tier,
+        volatility=args.volatility,
+        min_samples_to_train=args.min_samples_to_train,
+    )
+    logs = None
+    if args.log_format:
+        from .log_writer import SimulatorLogs
+
+        os.makedirs(args.log_dir, exist_ok=True)
+        logs = SimulatorLogs(
+            engine.pipeline.feature_extractor.feature_names,
+            engine.pipeline.slippage_reg_model.prequential.bucket_labels,
+            log_format=args.log_format,
+            regression_csv=os.path.join(args.log_dir, REGRESSION_DATA_LOG_FILE),
+            performance_csv=os.path.join(args.log_dir, MODEL_PERFORMANCE_LOG_FILE),
+            columnar_dir=os.path.join(args.log_dir, COLUMNAR_LOG_DIR),
+        )
+        engine.pipeline.logs = logs
+    try:
+        report = engine.run(max_messages=args.max_messages)
+    finally:
+        if logs is not None:
+            logs.close()
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,211 @@
+# src/sample_store.py
+"""
+Bounded, stratified storage for slippage model training samples.
+
+A FIFO buffer keeps only the most recent regime; a single reservoir keeps a
+uniform sample of history, which is still dominated by the common case (tight
+spread, deep book). Here every (probe-size bucket, spread regime) stratum has
+its own fixed-size reservoir, so rare regimes are kept at full resolution until
+their reservoir fills, while the fit cost stays bounded by the total capacity no
+matter how long the session runs.
+
+The reservoirs are recency-biased (biased reservoir sampling, Aggarwal 2006):
+once a stratum is full, each new sample replaces a random slot with a fixed
+probability SAMPLE_STORE_REPLACE_PROBABILITY. Plain Algorithm R would admit it
+with probability capacity/seen, so after a long session a regime change would
+barely reach the training data. Here the age of retained samples is roughly
+exponential with a mean of capacity / probability samples of that stratum.
+
+`to_arrays()` balances the strata: each stratum's weights are scaled by
+capacity/filled (at most SAMPLE_STORE_MAX_BALANCE_WEIGHT), so a sparsely
+filled rare regime counts about as much in the fit as a full common one.
+"""
+
+import logging
+import random
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    SAMPLE_STORE_CAPACITY,
+    SAMPLE_STORE_MAX_BALANCE_WEIGHT,
+    SAMPLE_STORE_REPLACE_PROBABILITY,
+    SAMPLE_STORE_SIZE_BUCKET_EDGES_USD,
+    SAMPLE_STORE_SPREAD_REGIME_EDGES_BPS,
+    SAMPLE_STORE_RANDOM_SEED,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _Reservoir:
+    """Preallocated fixed-size reservoir for one stratum."""
+
+    def __init__(self, capacity: int, features_dim: int):
+        self.X = np.empty((capacity, features_dim))
+        self.y = np.empty(capacity)
+        self.w = np.empty(capacity)
+        self.seq = np.empty(capacity, dtype=np.int64)  # Store-wide insertion number
+        self.capacity = capacity
+        self.filled = 0
+        self.seen = 0
+
+
+class StratifiedReservoirStore:
+    def __init__(
+        self,
+        features_dim: int,
+        total_capacity: int = SAMPLE_STORE_CAPACITY,
+        spread_feature_index: Optional[int] = None,
+        size_bucket_edges_usd: Optional[List[float]] = None,
+        spread_regime_edges_bps: Optional[List[float]] = None,
+        seed: int = SAMPLE_STORE_RANDOM_SEED,
+        replace_probability: float = SAMPLE_STORE_REPLACE_PROBABILITY,
+        max_balance_weight: float = SAMPLE_STORE_MAX_BALANCE_WEIGHT,
+    ):
+        """
+        Args:
+            features_dim (int): Length of each feature vector; feature 0 is the order size in USD.
+            total_capacity (int): Maximum number of samples kept across all strata.
+            spread_feature_index (Optional[int]): Index of the spread (bps) feature. If None,
+                strata are by size bucket only.
+            size_bucket_edges_usd (Optional[List[float]]): Probe-size bucket edges.
+            spread_regime_edges_bps (Optional[List[float]]): Spread regime edges.
+            seed (int): Seed for replacement decisions, so replays are deterministic.
+            replace_probability (float): Probability that a sample arriving at a full
+                stratum replaces one of its samples (higher: shorter memory).
+            max_balance_weight (float): Cap on the capacity/filled weight factor of a
+                sparsely filled stratum; 1.0 turns balancing off.
+        """
+        if not 0.0 < replace_probability <= 1.0:
+            raise ValueError(
+                f"replace_probability must be in (0, 1], got {replace_probability}"
+            )
+        self.features_dim = features_dim
+        self.spread_feature_index = spread_feature_index
+        self.size_edges = sorted(
+            size_bucket_edges_usd
+            if size_bucket_edges_usd is not None
+            else SAMPLE_STORE_SIZE_BUCKET_EDGES_USD
+        )
+        self.spread_edges = (
+            sorted(
+                spread_regime_edges_bps
+                if spread_regime_edges_bps is not None
+                else SAMPLE_STORE_SPREAD_REGIME_EDGES_BPS
+            )
+            if spread_feature_index is not None
+            else []
+        )
+        num_strata = (len(self.size_edges) + 1) * (len(self.spread_edges) + 1)
+        self.total_capacity = total_capacity
+        self.stratum_capacity = max(1, total_capacity // num_strata)
+        self._reservoirs: Dict[Tuple[int, int], _Reservoir] = {}
+        self.replace_probability = replace_probability
+        self.max_balance_weight = max_balance_weight
+        self._rng = random.Random(seed)
+        self._size = 0
+        self.total_seen = 0
+        self.samples_aged_out = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _stratum(self, features: List[float]) -> Tuple[int, int]:
+        size_bucket = bisect_right(self.size_edges, features[0])
+        spread_regime = (
+            bisect_right(self.spread_edges, features[self.spread_feature_index])
+            if self.spread_feature_index is not None
+            else 0
+        )
+        return size_bucket, spread_regime
+
+    def add(self, features: List[float], target: float, weight: float = 1.0):
+        """Inserts one sample in O(1) (biased reservoir sampling within its stratum)."""
+        key = self._stratum(features)
+        reservoir = self._reservoirs.get(key)
+        if reservoir is None:
+            reservoir = _Reservoir(self.stratum_capacity, self.features_dim)
+            self._reservoirs[key] = reservoir
+        reservoir.seen += 1
+        self.total_seen += 1
+
+        if reservoir.filled < reservoir.capacity:
+            slot = reservoir.filled
+            reservoir.filled += 1
+            self._size += 1
+        else:
+            if self._rng.random() >= self.replace_probability:
+                return  # Not admitted
+            slot = self._rng.randrange(reservoir.capacity)
+        reservoir.X[slot] = features
+        reservoir.y[slot] = target
+        reservoir.w[slot] = weight
+        reservoir.seq[slot] = self.total_seen
+
+    def age_out(self, recent_samples: int, min_keep: int = 0) -> int:
+        """
+        Drops the stored samples that arrived before the last `recent_samples` ones,
+        but keeps the newest `min_keep` overall. After a regime change this leaves
+        only post-change data to fit, and the emptied slots refill with new samples.
+
+        Returns:
+            int: Number of samples dropped.
+        """
+        reservoirs = [r for r in self._reservoirs.values() if r.filled]
+        if not reservoirs:
+            return 0
+        cutoff = self.total_seen - recent_samples  # Samples up to this one are old
+        if min_keep > 0:
+            seqs = np.concatenate([r.seq[: r.filled] for r in reservoirs])
+            if len(seqs) <= min_keep:
+                return 0
+            newest = np.partition(seqs, len(seqs) - min_keep)[len(seqs) - min_keep]
+            cutoff = min(cutoff, int(newest) - 1)
+        dropped = 0
+        for r in reservoirs:
+            keep = r.seq[: r.filled] > cutoff
+            kept = int(keep.sum())
+            if kept == r.filled:
+                continue
+            for column in (r.X, r.y, r.w, r.seq):
+                column[:kept] = column[: r.filled][keep]
+            dropped += r.filled - kept
+            r.filled = kept
+        self._size -= dropped
+        self.samples_aged_out += dropped
+        return dropped
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns (X, y, weights) over all strata; size is bounded by total_capacity.
+        The weights are the probe weights times each stratum's balance factor.
+        """
+        reservoirs = [r for r in self._reservoirs.values() if r.filled]
+        if not reservoirs:
+            return (
+                np.empty((0, self.features_dim)),
+                np.empty(0),
+                np.empty(0),
+            )
+        return (
+            np.concatenate([r.X[: r.filled] for r in reservoirs]),
+            np.concatenate([r.y[: r.filled] for r in reservoirs]),
+            np.concatenate([r.w[: r.filled] * self._balance(r) for r in reservoirs]),
+        )
+
+    def _balance(self, reservoir: _Reservoir) -> float:
+        return min(reservoir.capacity / reservoir.filled, self.max_balance_weight)
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "stored": self._size,
+            "seen": self.total_seen,
+            "strata": len(self._reservoirs),
+            "full_strata": sum(
+                1 for r in self._reservoirs.values() if r.filled == r.capacity
+            ),
+            "aged_out": self.samples_aged_out,
+        }
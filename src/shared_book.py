@@ -0,0 +1,294 @@
+# src/shared_book.py
+"""
+Order book in shared memory: one writer process, readers in other processes.
+
+A `multiprocessing.shared_memory` segment holds a small header and two book
+buffers (double buffering). Each buffer has the book at a fixed depth as a
+(2, depth, 2) float64 block, laid out like a BookSnapshot block (see
+book_snapshot_store.py: asks ascending then bids descending, NaN-price
+padding), plus the version, timestamps and arrival time of that book.
+
+Publishing writes the inactive buffer and then flips `active`, so a reader
+never waits for the writer. Every buffer carries a sequence counter (seqlock):
+the writer makes it odd before touching the buffer and even again afterwards.
+A reader notes the counter of the active buffer, reads, and checks that the
+counter is unchanged and even; otherwise the writer lapped it (published twice
+during the read) and the read is retried. Plain loads/stores are enough on x86
+(stores are not reordered with stores, nor loads with loads); NumPy writes every
+8-byte field with a single aligned store. Weaker memory models (ARM, e.g. Apple
+Silicon) can reorder them, and NumPy offers no fences, so a torn book could pass
+the check there: SEQLOCK_SUPPORTED is False on those platforms, and
+IngestProcess refuses to start.
+
+`SharedBookReader.read(copy=False)` returns zero-copy NumPy views into the
+segment; they stay consistent only until the writer laps the reader, which
+`SharedBookSnapshot.is_consistent()` re-checks. `copy=True` (the default)
+copies the levels inside the seqlock window, a single memcpy of the block, for
+consumers that keep the book for longer, like the compute worker.
+"""
+
+import logging
+import os
+import platform
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from .book_snapshot_store import BookSnapshot, snapshot_block
+from .config import SHARED_BOOK_DEPTH, SHARED_BOOK_READ_RETRIES
+
+logger = logging.getLogger(__name__)
+
+SHARED_BOOK_MAGIC = 0x4B4F4F4232485351  # Identifies a segment created by SharedBook
+_HEADER_BYTES = 64  # The buffers start on a cache line
+# The seqlock relies on x86's ordering of plain loads and stores (see above)
+SEQLOCK_SUPPORTED = platform.machine().lower() in (
+    "x86_64",
+    "amd64",
+    "i386",
+    "i686",
+    "x86",
+)
+
+_HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "<u8"),
+        ("depth", "<i8"),
+        ("active", "<i8"),  # Buffer holding the newest book
+        ("version", "<i8"),  # Version of the newest book; 0 before the first
+        ("writer_pid", "<i8"),
+    ],
+    align=True,
+)
+
+
+def _buffer_dtype(depth: int) -> np.dtype:
+    return np.dtype(
+        [
+            ("seq", "<u8"),  # Odd while the writer is filling the buffer
+            ("version", "<i8"),
+            (
+                "arrival_perf",
+                "<f8",
+            ),  # perf_counter() of the newest message (system-wide)
+            ("exchange_time", "<f8"),  # NaN if unknown
+            ("local_exchange_time", "<f8"),  # NaN if unknown
+            ("timestamp", "S64"),
+            ("symbol", "S32"),
+            ("exchange", "S32"),
+            ("levels", "<f8", (2, depth, 2)),
+        ],
+        align=True,
+    )
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+class SharedBook:
+    """The shared memory segment and NumPy views of its header and buffers."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((1,), dtype=_HEADER_DTYPE, buffer=shm.buf)
+        if owner:
+            self.header["magic"] = SHARED_BOOK_MAGIC
+        elif self.header["magic"][0] != SHARED_BOOK_MAGIC:
+            raise ValueError(f"Shared memory {shm.name} does not hold a shared book.")
+        self.depth = int(self.header["depth"][0])
+        self.buffers = np.ndarray(
+            (2,), dtype=_buffer_dtype(self.depth), buffer=shm.buf, offset=_HEADER_BYTES
+        )
+
+    @classmethod
+    def create(
+        cls, depth: int = SHARED_BOOK_DEPTH, name: Optional[str] = None
+    ) -> "SharedBook":
+        """Creates a new segment (unlinked again by `close()`)."""
+        size = _HEADER_BYTES + 2 * _buffer_dtype(depth).itemsize
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((1,), dtype=_HEADER_DTYPE, buffer=shm.buf)
+        header[0] = (0, depth, 0, 0, 0)
+        del header  # Views must be gone before the segment can be closed
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedBook":
+        """Opens a segment created by another process."""
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def close(self):
+        """Drops the views and closes the segment; the creator also removes it."""
+        self.header = self.buffers = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A zero-copy SharedBookSnapshot is still alive; the OS frees the mapping
+            # when the process exits
+            logger.warning(f"Shared book {self.shm.name} still in use at close.")
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class SharedBookWriter:
+    """Publishes book versions into a SharedBook; used by a single process."""
+
+    def __init__(self, shared: SharedBook):
+        self.shared = shared
+        self.shared.header["writer_pid"] = os.getpid()
+
+        # --- Metrics ---
+        self.published = 0
+        self.levels_truncated = 0  # Books deeper than the segment, cut to its depth
+
+    def publish(self, book_manager, arrival_perf: Optional[float] = None):
+        """Writes the book (an OrderBookManager) into the inactive buffer and flips to it."""
+        shared = self.shared
+        header = shared.header
+        b = 1 - int(header["active"][0])
+        buffers = shared.buffers
+        seq = int(buffers["seq"][b])
+        buffers["seq"][b] = seq + 1  # Odd: readers of this buffer retry
+        version = int(header["version"][0]) + 1
+        buffers["version"][b] = version
+        buffers["arrival_perf"][b] = (
+            arrival_perf if arrival_perf is not None else np.nan
+        )
+        for field in ("exchange_time", "local_exchange_time"):
+            value = getattr(book_manager, field)
+            buffers[field][b] = value if value is not None else np.nan
+        for field in ("timestamp", "symbol", "exchange"):
+            buffers[field][b] = str(getattr(book_manager, field)).encode()
+        snapshot_block(
+            book_manager.asks, book_manager.bids, shared.depth, out=buffers["levels"][b]
+        )
+        buffers["seq"][b] = seq + 2
+        header["active"] = b
+        header["version"] = version
+        self.published += 1
+        if max(len(book_manager.asks), len(book_manager.bids)) > shared.depth:
+            self.levels_truncated += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "published": self.published,
+            "levels_truncated": self.levels_truncated,
+        }
+
+
+class SharedBookSnapshot(BookSnapshot):
+    """
+    A book read from a SharedBook. Duck-types OrderBookManager like BookSnapshot
+    does, plus `symbol`, `exchange`, the exchange times and `snapshot()`.
+    """
+
+    def __init__(
+        self,
+        levels: np.ndarray,
+        version: int,
+        timestamp: str,
+        symbol: str,
+        exchange: str,
+        exchange_time: Optional[float],
+        local_exchange_time: Optional[float],
+        arrival_perf: Optional[float],
+        reader: Optional["SharedBookReader"] = None,
+        buffer_index: int = 0,
+        seq: int = 0,
+    ):
+        super().__init__(timestamp, levels, version)
+        self.symbol = symbol
+        self.exchange = exchange
+        self.exchange_time = exchange_time
+        self.local_exchange_time = local_exchange_time
+        self.arrival_perf = arrival_perf
+        # Set for zero-copy snapshots only: the buffer and counter they were read at
+        self._reader = reader
+        self._buffer_index = buffer_index
+        self._seq = seq
+
+    def is_consistent(self) -> bool:
+        """False once the writer has started overwriting a zero-copy snapshot's buffer."""
+        if self._reader is None:
+            return True
+        return self._reader.seq(self._buffer_index) == self._seq
+
+    def snapshot(self) -> "SharedBookSnapshot":
+        return self  # Already a read-only copy (or view)
+
+
+class SharedBookReader:
+    def __init__(self, shared: SharedBook, max_retries: int = SHARED_BOOK_READ_RETRIES):
+        self.shared = shared
+        self.max_retries = max_retries
+
+        # --- Metrics ---
+        self.reads = 0
+        self.retries = 0  # Torn reads (writer lapped the reader), read again
+        self.failed_reads = 0  # Still torn after max_retries
+
+    @property
+    def version(self) -> int:
+        """Version of the newest published book; 0 before the first."""
+        return int(self.shared.header["version"][0])
+
+    def seq(self, buffer_index: int) -> int:
+        return int(self.shared.buffers["seq"][buffer_index])
+
+    def read(self, copy: bool = True) -> Optional[SharedBookSnapshot]:
+        """
+        The newest published book, or None if there is none yet (or every attempt
+        was torn). With `copy=False` the levels are views into shared memory.
+        """
+        header = self.shared.header
+        buffers = self.shared.buffers
+        for _ in range(self.max_retries):
+            b = int(header["active"][0])
+            seq = int(buffers["seq"][b])
+            if seq & 1:
+                self.retries += 1  # Being rewritten: `active` has moved on meanwhile
+                continue
+            version = int(buffers["version"][b])
+            if version == 0:
+                return None
+            levels = buffers["levels"][b]
+            if copy:
+                levels = levels.copy()
+            fields = buffers[b]
+            book = SharedBookSnapshot(
+                levels,
+                version,
+                fields["timestamp"].decode(),
+                fields["symbol"].decode(),
+                fields["exchange"].decode(),
+                _optional(fields["exchange_time"]),
+                _optional(fields["local_exchange_time"]),
+                _optional(fields["arrival_perf"]),
+                reader=None if copy else self,
+                buffer_index=b,
+                seq=seq,
+            )
+            if int(buffers["seq"][b]) != seq:
+                self.retries += 1
+                continue
+            self.reads += 1
+            return book
+        self.failed_reads += 1
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "reads": self.reads,
+            "retries": self.retries,
+            "failed_reads": self.failed_reads,
+        }
@@ -0,0 +1,255 @@
+# src/synthetic_feed_server.py
+"""
+Local stand-in for the L2 WebSocket feed, for load and latency testing.
+
+Serves synthetic order books (random-walk mid price, randomized depth) or a
+replay of recorded messages (see FeedRecorder) in the same JSON schema as the
+GoQuant endpoint: exchange, symbol, timestamp, asks, bids. Message rate, book
+depth, burstiness and disconnect injection are configurable.
+
+    python -m src.synthetic_feed_server --rate 1000 --depth 400 --burst-size 10
+    python -m src.main_app --ws-url ws://localhost:8765
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import websockets
+
+from .config import (
+    SYNTHETIC_FEED_HOST,
+    SYNTHETIC_FEED_PORT,
+    SYNTHETIC_FEED_RATE_HZ,
+    SYNTHETIC_FEED_DEPTH,
+    SYNTHETIC_FEED_BURST_SIZE,
+    SYNTHETIC_FEED_START_MID_PRICE,
+    SYNTHETIC_FEED_TICK_SIZE,
+    SYNTHETIC_FEED_VOLATILITY_BPS,
+    SYNTHETIC_FEED_SEED,
+)
+from .websocket_handler import read_recorded_feed
+
+logger = logging.getLogger(__name__)
+
+_LEVEL_GAP_TICKS = np.array([1, 1, 1, 2, 3])
+
+
+class SyntheticBookGenerator:
+    """Random-walk L2 snapshots with a 1-tick spread most of the time and noisy depth."""
+
+    def __init__(
+        self,
+        symbol: str = "BTC-USDT-SWAP",
+        exchange: str = "OKX",
+        depth: int = SYNTHETIC_FEED_DEPTH,
+        mid_price: float = SYNTHETIC_FEED_START_MID_PRICE,
+        tick_size: float = SYNTHETIC_FEED_TICK_SIZE,
+        volatility_bps: float = SYNTHETIC_FEED_VOLATILITY_BPS,
+        seed: int = SYNTHETIC_FEED_SEED,
+    ):
+        self.symbol = symbol
+        self.exchange = exchange
+        self.depth = depth
+        self.mid_price = mid_price
+        self.tick_size = tick_size
+        self.volatility_bps = volatility_bps
+        self._rng = np.random.default_rng(seed)
+        self._decimals = max(0, -int(math.floor(math.log10(tick_size))))
+
+    def next_book(self, wall_time: Optional[float] = None) -> Dict[str, Any]:
+        rng = self._rng
+        self.mid_price *= math.exp(rng.normal(0.0, self.volatility_bps / 10000))
+        # Mostly a 1-tick spread, occasionally wider (thin-book moments)
+        spread_ticks = 1 if rng.random() < 0.9 else int(rng.integers(2, 11))
+        best_bid = math.floor(self.mid_price / self.tick_size) * self.tick_size
+        best_ask = best_bid + spread_ticks * self.tick_size
+        level_index = np.arange(self.depth)
+
+        def side(best: float, direction: int) -> List[List[str]]:
+            # Gaps of 1-3 ticks between levels; size grows away from the touch, heavy-tailed
+            gaps = rng.choice(_LEVEL_GAP_TICKS, self.depth)
+            gaps[0] = 0
+            prices = best + direction * self.tick_size * np.cumsum(gaps)
+            qtys = np.maximum(
+                rng.lognormal(0.0, 1.0, self.depth) * (1 + level_index / 10), 0.001
+            )
+            price_fmt = f"{{:.{self._decimals}f}}"
+            return [
+                [price_fmt.format(price), f"{qty:.3f}"]
+                for price, qty in zip(prices.tolist(), qtys.tolist())
+            ]
+
+        wall_time = time.time() if wall_time is None else wall_time
+        return {
+            "timestamp": datetime.fromtimestamp(wall_time, tz=timezone.utc)
+            .isoformat(timespec="milliseconds")
+            .replace("+00:00", "Z"),
+            "exchange": self.exchange,
+            "symbol": self.symbol,
+            "asks": side(best_ask, +1),
+            "bids": side(best_bid, -1),
+        }
+
+
+class SyntheticFeedServer:
+    def __init__(
+        self,
+        host: str = SYNTHETIC_FEED_HOST,
+        port: int = SYNTHETIC_FEED_PORT,
+        rate_hz: float = SYNTHETIC_FEED_RATE_HZ,
+        depth: int = SYNTHETIC_FEED_DEPTH,
+        burst_size: int = SYNTHETIC_FEED_BURST_SIZE,
+        disconnect_after_messages: int = 0,
+        disconnect_code: int = 1011,
+        replay_dir: Optional[str] = None,
+        replay_speed: float = 0.0,
+        seed: int = SYNTHETIC_FEED_SEED,
+    ):
+        """
+        Args:
+            host (str), port (int): Where to listen.
+            rate_hz (float): Average messages per second sent to each client.
+            depth (int): Levels per side of synthetic books.
+            burst_size (int): Messages sent back-to-back per burst; bursts are spaced so the
+                average rate stays `rate_hz`.
+            disconnect_after_messages (int): Close each connection after this many messages
+                (0 = never), to exercise reconnect handling.
+            disconnect_code (int): Close code used for injected disconnects (1000 = clean).
+            replay_dir (Optional[str]): Serve recorded messages from this FeedRecorder
+                directory instead of synthetic books.
+            replay_speed (float): For replays, pace by recorded arrival times at this speed
+                multiplier; 0 uses `rate_hz` instead.
+            seed (int): Seed for synthetic books; each connection gets its own stream.
+        """
+        if rate_hz <= 0 or burst_size < 1:
+            raise ValueError("rate_hz must be > 0 and burst_size >= 1")
+        self.host = host
+        self.port = port
+        self.rate_hz = rate_hz
+        self.depth = depth
+        self.burst_size = burst_size
+        self.disconnect_after_messages = disconnect_after_messages
+        self.disconnect_code = disconnect_code
+        self.replay_dir = replay_dir
+        self.replay_speed = replay_speed
+        self.seed = seed
+        self._connections = 0
+
+        # --- Counters ---
+        self.messages_sent = 0
+        self.disconnects_injected = 0
+
+    def _messages(self, connection_id: int) -> Iterator[Any]:
+        """Yields (due offset in seconds or None, raw JSON message)."""
+        if self.replay_dir:
+            first_wall = None
+            for wall_time, _, message in read_recorded_feed(self.replay_dir):
+                first_wall = wall_time if first_wall is None else first_wall
+                due = (
+                    (wall_time - first_wall) / self.replay_speed
+                    if self.replay_speed > 0
+                    else None
+                )
+                yield due, message
+            return
+        generator = SyntheticBookGenerator(
+            depth=self.depth, seed=self.seed + connection_id
+        )
+        while True:
+            yield None, json.dumps(generator.next_book())
+
+    async def _handle(self, websocket):
+        self._connections += 1
+        connection_id = self._connections
+        logger.info(f"Client {connection_id} connected from {websocket.remote_address}")
+        sent = 0
+        start = time.monotonic()
+        try:
+            for due, message in self._messages(connection_id):
+                if due is None:
+                    # Bursts of burst_size messages, spaced to keep the average rate
+                    due = (sent // self.burst_size) * self.burst_size / self.rate_hz
+                delay = start + due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await websocket.send(message)
+                sent += 1
+                self.messages_sent += 1
+                if self.disconnect_after_messages and (
+                    sent >= self.disconnect_after_messages
+                ):
+                    self.disconnects_injected += 1
+                    logger.info(
+                        f"Injecting disconnect (code {self.disconnect_code}) for client {connection_id} after {sent} messages."
+                    )
+                    await websocket.close(
+                        code=self.disconnect_code, reason="injected disconnect"
+                    )
+                    return
+            await websocket.close(code=1000, reason="replay finished")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            elapsed = time.monotonic() - start
+            logger.info(
+                f"Client {connection_id} done: {sent} messages in {elapsed:.1f}s "
+                f"({sent / elapsed if elapsed > 0 else 0:.0f} msg/s)"
+            )
+
+    async def serve_forever(self):
+        async with websockets.serve(self._handle, self.host, self.port):
+            logger.info(
+                f"Synthetic L2 feed on ws://{self.host}:{self.port} "
+                f"({'replay of ' + self.replay_dir if self.replay_dir else 'synthetic'}, "
+                f"{self.rate_hz} msg/s, depth {self.depth}, burst {self.burst_size})"
+            )
+            await asyncio.Future()  # Run until cancelled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local synthetic L2 WebSocket feed.")
+    parser.add_argument("--host", default=SYNTHETIC_FEED_HOST)
+    parser.add_argument("--port", type=int, default=SYNTHETIC_FEED_PORT)
+    parser.add_argument("--rate", type=float, default=SYNTHETIC_FEED_RATE_HZ)
+    parser.add_argument("--depth", type=int, default=SYNTHETIC_FEED_DEPTH)
+    parser.add_argument("--burst-size", type=int, default=SYNTHETIC_FEED_BURST_SIZE)
+    parser.add_argument("--disconnect-after", type=int, default=0)
+    parser.add_argument("--disconnect-code", type=int, default=1011)
+    parser.add_argument("--replay-dir", help="Serve a FeedRecorder recording.")
+    parser.add_argument("--replay-speed", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=SYNTHETIC_FEED_SEED)
+    args = parser.parse_args()
+
+    server = SyntheticFeedServer(
+        host=args.host,
+        port=args.port,
+        rate_hz=args.rate,
+        depth=args.depth,
+        burst_size=args.burst_size,
+        disconnect_after_messages=args.disconnect_after,
+        disconnect_code=args.disconnect_code,
+        replay_dir=args.replay_dir,
+        replay_speed=args.replay_speed,
+        seed=args.seed,
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        logger.info(
+            f"Stopped. Sent {server.messages_sent} messages, injected {server.disconnects_injected} disconnects."
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - [%(name)s] - %(message)s",
+    )
+    main()
@@ -0,0 +1,89 @@
+# src/ui_conflator.py
+"""
+Latest-wins, frame-rate-limited delivery of updates to the Tk main thread.
+
+Producers on any thread `offer()` updates. Only the newest undelivered update is
+kept (older ones are conflated: dropped and counted), and at most one render
+callback is scheduled on the Tk event queue at a time, no sooner than
+1 / max_fps after the previous render. However fast the feed runs, Tk renders
+at most max_fps times per second and always renders the freshest data.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .config import UI_MAX_FPS
+
+
+class UpdateConflator:
+    def __init__(
+        self,
+        schedule: Callable[..., Any],
+        render: Callable[[Any], None],
+        max_fps: float = UI_MAX_FPS,
+    ):
+        """
+        Args:
+            schedule (Callable): Tk's `after(ms, func)`; used to run renders on the main thread.
+            render (Callable): Called on the main thread with the newest update.
+            max_fps (float): Maximum renders per second (<= 0: no limit).
+        """
+        self._schedule = schedule
+        self._render = render
+        self.min_interval_s = 1.0 / max_fps if max_fps > 0 else 0.0
+        self._lock = threading.Lock()
+        self._pending: Optional[Any] = None
+        self._has_pending = False
+        self._scheduled = False
+        self._last_render = -float("inf")
+
+        # --- Metrics ---
+        self.offered = 0
+        self.rendered = 0
+        self.conflated = 0  # Updates replaced by a newer one before being rendered
+
+    def set_max_fps(self, max_fps: float):
+        """Changes the render rate limit from the next scheduled render on. Any thread."""
+        with self._lock:
+            self.min_interval_s = 1.0 / max_fps if max_fps > 0 else 0.0
+
+    def offer(self, update: Any):
+        """Queues `update` for rendering, replacing any update not yet rendered. Any thread."""
+        with self._lock:
+            self.offered += 1
+            if self._has_pending:
+                self.conflated += 1
+            self._pending = update
+            self._has_pending = True
+            if self._scheduled:
+                return
+            self._scheduled = True
+            delay_s = self._last_render + self.min_interval_s - time.monotonic()
+        self._schedule(int(max(0.0, delay_s) * 1000), self._flush)
+
+    def _flush(self):
+        with self._lock:
+            update = self._pending
+            has_update = self._has_pending
+            self._pending = None
+            self._has_pending = False
+            self._last_render = time.monotonic()
+        try:
+            if has_update:
+                self.rendered += 1
+                self._render(update)
+        finally:
+            with self._lock:
+                # Anything offered during the render goes out one frame later
+                reschedule = self._has_pending
+                self._scheduled = reschedule
+            if reschedule:
+                self._schedule(int(self.min_interval_s * 1000), self._flush)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "offered": self.offered,
+            "rendered": self.rendered,
+            "conflated": self.conflated,
+        }
@@ -0,0 +1,40 @@
+# src/utils.py
+"""
+Small shared helpers that do not belong to a specific model or UI module.
+"""
+
+import csv
+import logging
+import os
+import time
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_csv_header(file_path: str, header: List[str]):
+    """
+    Makes sure `file_path` exists and starts with `header`.
+
+    A missing or empty file gets the header written. If the file already exists with a
+    different header (e.g. a log from an older version with other columns), it is moved
+    aside to `<name>.<YYYYmmdd-HHMMSS><ext>` instead of appending rows of a different
+    width to it, and a fresh file is started.
+
+    Args:
+        file_path (str): Path of the CSV log file.
+        header (List[str]): Expected column names.
+    """
+    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+        with open(file_path, "r", newline="") as f:
+            existing_header = next(csv.reader(f), [])
+        if existing_header == list(header):
+            return
+        root, ext = os.path.splitext(file_path)
+        archived_path = f"{root}.{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+        os.replace(file_path, archived_path)
+        logger.warning(
+            f"{file_path} had an outdated header {existing_header}. Archived to {archived_path}."
+        )
+    with open(file_path, "w", newline="") as f:
+        csv.writer(f).writerow(header)
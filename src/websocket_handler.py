@@ -1,27 +1,503 @@
 import asyncio
 import websockets
+import bisect
+import glob
+import gzip
 import json
 import logging
+import os
 import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .config import (
+    FEED_RECORD_DIR,
+    FEED_RECORD_SEGMENT_MAX_BYTES,
+    FEED_RECORD_SEGMENT_MAX_AGE_S,
+    FEED_RECORD_INDEX_BLOCK_MESSAGES,
+    FEED_RECORD_INDEX_BLOCK_MAX_AGE_S,
+    FEED_RECORD_QUEUE_MAX_MESSAGES,
+    FEED_INGEST_CONFLATE,
+    WS_PING_INTERVAL_S,
+    WS_PING_TIMEOUT_S,
+    WS_OPEN_TIMEOUT_S,
+    WS_DATA_TIMEOUT_S,
+)
+from .log_writer import BufferedLogWriter
 
 logger = logging.getLogger(__name__)
 
-WEBSOCKET_URL = "wss://ws.gomarket-cpp.goquant.io/ws/l2-orderbook/okx/BTC-USDT-SWAP"
+DEFAULT_WEBSOCKET_URL = (
+    "wss://ws.gomarket-cpp.goquant.io/ws/l2-orderbook/okx/BTC-USDT-SWAP"
+)
+# Override to point at another feed, e.g. the local synthetic server (src/synthetic_feed_server.py)
+WEBSOCKET_URL = os.environ.get("TRADE_SIM_WEBSOCKET_URL", DEFAULT_WEBSOCKET_URL)
+
+
+# --- Raw Feed Recording ---
+# Segment files hold one record per line, "<wall time>\t<perf_counter>\t<raw message>",
+# gzip-compressed in independent members (blocks). The sidecar .idx lists every block's
+# time range and byte range, so a window is read by seeking straight to its blocks.
+FEED_SEGMENT_SUFFIX = ".tsv.gz"
+FEED_INDEX_SUFFIX = ".idx"
+FEED_INDEX_HEADER = (
+    "first_wall\tlast_wall\tfirst_perf\tlast_perf\toffset\tlength\tmessages\n"
+)
+
+
+class FeedIndexEntry(NamedTuple):
+    first_wall: float
+    last_wall: float
+    first_perf: float
+    last_perf: float
+    offset: int
+    length: int
+    messages: int
+
+
+class FeedSegmentSink:
+    """
+    Log sink (see BufferedLogWriter) writing raw feed records to rotating gzip
+    segments with a sidecar time index. Runs on the recorder's writer thread.
+    """
+
+    def __init__(
+        self,
+        directory: str = FEED_RECORD_DIR,
+        segment_max_bytes: int = FEED_RECORD_SEGMENT_MAX_BYTES,
+        segment_max_age_s: float = FEED_RECORD_SEGMENT_MAX_AGE_S,
+        block_messages: int = FEED_RECORD_INDEX_BLOCK_MESSAGES,
+    ):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age_s = segment_max_age_s
+        self.block_messages = block_messages
+        self._run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._segment_seq = 0
+        self._segment_file = None
+        self._index_file = None
+        self._segment_opened = 0.0
+        self._block: List[str] = []
+        self._block_first: Optional[Tuple[float, float]] = None
+        self._block_last: Optional[Tuple[float, float]] = None
+
+        # --- Metrics ---
+        self.segments_opened = 0
+        self.blocks_written = 0
+        self.bytes_compressed = 0
+
+    def write_rows(self, rows: List[Tuple[float, float, object]]):
+        for wall_time, perf_time, message in rows:
+            if isinstance(message, bytes):
+                message = message.decode("utf-8", errors="replace")
+            if self._block_first is None:
+                self._block_first = (wall_time, perf_time)
+            self._block_last = (wall_time, perf_time)
+            # Raw newlines in a JSON message can only be whitespace, so one record per line is lossless
+            self._block.append(
+                f"{wall_time:.6f}\t{perf_time:.9f}\t"
+                f"{message.replace(chr(13), ' ').replace(chr(10), ' ')}\n"
+            )
+            if len(self._block) >= self.block_messages:
+                self._write_block()
 
+    def flush(self):
+        self._write_block()
 
-async def connect_and_listen(book_manager, ui_update_callback=None):
+    def close(self):
+        self._write_block()
+        self._close_segment()
+
+    def _open_segment(self):
+        self._close_segment()
+        self._segment_seq += 1
+        base = os.path.join(
+            self.directory, f"feed-{self._run_id}-{self._segment_seq:05d}"
+        )
+        self._segment_file = open(base + FEED_SEGMENT_SUFFIX, "ab")
+        self._index_file = open(base + FEED_INDEX_SUFFIX, "a")
+        if self._index_file.tell() == 0:
+            self._index_file.write(FEED_INDEX_HEADER)
+        self._segment_opened = time.monotonic()
+        self.segments_opened += 1
+
+    def _close_segment(self):
+        for f in (self._segment_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._segment_file = None
+        self._index_file = None
+
+    def _write_block(self):
+        if not self._block:
+            return
+        if (
+            self._segment_file is None
+            or self._segment_file.tell() >= self.segment_max_bytes
+            or time.monotonic() - self._segment_opened >= self.segment_max_age_s
+        ):
+            self._open_segment()
+        compressed = gzip.compress("".join(self._block).encode("utf-8"))
+        offset = self._segment_file.tell()
+        self._segment_file.write(compressed)
+        self._segment_file.flush()
+        # Index entry only after its block is on disk, so readers never see a partial block
+        entry = FeedIndexEntry(
+            self._block_first[0],
+            self._block_last[0],
+            self._block_first[1],
+            self._block_last[1],
+            offset,
+            len(compressed),
+            len(self._block),
+        )
+        self._index_file.write(
+            f"{entry.first_wall:.6f}\t{entry.last_wall:.6f}\t{entry.first_perf:.9f}\t"
+            f"{entry.last_perf:.9f}\t{entry.offset}\t{entry.length}\t{entry.messages}\n"
+        )
+        self._index_file.flush()
+        self.blocks_written += 1
+        self.bytes_compressed += len(compressed)
+        self._block = []
+        self._block_first = None
+        self._block_last = None
+
+
+class FeedRecorder(BufferedLogWriter):
+    """
+    Records every raw WebSocket message with its arrival timestamps.
+
+    `record()` only enqueues (never blocks, drops are counted); compression and
+    file I/O happen on the writer thread, off the ingest path.
+    """
+
+    def __init__(
+        self,
+        directory: str = FEED_RECORD_DIR,
+        segment_max_bytes: int = FEED_RECORD_SEGMENT_MAX_BYTES,
+        segment_max_age_s: float = FEED_RECORD_SEGMENT_MAX_AGE_S,
+        block_messages: int = FEED_RECORD_INDEX_BLOCK_MESSAGES,
+        block_max_age_s: float = FEED_RECORD_INDEX_BLOCK_MAX_AGE_S,
+        max_queue_messages: int = FEED_RECORD_QUEUE_MAX_MESSAGES,
+    ):
+        super().__init__(
+            FeedSegmentSink(
+                directory, segment_max_bytes, segment_max_age_s, block_messages
+            ),
+            name=f"FeedRecorder-{directory}",
+            max_queue_rows=max_queue_messages,
+            flush_batch_rows=block_messages,
+            flush_interval_s=block_max_age_s,
+        )
+        self.directory = directory
+
+    def record(self, message, perf_time: float, wall_time: float) -> bool:
+        return self.write_row((wall_time, perf_time, message))
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats.update(
+            segments_opened=self.sink.segments_opened,
+            blocks_written=self.sink.blocks_written,
+            bytes_compressed=self.sink.bytes_compressed,
+        )
+        return stats
+
+
+def list_feed_segments(directory: str = FEED_RECORD_DIR) -> List[str]:
+    """Segment files in recording order (names start with the run's start time)."""
+    return sorted(glob.glob(os.path.join(directory, f"feed-*{FEED_SEGMENT_SUFFIX}")))
+
+
+def read_feed_index(segment_path: str) -> List[FeedIndexEntry]:
+    index_path = segment_path[: -len(FEED_SEGMENT_SUFFIX)] + FEED_INDEX_SUFFIX
+    entries = []
+    if not os.path.exists(index_path):
+        return entries
+    with open(index_path) as f:
+        next(f, None)  # Header
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) != len(FeedIndexEntry._fields):
+                continue  # Torn last line after a crash
+            entries.append(
+                FeedIndexEntry(
+                    *(float(p) for p in parts[:4]), *(int(p) for p in parts[4:])
+                )
+            )
+    return entries
+
+
+def read_recorded_feed(
+    directory: str = FEED_RECORD_DIR,
+    start_wall: Optional[float] = None,
+    end_wall: Optional[float] = None,
+) -> Iterator[Tuple[float, float, str]]:
+    """
+    Yields (wall_time, perf_counter_time, raw_message) for recorded messages with
+    start_wall <= wall_time <= end_wall, in recording order. Only the blocks that
+    overlap the window are read and decompressed.
+    """
+    start_wall = float("-inf") if start_wall is None else start_wall
+    end_wall = float("inf") if end_wall is None else end_wall
+    for segment_path in list_feed_segments(directory):
+        index = read_feed_index(segment_path)
+        if not index or index[-1].last_wall < start_wall:
+            continue
+        if index[0].first_wall > end_wall:
+            return
+        # Blocks are in time order; jump to the first one that can overlap the window
+        last_walls = [entry.last_wall for entry in index]
+        first_block = bisect.bisect_left(last_walls, start_wall)
+        with open(segment_path, "rb") as f:
+            for entry in index[first_block:]:
+                if entry.first_wall > end_wall:
+                    return
+                f.seek(entry.offset)
+                block = gzip.decompress(f.read(entry.length)).decode("utf-8")
+                for line in block.splitlines():
+                    wall_s, perf_s, message = line.split("\t", 2)
+                    wall_time = float(wall_s)
+                    if wall_time < start_wall:
+                        continue
+                    if wall_time > end_wall:
+                        return
+                    yield wall_time, float(perf_s), message
+
+
+# --- Feed Ingest ---
+# Messages with one of these "action" values carry changed levels only (quantity 0 =
+# remove the level); anything else is a full book snapshot
+DELTA_ACTIONS = ("update",)
+
+
+class IngestStats:
+    """
+    Message counters of connect_and_listen: received, applied to the book, and
+    skipped (superseded by a newer snapshot in the same batch, or undecodable).
+    Totals plus the rates over the last complete window of at least a second.
+    Updated on the WebSocket thread; readable from any thread.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.applied = 0
+        self.skipped = 0
+        self.batches = 0
+        self.max_batch = 0
+        self._window_start = time.monotonic()
+        self._window = (0, 0, 0)
+        self._last_rates = (0.0, 0.0, 0.0)
+
+    def on_batch(self, received: int, applied: int, skipped: int):
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            # The window closes at the first batch after a second, so it can be much
+            # longer than one (a quiet feed): counts are divided by its real length
+            self._last_rates = tuple(count / elapsed for count in self._window)
+            self._window = (0, 0, 0)
+            self._window_start = now
+        r, a, s = self._window
+        self._window = (r + received, a + applied, s + skipped)
+        self.received += received
+        self.applied += applied
+        self.skipped += skipped
+        self.batches += 1
+        self.max_batch = max(self.max_batch, received)
+
+    def per_second(self) -> Tuple[float, float, float]:
+        """(received, applied, skipped) per second over the last complete window."""
+        if time.monotonic() - self._window_start >= 2.0:
+            return (0.0, 0.0, 0.0)  # Feed went quiet
+        return self._last_rates
+
+    def get_stats(self) -> Dict[str, Any]:
+        received_ps, applied_ps, skipped_ps = self.per_second()
+        return {
+            "received": self.received,
+            "applied": self.applied,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "max_batch": self.max_batch,
+            "received_per_s": received_ps,
+            "applied_per_s": applied_ps,
+            "skipped_per_s": skipped_ps,
+        }
+
+
+def apply_message_batch(
+    book_manager, messages: List[Any], latency=None, require_snapshot: bool = False
+) -> Tuple[int, int]:
+    """
+    Brings the book up to date with a batch of raw messages (oldest first) and
+    returns (applied, skipped). Messages are decoded newest first, stopping at the
+    newest full snapshot: it is applied followed by the deltas received after it,
+    and everything older is skipped without being decoded. Without a snapshot in
+    the batch, all deltas are applied on top of the current book, as one version.
+    With `require_snapshot` (e.g. right after a reconnect) deltas are skipped unless
+    a snapshot precedes them. If a LatencyRecorder is given, decoding and the book
+    update are timed.
+    """
+    start = time.perf_counter()
+    deltas: List[Dict[str, Any]] = []
+    snapshot = None
+    skipped = 0
+    for position in range(len(messages) - 1, -1, -1):
+        try:
+            data = json.loads(messages[position])
+        except json.JSONDecodeError:
+            logger.error(f"Could not decode JSON: {messages[position]}")
+            skipped += 1
+            continue
+        if data.get("action") in DELTA_ACTIONS:
+            deltas.append(data)
+        else:
+            snapshot = data
+            skipped += position  # Superseded by this snapshot
+            break
+    decoded = time.perf_counter()
+    if snapshot is None and require_snapshot:
+        return 0, skipped + len(deltas)
+    if snapshot is not None:
+        book_manager.update_book(snapshot)
+    deltas.reverse()
+    book_manager.apply_deltas(deltas)
+    if latency is not None:
+        latency.record("decode", (decoded - start) * 1000)
+        latency.record("book_update", (time.perf_counter() - decoded) * 1000)
+    return len(deltas) + (snapshot is not None), skipped
+
+
+class _Ingest:
+    """One connection's ingest path: record, apply, report (see connect_and_listen)."""
+
+    def __init__(
+        self,
+        book_manager,
+        ui_update_callback,
+        recorder,
+        stats: Optional[IngestStats],
+        latency,
+        feed_clock,
+        profiling,
+        supervisor,
+    ):
+        self.book_manager = book_manager
+        self.ui_update_callback = ui_update_callback
+        self.recorder = recorder
+        self.stats = stats
+        self.latency = latency
+        self.feed_clock = feed_clock
+        self.profiling = profiling
+        self.supervisor = supervisor
+        # Deltas only make sense on top of this connection's first snapshot
+        self.awaiting_snapshot = True
+
+    def arrived(self, message) -> Tuple[Any, float]:
+        # --- START: L1 (WS Message to Book Update) Latency Measurement ---
+        ws_msg_arrival_time = time.perf_counter()
+        if self.recorder is not None:
+            self.recorder.record(message, ws_msg_arrival_time, time.time())
+        return message, ws_msg_arrival_time
+
+    def apply(self, batch: List[Tuple[Any, float]]):
+        """Applies a batch of (message, arrival_perf) and reports the newest book once."""
+        book_manager = self.book_manager
+        messages = [message for message, _ in batch]
+        try:
+            if self.profiling is not None and self.profiling.enabled:
+                applied, skipped = self.profiling.run(
+                    "ingest",
+                    apply_message_batch,
+                    book_manager,
+                    messages,
+                    self.latency,
+                    self.awaiting_snapshot,
+                )
+            else:
+                applied, skipped = apply_message_batch(
+                    book_manager, messages, self.latency, self.awaiting_snapshot
+                )
+        except Exception as e:
+            logger.error(
+                f"Error processing message in connect_and_listen: {e}", exc_info=True
+            )
+            applied, skipped = 0, len(batch)
+        if applied:
+            self.awaiting_snapshot = False
+            if self.feed_clock is not None:
+                self.feed_clock.on_book(book_manager, batch[-1][1])
+            if self.supervisor is not None:
+                self.supervisor.on_book()
+        if self.stats is not None:
+            self.stats.on_batch(len(batch), applied, skipped)
+        # --- END: L1 Latency Measurement ---
+        if self.ui_update_callback:
+            if applied:
+                # The newest message is always among the applied ones
+                self.ui_update_callback(book_manager, "data_update", batch[-1][1])
+            elif not self.awaiting_snapshot:
+                self.ui_update_callback(book_manager, "data_error", None)
+
+
+async def connect_and_listen(
+    book_manager,
+    ui_update_callback=None,
+    recorder=None,
+    url=None,
+    stats: Optional[IngestStats] = None,
+    conflate: bool = FEED_INGEST_CONFLATE,
+    latency=None,
+    feed_clock=None,
+    profiling=None,
+    supervisor=None,
+):
     """
     Connects to the WebSocket server, listens for messages,
     updates the OrderBookManager, and calls the UI update callback.
+    If a FeedRecorder is given, every raw message is recorded with its arrival time.
+    `url` defaults to WEBSOCKET_URL.
+
+    With `conflate`, a receive task queues messages as they arrive and the ingest
+    loop drains the whole queue each time it gets to run, so a slow consumer costs
+    skipped snapshots instead of a growing backlog (see apply_message_batch).
+    Counts go to `stats` and decode/book update times to `latency` (a
+    LatencyRecorder) if given. A FeedClock stamps each applied book with its
+    exchange time. Batches are "ingest" ticks of `profiling` (ProfilingHooks).
+
+    Returns when the connection ends. Liveness: the server must answer pings every
+    WS_PING_INTERVAL_S within WS_PING_TIMEOUT_S, and send data at least every
+    WS_DATA_TIMEOUT_S; otherwise the connection is treated as dead. To reconnect
+    automatically, run it under connection_supervisor.run_supervised, which passes
+    its ConnectionSupervisor as `supervisor`.
     """
+    url = url or WEBSOCKET_URL
     websocket_client = None  # Define here to ensure it's in scope for finally
-    logger.info(f"Attempting to connect to WebSocket: {WEBSOCKET_URL}")
+    logger.info(f"Attempting to connect to WebSocket: {url}")
     connection_established = False
+    ingest = _Ingest(
+        book_manager,
+        ui_update_callback,
+        recorder,
+        stats,
+        latency,
+        feed_clock,
+        profiling,
+        supervisor,
+    )
     try:
-        async with websockets.connect(WEBSOCKET_URL, ping_interval=None) as ws:
+        async with websockets.connect(
+            url,
+            ping_interval=WS_PING_INTERVAL_S,
+            ping_timeout=WS_PING_TIMEOUT_S,
+            open_timeout=WS_OPEN_TIMEOUT_S,
+        ) as ws:
             websocket_client = ws  # Assign to outer scope variable
             connection_established = True
             logger.info("Successfully connected to WebSocket.")
+            if supervisor is not None:
+                supervisor.on_connected()
             if ui_update_callback:
                 ui_update_callback(
                     book_manager, "connected", None
@@ -29,41 +505,24 @@ async def connect_and_listen(book_manager, ui_update_callback=None):
 
             logger.info("Listening for L2 order book data...")
 
-            async for message in websocket_client:
-                # --- START: L1 (WS Message to Book Update) Latency Measurement ---
-                ws_msg_arrival_time = (
-                    time.perf_counter()
-                )  # Mark the moment the message is available
-
-                try:
-                    data = json.loads(message)
-                    book_manager.update_book(data)
-                    # --- END: L1 Latency Measurement ---
-                    if ui_update_callback:
-                        # Pass status and ws_msg_arrival_time as separate arguments
-                        ui_update_callback(
-                            book_manager, "data_update", ws_msg_arrival_time
+            if conflate:
+                await _listen_conflated(websocket_client, ingest)
+            else:
+                while True:
+                    try:
+                        message = await asyncio.wait_for(
+                            websocket_client.recv(), WS_DATA_TIMEOUT_S
                         )
-                except json.JSONDecodeError:
-                    logger.error(f"Could not decode JSON: {message}")
-                    if (
-                        ui_update_callback
-                    ):  # Ensure callback is still made on error if needed, without latency
-                        ui_update_callback(book_manager, "data_error", None)
-                except Exception as e:
-                    logger.error(
-                        f"Error processing message in connect_and_listen: {e} - Data: {message}",
-                        exc_info=True,
-                    )  # Added exc_info
-                    if ui_update_callback:
-                        ui_update_callback(book_manager, "data_error", None)
+                    except websockets.exceptions.ConnectionClosedOK:
+                        break
+                    ingest.apply([ingest.arrived(message)])
 
     except websockets.exceptions.ConnectionClosed as e:  # More specific catch
         logger.error(f"WebSocket connection closed: {e.reason} (Code: {e.code})")
         if ui_update_callback:
             ui_update_callback(book_manager, "disconnected_error", None)
     except websockets.exceptions.InvalidURI:
-        logger.error(f"Invalid WebSocket URI: {WEBSOCKET_URL}")
+        logger.error(f"Invalid WebSocket URI: {url}")
         if ui_update_callback:
             ui_update_callback(book_manager, "disconnected_error", None)
     except ConnectionRefusedError:
@@ -72,6 +531,13 @@ async def connect_and_listen(book_manager, ui_update_callback=None):
         )
         if ui_update_callback:
             ui_update_callback(book_manager, "disconnected_error", None)
+    except asyncio.TimeoutError:
+        logger.error(
+            f"No data (or no connection) within {WS_DATA_TIMEOUT_S}s; "
+            f"treating the WebSocket as dead."
+        )
+        if ui_update_callback:
+            ui_update_callback(book_manager, "disconnected_error", None)
     except (
         Exception
     ) as e:  # Catch other potential errors during connection or listening
@@ -102,5 +568,32 @@ async def connect_and_listen(book_manager, ui_update_callback=None):
                 pass  # ui_update_callback(book_manager, "disconnected_error", None) - likely already called
 
 
+async def _listen_conflated(ws, ingest: _Ingest):
+    pending: "asyncio.Queue[Optional[Tuple[Any, float]]]" = asyncio.Queue()
+
+    async def receive():
+        try:
+            async for message in ws:
+                pending.put_nowait(ingest.arrived(message))
+        finally:
+            pending.put_nowait(None)  # End of stream
+
+    receiver = asyncio.create_task(receive())
+    try:
+        finished = False
+        while not finished:
+            batch = [await asyncio.wait_for(pending.get(), WS_DATA_TIMEOUT_S)]
+            while not pending.empty():
+                batch.append(pending.get_nowait())
+            if batch[-1] is None:
+                finished = True
+                batch.pop()
+            if batch:
+                ingest.apply(batch)
+        await receiver  # Re-raises why the connection ended, for the caller's handlers
+    finally:
+        receiver.cancel()
+
+
 if __name__ == "__main__":
     logger.info("websocket_handler.py should be run as part of main_app.py")
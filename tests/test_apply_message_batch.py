@@ -0,0 +1,107 @@
+import json
+
+from src.order_book_manager import OrderBookManager
+from src import websocket_handler
+from src.websocket_handler import IngestStats, apply_message_batch
+
+
+def _snapshot(asks, bids, timestamp="t0"):
+    return json.dumps(
+        {"timestamp": timestamp, "symbol": "BTC-USDT-SWAP", "asks": asks, "bids": bids}
+    )
+
+
+def _delta(asks=(), bids=(), timestamp="t1"):
+    return json.dumps(
+        {
+            "action": "update",
+            "timestamp": timestamp,
+            "asks": list(asks),
+            "bids": list(bids),
+        }
+    )
+
+
+def test_newest_snapshot_then_later_deltas_are_applied():
+    book = OrderBookManager()
+    messages = [
+        _snapshot([["200", "1"]], [["199", "1"]]),  # Superseded, never decoded
+        _delta(asks=[["201", "1"]]),  # Superseded
+        _snapshot([["101", "1"], ["102", "2"]], [["99", "1"]], timestamp="t2"),
+        _delta(asks=[["101", "0"], ["103", "4"]], timestamp="t3"),
+        _delta(bids=[["98", "3"]], timestamp="t4"),
+    ]
+
+    applied, skipped = apply_message_batch(book, messages)
+
+    assert (applied, skipped) == (3, 2)
+    assert book.asks == [(102.0, 2.0), (103.0, 4.0)]
+    assert book.bids == [(99.0, 1.0), (98.0, 3.0)]
+    assert book.timestamp == "t4"
+    assert book.version == 2  # Snapshot, then all deltas as one version
+
+
+def test_deltas_without_snapshot_update_the_current_book():
+    book = OrderBookManager()
+    apply_message_batch(book, [_snapshot([["101", "1"]], [["99", "1"]])])
+
+    applied, skipped = apply_message_batch(
+        book, [_delta(asks=[["101", "5"]]), _delta(bids=[["99", "0"], ["97", "2"]])]
+    )
+
+    assert (applied, skipped) == (2, 0)
+    assert book.asks == [(101.0, 5.0)]
+    assert book.bids == [(97.0, 2.0)]
+
+
+def test_deltas_are_skipped_while_a_snapshot_is_required():
+    book = OrderBookManager()
+
+    applied, skipped = apply_message_batch(
+        book, [_delta(asks=[["101", "1"]])], require_snapshot=True
+    )
+
+    assert (applied, skipped) == (0, 1)
+    assert book.version == 0
+    assert book.asks == []
+
+
+def test_garbage_messages_are_skipped():
+    book = OrderBookManager()
+    messages = [
+        _snapshot([["101", "1"]], [["99", "1"]]),
+        "not json",
+        _delta(asks=[["102", "1"]]),
+        "{truncated",
+    ]
+
+    applied, skipped = apply_message_batch(book, messages)
+
+    assert (applied, skipped) == (2, 2)
+    assert book.asks == [(101.0, 1.0), (102.0, 1.0)]
+
+
+def test_garbage_only_batch_leaves_the_book_alone():
+    book = OrderBookManager()
+    apply_message_batch(book, [_snapshot([["101", "1"]], [["99", "1"]])])
+    version = book.version
+
+    applied, skipped = apply_message_batch(book, ["", "]["])
+
+    assert (applied, skipped) == (0, 2)
+    assert book.version == version
+
+
+def test_ingest_rates_are_divided_by_the_window_length(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(websocket_handler.time, "monotonic", lambda: now[0])
+    stats = IngestStats()
+    for i in range(10):  # 10 messages in the first 0.9 s ...
+        now[0] = i * 0.1
+        stats.on_batch(1, 1, 0)
+    now[0] = 1.8  # ... then a pause: the window closes after 1.8 s, not 1 s
+    stats.on_batch(2, 1, 1)
+
+    received, applied, skipped = stats.per_second()
+    assert received == applied == 10 / 1.8
+    assert skipped == 0.0
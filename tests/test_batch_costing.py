@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.batch_costing import ANY_SYMBOL, cost_orders, load_orders, walk_book_batch
+from src.book_snapshot_store import ASK_SIDE, BID_SIDE, snapshot_block
+from src.financial_calculations import calculate_slippage_walk_book
+
+ASKS = [(100.5, 2.0), (101.0, 3.0), (102.0, 5.0)]
+BIDS = [(99.5, 2.0), (99.0, 3.0), (98.0, 5.0)]
+
+
+def _books():
+    block = snapshot_block(ASKS, BIDS, depth=10)
+    return {ANY_SYMBOL: (np.array([0.0]), block[np.newaxis])}
+
+
+def _orders(tmp_path, rows):
+    path = tmp_path / "orders.csv"
+    pd.DataFrame(rows, columns=["timestamp", "symbol", "side", "quantity_usd"]).to_csv(
+        path, index=False
+    )
+    return load_orders(str(path), "Regular User LV1", 0.02)
+
+
+def test_invalid_quantities_are_not_priced(tmp_path):
+    orders = _orders(
+        tmp_path,
+        [
+            [1.0, "BTC-USDT-SWAP", "buy", "100"],
+            [1.0, "BTC-USDT-SWAP", "buy", "abc"],
+            [1.0, "BTC-USDT-SWAP", "sell", "-50"],
+            [1.0, "BTC-USDT-SWAP", "sell", "0"],
+        ],
+    )
+
+    results = cost_orders(orders, _books())
+
+    assert results["status"].tolist() == ["ok"] + ["invalid_order"] * 3
+    assert results["net_cost_usd"].iloc[1:].isna().all()
+    assert np.isfinite(results["net_cost_usd"].iloc[0])
+
+
+class _Book:
+    def __init__(self, asks, bids):
+        self.asks = asks
+        self.bids = bids
+
+
+def _random_book(rng, depth):
+    mid = rng.uniform(100.0, 60_000.0)
+    half_spread = mid * rng.uniform(1e-6, 1e-3)
+    ask_prices = mid + half_spread + np.cumsum(rng.uniform(0.01, 5.0, depth))
+    bid_prices = mid - half_spread - np.cumsum(rng.uniform(0.01, 5.0, depth))
+    asks = [
+        (float(p), float(q)) for p, q in zip(ask_prices, rng.uniform(0.001, 3, depth))
+    ]
+    bids = [
+        (float(p), float(q)) for p, q in zip(bid_prices, rng.uniform(0.001, 3, depth))
+    ]
+    return _Book(asks, bids)
+
+
+def test_walk_book_batch_matches_the_scalar_walk():
+    rng = np.random.default_rng(1)
+    depth = 40
+    books, targets, is_buy = [], [], []
+    for _ in range(2_000):
+        book = _random_book(rng, int(rng.integers(1, depth + 1)))
+        books.append(book)
+        # Up to beyond the whole side's notional, so partial fills are covered
+        targets.append(float(10 ** rng.uniform(1, 7)))
+        is_buy.append(bool(rng.integers(2)))
+    blocks = np.stack([snapshot_block(b.asks, b.bids, depth) for b in books])
+    is_buy = np.array(is_buy)
+    rows = np.arange(len(books))
+    side_levels = blocks[rows, np.where(is_buy, ASK_SIDE, BID_SIDE)]
+
+    slippage, avg_price, asset, usd = walk_book_batch(
+        side_levels,
+        blocks[:, ASK_SIDE, 0, 0],
+        blocks[:, BID_SIDE, 0, 0],
+        np.array(targets),
+        is_buy,
+    )
+
+    for i, book in enumerate(books):
+        expected = calculate_slippage_walk_book(
+            targets[i], book, "buy" if is_buy[i] else "sell"
+        )
+        actual = (slippage[i], avg_price[i], asset[i], usd[i])
+        for got, want in zip(actual, expected):
+            if want is None:
+                assert np.isnan(got)
+            else:
+                assert got == pytest.approx(want, rel=1e-9, abs=1e-12)
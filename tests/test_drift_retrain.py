@@ -0,0 +1,87 @@
+import json
+import random
+
+from src.drift_detection import PageHinkleyDetector
+from src.replay import ReplayEngine
+from src.sample_store import StratifiedReservoirStore
+
+
+def _book_message(rng, quantity, step):
+    mid = 50_000 + rng.uniform(-50, 50)
+    asks = [
+        [f"{mid + 0.5 + i * step:.2f}", f"{quantity * rng.uniform(0.5, 1.5):.4f}"]
+        for i in range(60)
+    ]
+    bids = [
+        [f"{mid - 0.5 - i * step:.2f}", f"{quantity * rng.uniform(0.5, 1.5):.4f}"]
+        for i in range(60)
+    ]
+    return json.dumps({"symbol": "BTC-USDT-SWAP", "asks": asks, "bids": bids})
+
+
+def _regime_shift_feed(ticks_before, ticks_after):
+    """Deep, tight books, then thin books with wide level spacing."""
+    rng = random.Random(7)
+    for i in range(ticks_before + ticks_after):
+        quantity, step = (2.0, 0.5) if i < ticks_before else (0.2, 5.0)
+        yield 1_790_000_000.0 + i * 0.1, 0.0, _book_message(rng, quantity, step)
+
+
+def _post_shift_share(engine):
+    X, _, _ = engine.pipeline.slippage_reg_model.sample_store.to_arrays()
+    depth_best_ask_usd = X[:, 2]  # ~100k USD before the shift, ~10k after
+    return (depth_best_ask_usd < 20_000).mean()
+
+
+def _replay(age_out):
+    engine = ReplayEngine(
+        _regime_shift_feed(1500, 1000), quantity_usd=None, min_samples_to_train=200
+    )
+    model = engine.pipeline.slippage_reg_model
+    if not age_out:
+        model.age_out_samples = lambda recent_samples: 0
+    engine.run()
+    return engine
+
+
+def test_drift_retrain_fits_post_shift_data():
+    engine = _replay(age_out=True)
+
+    assert engine.pipeline.retrain_scheduler.retrains_on_drift >= 1
+    assert engine.pipeline.slippage_reg_model.sample_store.samples_aged_out > 0
+    assert _post_shift_share(engine) > 0.9
+
+
+def test_without_aging_out_pre_shift_data_dominates():
+    engine = _replay(age_out=False)
+
+    assert _post_shift_share(engine) < 0.5
+
+
+def test_page_hinkley_estimates_the_change_point():
+    detector = PageHinkleyDetector(delta=0.1, threshold=50.0, min_samples=100)
+    for _ in range(500):
+        detector.update(1.0)
+    for n in range(1, 1000):
+        if detector.update(5.0):
+            break
+
+    assert detector.drift_detected
+    assert detector.samples_since_change == n
+
+
+def test_age_out_keeps_recent_samples_and_the_minimum():
+    store = StratifiedReservoirStore(
+        features_dim=1, total_capacity=1_000, size_bucket_edges_usd=[10_000.0]
+    )
+    for i in range(300):
+        store.add([1_000.0 if i % 2 else 50_000.0], float(i))
+
+    assert store.age_out(recent_samples=50) == 250
+    _, y, _ = store.to_arrays()
+    assert sorted(y) == list(range(250, 300))
+
+    assert store.age_out(recent_samples=10, min_keep=30) == 20
+    _, y, _ = store.to_arrays()
+    assert sorted(y) == list(range(270, 300))
+    assert len(store) == 30
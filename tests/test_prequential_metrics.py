@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from sklearn.metrics import mean_squared_error, r2_score
+
+from src.financial_calculations import PrequentialMetrics
+
+
+@pytest.mark.parametrize("scale", [1.0, 1e-4])  # 1e-4: slippage percentages
+def test_rolling_metrics_match_sklearn_on_the_window(scale):
+    rng = np.random.default_rng(0)
+    n, window = 2_300, 500  # Several window turnovers, so evictions and re-sums run
+    sizes = rng.choice([1_000.0, 10_000.0, 100_000.0, 1e6], size=n)
+    targets = (rng.normal(size=n) + sizes / 1e6) * scale
+    predictions = targets + rng.normal(0.1, 0.5, size=n) * scale
+
+    metrics = PrequentialMetrics(
+        window_size=window, size_bucket_edges_usd=[5_000.0, 50_000.0]
+    )
+    for size, target, prediction in zip(sizes, targets, predictions):
+        metrics.update(size, target, prediction)
+
+    y, p, s = targets[-window:], predictions[-window:], sizes[-window:]
+    assert metrics.count == window
+    assert metrics.total_scored == n
+    assert metrics.mse == pytest.approx(mean_squared_error(y, p), rel=1e-9)
+    assert metrics.r2 == pytest.approx(r2_score(y, p), rel=1e-9)
+    assert metrics.bias == pytest.approx(np.mean(p - y), rel=1e-9)
+    buckets = np.digitize(s, [5_000.0, 50_000.0])
+    for index, label in enumerate(metrics.bucket_labels):
+        expected = np.mean((p - y)[buckets == index])
+        assert metrics.bias_by_size_bucket()[label] == pytest.approx(expected, rel=1e-9)
+
+
+def test_r2_is_undefined_for_a_constant_target():
+    metrics = PrequentialMetrics(window_size=10)
+    for prediction in (0.1, 0.2, 0.3):
+        metrics.update(1_000.0, 1.0, prediction)
+
+    assert metrics.r2 is None
+    assert metrics.mse == pytest.approx(np.mean([0.81, 0.64, 0.49]))
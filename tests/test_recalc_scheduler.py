@@ -0,0 +1,18 @@
+from src.recalc_scheduler import RecalcScheduler
+
+
+def test_order_edit_counts_no_unchanged_inputs():
+    recalc = RecalcScheduler(pipeline=None)
+    recalc.set_order(100.0, "Regular User LV1", 0.02, "BTC-USDT-SWAP")
+    recalc.set_order(150.0, "Regular User LV1", 0.02, "BTC-USDT-SWAP")
+
+    assert recalc.unchanged_inputs == 0
+
+
+def test_unchanged_order_counts_once():
+    recalc = RecalcScheduler(pipeline=None)
+    recalc.set_order(100.0, "Regular User LV1", 0.02, "BTC-USDT-SWAP")
+    recalc.set_order(100.0, "Regular User LV1", 0.02, "BTC-USDT-SWAP")
+
+    assert recalc.unchanged_inputs == 1
+    assert recalc.get_stats()["recomputations_avoided"] == 1
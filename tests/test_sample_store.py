@@ -0,0 +1,67 @@
+import numpy as np
+
+from src.sample_store import StratifiedReservoirStore
+
+
+def _single_stratum_store(capacity, **kwargs):
+    return StratifiedReservoirStore(
+        features_dim=1, total_capacity=capacity, size_bucket_edges_usd=[], **kwargs
+    )
+
+
+def test_regime_change_reaches_the_reservoir_after_a_long_session():
+    store = _single_stratum_store(1785)
+    for _ in range(300_000):
+        store.add([1_000.0], 0.0)  # Old regime: target 0
+    for _ in range(10_000):
+        store.add([1_000.0], 1.0)  # Post-drift regime: target 1
+
+    _, y, _ = store.to_arrays()
+    assert len(y) == 1785
+    assert y.mean() > 0.9  # Uniform Algorithm R would keep ~3% new samples
+
+
+def test_rare_stratum_is_kept_while_common_one_is_replaced():
+    store = StratifiedReservoirStore(
+        features_dim=1, total_capacity=200, size_bucket_edges_usd=[10_000.0]
+    )
+    for i in range(5_000):
+        store.add([1_000.0], float(i))  # Common small probes
+    for _ in range(20):
+        store.add([50_000.0], -1.0)  # Rare large probes
+
+    _, y, _ = store.to_arrays()
+    assert (y == -1.0).sum() == 20
+    assert len(store) == 120
+
+
+def test_sparse_stratum_weights_are_balanced_up_to_the_cap():
+    store = StratifiedReservoirStore(
+        features_dim=1,
+        total_capacity=200,
+        size_bucket_edges_usd=[10_000.0],
+        max_balance_weight=4.0,
+    )
+    for _ in range(1_000):
+        store.add([1_000.0], 0.0)
+    for _ in range(51):
+        store.add([50_000.0], 1.0)  # Capacity 100, about half full
+
+    X, _, w = store.to_arrays()
+    common = X[:, 0] < 10_000.0
+    assert np.allclose(w[common], 1.0)
+    assert np.allclose(w[~common], 100 / 51)
+    assert np.isclose(w[~common].sum(), 100.0)  # As much as a full stratum
+
+
+def test_balance_factor_is_capped():
+    store = StratifiedReservoirStore(
+        features_dim=1,
+        total_capacity=200,
+        size_bucket_edges_usd=[10_000.0],
+        max_balance_weight=4.0,
+    )
+    store.add([50_000.0], 1.0, weight=0.5)
+
+    _, _, w = store.to_arrays()
+    assert np.allclose(w, 0.5 * 4.0)
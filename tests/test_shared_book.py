@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from src import shared_book
+from src.order_book_manager import OrderBookManager
+from src.shared_book import SharedBook, SharedBookReader, SharedBookWriter
+
+
+def _book(asks, bids, timestamp="t0"):
+    book = OrderBookManager()
+    book.update_book(
+        {
+            "timestamp": timestamp,
+            "symbol": "BTC-USDT-SWAP",
+            "exchange": "okx",
+            "asks": asks,
+            "bids": bids,
+        }
+    )
+    book.exchange_time = 1700000000.5
+    book.local_exchange_time = 1700000000.25
+    return book
+
+
+@pytest.fixture
+def shared():
+    book = SharedBook.create(depth=4)
+    yield book
+    book.close()
+
+
+def test_nothing_published_reads_none(shared):
+    reader = SharedBookReader(shared)
+
+    assert reader.read() is None
+    assert reader.failed_reads == 0
+
+
+def test_publish_read_round_trip(shared):
+    writer = SharedBookWriter(shared)
+    reader = SharedBookReader(shared)
+    book = _book(
+        [["101", "1"], ["102", "2"]],
+        [["99", "3"], ["98", "4"], ["97", "5"]],
+        timestamp="t1",
+    )
+
+    writer.publish(book, arrival_perf=12.5)
+    read = reader.read()
+
+    assert read.version == 1
+    np.testing.assert_array_equal(read.asks, [[101.0, 1.0], [102.0, 2.0]])
+    np.testing.assert_array_equal(read.bids, [[99.0, 3.0], [98.0, 4.0], [97.0, 5.0]])
+    assert (read.timestamp, read.symbol, read.exchange) == (
+        "t1",
+        "BTC-USDT-SWAP",
+        "okx",
+    )
+    assert read.exchange_time == 1700000000.5
+    assert read.local_exchange_time == 1700000000.25
+    assert read.arrival_perf == 12.5
+
+    # The next publish goes to the other buffer; the reader follows it
+    writer.publish(_book([["105", "1"]], [["95", "1"]], timestamp="t2"))
+    read = reader.read()
+    assert read.version == 2
+    np.testing.assert_array_equal(read.asks, [[105.0, 1.0]])
+    assert read.arrival_perf is None
+    assert reader.get_stats() == {"reads": 2, "retries": 0, "failed_reads": 0}
+
+
+def test_levels_beyond_depth_are_truncated(shared):
+    writer = SharedBookWriter(shared)
+    asks = [[str(100 + i), "1"] for i in range(6)]
+
+    writer.publish(_book(asks, [["99", "1"]]))
+
+    assert len(SharedBookReader(shared).read().asks) == 4
+    assert writer.levels_truncated == 1
+
+
+def test_torn_read_is_retried(shared, monkeypatch):
+    writer = SharedBookWriter(shared)
+    reader = SharedBookReader(shared)
+    writer.publish(_book([["101", "1"]], [["99", "1"]], timestamp="t1"))
+
+    # The writer laps the reader while it copies the buffer: two publishes
+    # come back round to the same buffer with a new seq
+    snapshot_class = shared_book.SharedBookSnapshot
+    calls = []
+
+    def lapped(*args, **kwargs):
+        if not calls:
+            writer.publish(_book([["102", "1"]], [["99", "1"]], timestamp="t2"))
+            writer.publish(_book([["103", "1"]], [["99", "1"]], timestamp="t3"))
+        calls.append(1)
+        return snapshot_class(*args, **kwargs)
+
+    monkeypatch.setattr(shared_book, "SharedBookSnapshot", lapped)
+    read = reader.read()
+
+    assert len(calls) == 2
+    assert reader.retries == 1
+    assert read.version == 3
+    assert read.timestamp == "t3"
+    np.testing.assert_array_equal(read.asks, [[103.0, 1.0]])
+
+
+def test_read_gives_up_after_max_retries(shared):
+    writer = SharedBookWriter(shared)
+    reader = SharedBookReader(shared, max_retries=3)
+    writer.publish(_book([["101", "1"]], [["99", "1"]]))
+
+    active = int(shared.header["active"][0])
+    shared.buffers["seq"][active] += 1  # Odd: mid-write, forever
+
+    assert reader.read() is None
+    assert reader.retries == 3
+    assert reader.failed_reads == 1
+
+
+def test_zero_copy_snapshot_detects_overwrite(shared):
+    writer = SharedBookWriter(shared)
+    reader = SharedBookReader(shared)
+    writer.publish(_book([["101", "1"]], [["99", "1"]], timestamp="t1"))
+
+    view = reader.read(copy=False)
+    copied = reader.read()
+    assert view.is_consistent()
+
+    # One publish fills the other buffer; the second rewrites the viewed one
+    writer.publish(_book([["102", "1"]], [["99", "1"]], timestamp="t2"))
+    assert view.is_consistent()
+    writer.publish(_book([["103", "1"]], [["99", "1"]], timestamp="t3"))
+
+    assert not view.is_consistent()
+    assert copied.is_consistent()
+    np.testing.assert_array_equal(copied.asks, [[101.0, 1.0]])